@@ -0,0 +1,132 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+class WorkerEventLoop:
+    """A long-lived event loop owned by a single worker process.
+
+    The loop runs on a daemon thread so that synchronous Celery tasks can submit
+    coroutines to it, allowing async resources (HTTP sessions, LLM clients) to
+    outlive any single task.
+    """
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="worker-event-loop",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def is_owned(self) -> bool:
+        """Whether the loop belongs to the current process, and is still running."""
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def run(self, coro: Coroutine[object, object, T]) -> T:
+        """Runs the coroutine on the loop, blocking until it completes.
+
+        Cancellation of the coroutine surfaces as `asyncio.CancelledError`, and an
+        interruption of the calling thread cancels the coroutine.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise asyncio.CancelledError()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self):
+        if not self.is_owned:
+            return
+
+        async def shutdown():
+            tasks = [
+                x for x in asyncio.all_tasks() if x is not asyncio.current_task()
+            ]
+            for x in tasks:
+                x.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._loop.shutdown_asyncgens()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_WORKER_LOOP: WorkerEventLoop | None = None
+_WORKER_LOOP_LOCK = threading.Lock()
+
+
+def worker_loop() -> WorkerEventLoop:
+    """Returns the current process' loop, starting it when required.
+
+    A loop inherited through fork has no running thread in the child, so a new one
+    is started in its place.
+    """
+    global _WORKER_LOOP
+    with _WORKER_LOOP_LOCK:
+        if _WORKER_LOOP is None or not _WORKER_LOOP.is_owned:
+            _WORKER_LOOP = WorkerEventLoop()
+        return _WORKER_LOOP
+
+
+def stop_worker_loop():
+    global _WORKER_LOOP
+    with _WORKER_LOOP_LOCK:
+        if _WORKER_LOOP is not None:
+            _WORKER_LOOP.stop()
+            _WORKER_LOOP = None
+
+
+def run(coro: Coroutine[object, object, T]) -> T:
+    return worker_loop().run(coro)
+
+
+if __name__ == "__main__":
+
+    async def current_loop():
+        await asyncio.sleep(0)
+        return asyncio.get_running_loop()
+
+    # the same loop serves consecutive submissions
+    assert run(current_loop()) is run(current_loop())
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    try:
+        run(cancelled())
+        assert False
+    except asyncio.CancelledError:
+        pass
+
+    async def timeout():
+        async with asyncio.timeout(0.01):
+            await asyncio.sleep(1)
+
+    try:
+        run(timeout())
+        assert False
+    except TimeoutError:
+        pass
+
+    stop_worker_loop()
@@ -3,6 +3,7 @@ from langchain.docstore.document import Document
 from pydantic import BaseModel, Field, ConfigDict, field_validator
 from collections.abc import Iterable
 
+import itertools
 import re
 
 # only relevant while running script for testing purposes
@@ -53,7 +54,13 @@ class EntityRelationSchema(BaseModel):
         return v
 
 
-async def extract_entity_relations(docs: list[Document]) -> list[EntityRelationSchema]:
+_EXTRACTION_CONCURRENCY = 5
+
+
+async def extract_entity_relations(
+    docs: Iterable[Document],
+) -> list[EntityRelationSchema]:
+    """Extracts relations from `docs`, holding one batch of chunks at a time."""
     llm = utils.chat_llm()
     schema, extraction_validator = from_pydantic(
         EntityRelationSchema,
@@ -146,19 +153,21 @@ async def extract_entity_relations(docs: list[Document]) -> list[EntityRelationS
 
     extraction_data = []
 
-    document_extraction_results = await extract_from_documents(
-        chain,
-        docs,
-        max_concurrency=5,
-        use_uid=False,
-        return_exceptions=True,
-    )
-
-    for result in document_extraction_results:
-        if isinstance(result, Exception):
-            print("Exception: " + str(result))
-            continue
-        extraction_data.extend(result["validated_data"])
+    doc_iterator = iter(docs)
+    while batch := list(itertools.islice(doc_iterator, _EXTRACTION_CONCURRENCY)):
+        document_extraction_results = await extract_from_documents(
+            chain,
+            batch,
+            max_concurrency=_EXTRACTION_CONCURRENCY,
+            use_uid=False,
+            return_exceptions=True,
+        )
+
+        for result in document_extraction_results:
+            if isinstance(result, Exception):
+                print("Exception: " + str(result))
+                continue
+            extraction_data.extend(result["validated_data"])
 
     return list(filter_common_erroneous_relations(extraction_data))
 
@@ -1,4 +1,5 @@
-from langchain.chains.summarize import load_summarize_chain
+from collections.abc import Iterable
+from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 
 from langchain.docstore.document import Document
@@ -6,7 +7,8 @@ from langchain.docstore.document import Document
 from analyzers import utils
 
 
-async def summarize_document(texts: list[Document]) -> str:
+async def summarize_document(texts: Iterable[Document]) -> str:
+    """Summarizes with a refine chain, consuming `texts` one chunk at a time."""
     prompt_template = """Write a concise summary of the following:
     {text}
     CONCISE SUMMARY:"""
@@ -24,12 +26,21 @@ async def summarize_document(texts: list[Document]) -> str:
         "If the context isn't useful, return the original summary."
     )
     refine_prompt = PromptTemplate.from_template(refine_template)
-    refine_chain = load_summarize_chain(
-        utils.llm(),
-        chain_type="refine",
-        question_prompt=prompt,
-        refine_prompt=refine_prompt,
-        return_intermediate_steps=True,
-    )
-    refine_outputs = refine_chain({"input_documents": texts})
-    return refine_outputs["output_text"]
+
+    # equivalent to the "refine" summarize chain, which requires every document
+    # to be loaded up front
+    llm = utils.llm()
+    initial_chain = LLMChain(llm=llm, prompt=prompt)
+    refine_chain = LLMChain(llm=llm, prompt=refine_prompt)
+
+    summary = None
+    for text in texts:
+        if summary is None:
+            summary = await initial_chain.apredict(text=text.page_content)
+        else:
+            summary = await refine_chain.apredict(
+                text=text.page_content,
+                existing_answer=summary,
+            )
+
+    return summary or ""
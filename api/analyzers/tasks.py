@@ -1,14 +1,19 @@
 import asyncio
+import os
 
-from celery import shared_task
+from celery import shared_task, Task
 from celery.utils.log import get_logger
+from analyzers import event_loop
+from services import fetch_scheduler, offload
 from services.persist import task
 import constants
 
 from content_workflow import (
+    FetchContent,
     SummarizeContent,
     ExtractContentRelations,
     Context,
+    TaskResult,
     TaskResultType,
     ProcessorBase,
 )
@@ -19,6 +24,12 @@ logger = get_logger(__name__)
 
 T = TypeVar("T")
 
+# a task still deferred this long after its first deferral, for a busy or
+# throttled host, fails
+_MAX_DEFERRAL_SECONDS = float(
+    os.environ.get("KMS_FETCH_MAX_DEFERRAL_SECONDS", 6 * 3600)
+)
+
 
 def _result_type_to_status(result_type: TaskResultType) -> task.ProcessTaskStatus:
     match result_type:
@@ -28,29 +39,63 @@ def _result_type_to_status(result_type: TaskResultType) -> task.ProcessTaskStatu
             return task.ProcessTaskStatus.FAILED
         case TaskResultType.PROCESSED:
             return task.ProcessTaskStatus.COMPLETE
+        case TaskResultType.DEFERRED:
+            return task.ProcessTaskStatus.DEFERRED
 
     raise ValueError(f"Unexpected TaskResultType {result_type}")
 
 
 def _run_celery_analyzer_task(
     task_context: Context,
-    task_id: str,
+    celery_task: Task,
     task_name: str,
     task_processor_ctor: type[ProcessorBase],
-):
+) -> task.ProcessTaskStatus:
+    """Runs the processor, returning the status recorded for the task.
+
+    A deferred task is retried by Celery once its document host is available,
+    leaving the worker free for other documents meanwhile.
+    """
     logger.info(task_context)
     hash = task_context.hash
+    task_id = celery_task.request.id
 
+    # unexpected exceptions are recorded as failures by the updater
+    status = task.ProcessTaskStatus.FAILED
+    retry_after_seconds = None
     with task.assign_processing_action(hash, task_name, task_id) as updater:
 
+        def set_result(task_result: task.TaskResult):
+            nonlocal status
+            status = task_result.status
+            updater.set_result(task_result)
+
         async def run_processor():
+            nonlocal retry_after_seconds
             task_processor = task_processor_ctor()
             task_result = await task_processor.process_context(task_context)
             if task_result.result_type == TaskResultType.SKIPPED:
                 logger.info(f"[{task_name}] Skipping - Already processed: {hash}")
+            elif task_result.result_type == TaskResultType.DEFERRED:
+                # kept past the budget, which would otherwise restart on expiry
+                deferred_seconds = await offload.run_blocking(
+                    fetch_scheduler.default_scheduler().deferred_seconds,
+                    task_id,
+                    2 * _MAX_DEFERRAL_SECONDS,
+                )
+                if deferred_seconds < _MAX_DEFERRAL_SECONDS:
+                    retry_after_seconds = task_result.retry_after_seconds
+                else:
+                    task_result = TaskResult(
+                        result_type=TaskResultType.FAILED,
+                        message=(
+                            f"{task_result.message} "
+                            f"(deferred for {deferred_seconds:.0f}s)"
+                        ),
+                    )
 
             logger.info(task_result)
-            updater.set_result(
+            set_result(
                 task.TaskResult(
                     status=_result_type_to_status(task_result.result_type),
                     message=task_result.message,
@@ -58,32 +103,67 @@ def _run_celery_analyzer_task(
             )
 
         async def process_with_timeout():
-            async with asyncio.timeout(3600):  # 1h
+            async with asyncio.timeout(constants.TASK_TIMEOUT_SECONDS):
                 return await run_processor()
 
         try:
-            asyncio.run(process_with_timeout())
+            # submitted to the process-wide loop, so async clients outlive the task
+            event_loop.run(process_with_timeout())
         except TimeoutError:
-            updater.set_result(
+            set_result(
                 task.TaskResult(
                     status=task.ProcessTaskStatus.TIMEOUT,
-                    message="Task timeout after 1h",
+                    message=(
+                        f"Task timeout after {constants.TASK_TIMEOUT_SECONDS}s"
+                    ),
                 )
             )
         except asyncio.CancelledError:
-            updater.set_result(
+            set_result(
                 task.TaskResult(
                     status=task.ProcessTaskStatus.CANCELLED,
                     message="Task cancellation requested",
                 )
             )
 
+    if status == task.ProcessTaskStatus.DEFERRED:
+        # the retry keeps the chain, analyzers still follow a deferred fetch
+        raise celery_task.retry(countdown=retry_after_seconds, max_retries=None)
+    return status
+
+
+class ContentFetchError(Exception):
+    """Raised to stop the pipeline when document content is unavailable."""
+
+
+@shared_task(bind=True, trail=True, task_track_started=True)
+def fetch_content(
+    self, hash: str, parent_task_id: str, analyzer_task_names: list[str]
+):
+    status = _run_celery_analyzer_task(
+        Context(hash=hash),
+        self,
+        constants.FETCH_TASK,
+        FetchContent,
+    )
+    if status in [task.ProcessTaskStatus.SKIPPED, task.ProcessTaskStatus.COMPLETE]:
+        return
+
+    # analyzers chained after this task will not run
+    task.fail_pending_actions(
+        hash,
+        parent_task_id,
+        analyzer_task_names,
+        f"[{constants.FETCH_TASK}] did not complete: {status}",
+    )
+    raise ContentFetchError(f"Content unavailable for {hash}: {status}")
+
 
 @shared_task(bind=True, trail=True, task_track_started=True)
 def summarize_content(self, hash: str, force_process: bool):
     _run_celery_analyzer_task(
         Context(hash=hash, force_process=force_process),
-        self.request.id,
+        self,
         constants.SUMMARY_TASK,
         SummarizeContent,
     )
@@ -93,7 +173,7 @@ def summarize_content(self, hash: str, force_process: bool):
 def extract_entity_relations(self, hash: str, force_process: bool):
     _run_celery_analyzer_task(
         Context(hash=hash, force_process=force_process),
-        self.request.id,
+        self,
         constants.ENTITIES_TASK,
         ExtractContentRelations,
     )
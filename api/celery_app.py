@@ -1,24 +1,53 @@
 from celery.utils.log import get_logger
 
 from utilities import create_app
+import argparse
 import celery.signals
+import dataclasses
 import datetime
+import os
 import time
 
-from services.persist import metrics
+from services.persist import metrics, pool
 
 from analyzers import tasks as analyzer_tasks
+from analyzers import event_loop
+from doc_store import read_cache
+from loaders import browser_pool
 import flask_celery
+import constants
 
 app = create_app().extensions["celery"]
 logger = get_logger(__name__)
 
 
 # register celery signals
+@celery.signals.worker_process_init.connect
+def celery_worker_process_init(**kwargs):
+    # connections inherited from the parent are discarded by the pool on first use
+    pool.default_pool().warm()
+    event_loop.worker_loop()
+
+
+@celery.signals.worker_process_shutdown.connect
+def celery_worker_process_shutdown(**kwargs):
+    logger.info(f"[Connection Pool]: {pool.get_pool_stats()}")
+    logger.info(f"[Document Cache]: {read_cache.get_cache_stats()}")
+    logger.info(f"[Browser Pool]: {browser_pool.get_pool_stats()}")
+    pool.default_pool().closeall()
+    browser_pool.close_default_pool()
+    event_loop.stop_worker_loop()
+
+
 @celery.signals.task_prerun.connect
 def celery_task_prerun(task, **kwargs):
     task.start_time = time.time()
 
+    published_at = getattr(task.request, "kms_published_at", None)
+    task.queue_wait = None
+    if published_at is not None:
+        task.queue_wait = max(task.start_time - published_at, 0.0)
+
 
 @celery.signals.task_postrun.connect
 def celery_task_postrun(task_id, state, task, **kwargs):
@@ -32,10 +61,64 @@ def celery_task_postrun(task_id, state, task, **kwargs):
             result=state,
             duration_seconds=runtime,
             started_at=datetime.datetime.fromtimestamp(task.start_time),
+            priority=(task.request.delivery_info or {}).get("priority"),
+            queue_wait_seconds=task.queue_wait,
         ),
     )
 
 
+@dataclasses.dataclass
+class WorkerProfile:
+    queue: str
+    concurrency: int
+    prefetch_multiplier: int
+
+
+_WORKER_PROFILES = {
+    # network bound, many slots keep the inference queue supplied with content
+    constants.FETCH_QUEUE: WorkerProfile(
+        queue=constants.FETCH_QUEUE,
+        concurrency=int(os.environ.get("KMS_FETCH_CONCURRENCY", 8)),
+        prefetch_multiplier=4,
+    ),
+    constants.PARSE_QUEUE: WorkerProfile(
+        queue=constants.PARSE_QUEUE,
+        concurrency=int(os.environ.get("KMS_PARSE_CONCURRENCY", os.cpu_count() or 1)),
+        prefetch_multiplier=1,
+    ),
+    # a single GPU slot, which must not hold queued work back from other workers
+    constants.INFERENCE_QUEUE: WorkerProfile(
+        queue=constants.INFERENCE_QUEUE,
+        concurrency=int(os.environ.get("KMS_INFERENCE_CONCURRENCY", 1)),
+        prefetch_multiplier=1,
+    ),
+}
+
+
 if __name__ == "__main__":
-    args = ["worker", "--loglevel=INFO", "--concurrency=1"]
+    parser = argparse.ArgumentParser(description="Start a KMS Celery worker")
+    parser.add_argument(
+        "--queue",
+        choices=list(_WORKER_PROFILES.keys()),
+        help="Queue to consume. Consumes every queue with a single slot if omitted.",
+    )
+    parsed_args = parser.parse_args()
+
+    if parsed_args.queue is None:
+        args = [
+            "worker",
+            "--loglevel=INFO",
+            "--concurrency=1",
+            f"--queues={','.join(_WORKER_PROFILES.keys())}",
+        ]
+    else:
+        profile = _WORKER_PROFILES[parsed_args.queue]
+        args = [
+            "worker",
+            "--loglevel=INFO",
+            f"--concurrency={profile.concurrency}",
+            f"--prefetch-multiplier={profile.prefetch_multiplier}",
+            f"--queues={profile.queue}",
+            f"--hostname={profile.queue}@%h",
+        ]
     app.worker_main(argv=args)
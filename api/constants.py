@@ -1,2 +1,16 @@
+FETCH_TASK = 'Fetch Content'
 ENTITIES_TASK = 'Extract Relations'
-SUMMARY_TASK = 'Summarize'
\ No newline at end of file
+SUMMARY_TASK = 'Summarize'
+
+# longest an analyzer task may run
+TASK_TIMEOUT_SECONDS = 3600
+
+# Celery queues, separated by the resource each task is bound by
+FETCH_QUEUE = 'fetch'
+PARSE_QUEUE = 'parse'
+INFERENCE_QUEUE = 'inference'
+
+# Redis-backed priorities, lower values are consumed first
+INTERACTIVE_PRIORITY = 0
+BULK_PRIORITY = 6
+PRIORITY_STEPS = [INTERACTIVE_PRIORITY, 3, BULK_PRIORITY, 9]
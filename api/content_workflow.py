@@ -5,12 +5,13 @@ import io
 import traceback
 
 from langchain.docstore.document import Document
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, Iterator
 from doc_store import disk_store
 from doc_store import doc_loader
 from analyzers import extraction
 from analyzers import summarize
-from services.persist import summary, document
+from services import fetch_scheduler, locks, offload
+from services.persist import summary, document, entities, metrics
 
 ContentType = str
 
@@ -34,14 +35,17 @@ class ContentTypeContainer(abc.ABC, Generic[T]):
     contentType: str
 
     async def get_output_type(self, context: Context) -> T:
-        if not self.has_processed(context):
+        if not await self.has_processed_async(context):
             content = await self._process_context(context)
-            self._store_content(context, content)
+            await offload.run_blocking(self._store_content, context, content)
         else:
             content = await self._load_content(context)
 
         return content
 
+    async def has_processed_async(self, context: Context) -> bool:
+        return await offload.run_blocking(self.has_processed, context)
+
     @abc.abstractmethod
     def has_processed(self, context: Context) -> bool:
         raise NotImplementedError()
@@ -65,18 +69,50 @@ class DocumentContentContainer(ContentTypeContainer[list[Document]]):
     def __init__(self, **kwargs):
         self._store = disk_store.default_store(**kwargs)
 
+    async def get_output_type(self, context: Context) -> list[Document]:
+        if await self.has_processed_async(context):
+            return await self._load_content(context)
+
+        # concurrent analyzers of a fresh hash share a single fetch
+        async with locks.single_flight(f"content:{context.hash}") as lock:
+            performed_fetch = not await self.has_processed_async(context)
+            await offload.run_blocking(
+                metrics.report_lock_metrics,
+                metrics.LockMetric(
+                    lock_name=lock.name,
+                    acquired_at=lock.acquired_at,
+                    wait_seconds=lock.wait_seconds,
+                    performed_work=performed_fetch,
+                ),
+            )
+            if not performed_fetch:
+                return await self._load_content(context)
+
+            content = await self._process_context(context)
+            await offload.run_blocking(self._store_content, context, content)
+            return content
+
+    async def iter_output_type(self, context: Context) -> Iterator[Document]:
+        """Yields stored chunks lazily, fetching the content first when required."""
+        if not await self.has_processed_async(context):
+            await self.get_output_type(context)
+
+        return self._store.iter_document_content(context.hash)
+
     def has_processed(self, context: Context) -> bool:
         return self._store.has_document_content(context.hash)
 
     async def _process_context(self, context: Context) -> list[Document]:
-        url = document.get_hash_url(context.hash)
-        return doc_loader.get_url_documents(url)
+        url = await document.get_hash_url_async(context.hash)
+        return await offload.run_blocking(doc_loader.get_url_documents, url)
 
     def _store_content(self, context: Context, results: list[Document]) -> None:
         self._store.save_document_content(context.hash, results)
 
     async def _load_content(self, context: Context) -> list[Document]:
-        return self._store.restore_document_content(context.hash)
+        return await offload.run_blocking(
+            self._store.restore_document_content, context.hash
+        )
 
 
 class DocumentEntitiesContainer(
@@ -94,18 +130,22 @@ class DocumentEntitiesContainer(
         self, context: Context
     ) -> list[extraction.EntityRelationSchema] | None:
         content_provider = DocumentContentContainer()
-        content = await content_provider.get_output_type(context)
+        content = await content_provider.iter_output_type(context)
         return await extraction.extract_entity_relations(content)
 
     def _store_content(
         self, context: Context, results: list[extraction.EntityRelationSchema]
     ) -> None:
         self._store.save_entity_relations(context.hash, results)
+        # indexed for queries spanning documents
+        entities.save_entity_relations(context.hash, results)
 
     async def _load_content(
         self, context: Context
     ) -> list[extraction.EntityRelationSchema]:
-        return self._store.load_entity_relations(context.hash)
+        return await offload.run_blocking(
+            self._store.load_entity_relations, context.hash
+        )
 
 
 class DocumentSummaryContainer(ContentTypeContainer[str]):
@@ -119,14 +159,14 @@ class DocumentSummaryContainer(ContentTypeContainer[str]):
 
     async def _process_context(self, context: Context) -> str | None:
         content_provider = DocumentContentContainer()
-        content = await content_provider.get_output_type(context)
+        content = await content_provider.iter_output_type(context)
         return await summarize.summarize_document(content)
 
     def _store_content(self, context: Context, results: str) -> None:
         summary.save_summary(context.hash, results)
 
     async def _load_content(self, context: Context) -> str:
-        document_summary = summary.get_summary(context.hash)
+        document_summary = await summary.get_summary_async(context.hash)
         if document_summary is not None:
             return document_summary
 
@@ -137,12 +177,16 @@ class TaskResultType(enum.Enum):
     SKIPPED = 0
     PROCESSED = 1
     FAILED = 2
+    # the document host is busy or throttled, processing is to be retried
+    DEFERRED = 3
 
 
 @dataclasses.dataclass
 class TaskResult:
     result_type: TaskResultType
     message: str | None = None
+    # set for DEFERRED results
+    retry_after_seconds: float | None = None
 
     def __str__(self) -> str:
         x = f"{self.result_type}"
@@ -168,6 +212,12 @@ class ProcessorBase(abc.ABC):
                 result_type=TaskResultType.FAILED,
                 message=str(e.args[0]),
             )
+        except fetch_scheduler.HostUnavailableError as e:
+            return TaskResult(
+                result_type=TaskResultType.DEFERRED,
+                message=str(e),
+                retry_after_seconds=e.retry_after_seconds,
+            )
         except BaseException as e:
             exception_writer = io.StringIO()
             traceback.print_exc(file=exception_writer)
@@ -187,13 +237,30 @@ class ProcessorBase(abc.ABC):
         raise NotImplementedError()
 
 
+class FetchContent(ProcessorBase):
+    """Loads and persists document content ahead of any analyzer."""
+
+    _content_provider: DocumentContentContainer
+
+    def __init__(self):
+        self._content_provider = DocumentContentContainer()
+
+    async def _skip_processor(self, context: Context) -> bool:
+        return self._content_provider.has_processed(context)
+
+    async def _run_processor(self, context: Context) -> None:
+        content = await self._content_provider.get_output_type(context)
+        if len(content) == 0:
+            raise DocumentProcessorError("No content loaded for document")
+
+
 class SummarizeContent(ProcessorBase):
     async def _skip_processor(self, context: Context) -> bool:
         return summary.has_summary(context.hash)
 
     async def _run_processor(self, context: Context) -> None:
         content_provider = DocumentContentContainer()
-        content = await content_provider.get_output_type(context)
+        content = await content_provider.iter_output_type(context)
         document_summary = await summarize.summarize_document(content)
         if len(document_summary) == 0:
             raise DocumentProcessorError("No summary created for document")
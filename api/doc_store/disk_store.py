@@ -2,9 +2,18 @@ import dataclasses
 import json
 import os
 from langchain.docstore.document import Document
-from typing import Callable
+from typing import Callable, Iterator
 
 from analyzers import extraction
+from doc_store import document_format, read_cache, segment_store
+
+# two levels of 256-way fan-out, ~1500 documents per leaf directory at 100M
+_DEFAULT_FANOUT_DEPTH = int(os.environ.get("KMS_STORE_FANOUT_DEPTH", 2))
+# layout used before the store recorded one
+_LEGACY_FANOUT_DEPTH = 12
+_LAYOUT_MARKER = ".kms_layout.json"
+_LAYOUT_VERSION = 2
+_ENTITY_RELATIONS_SUFFIX = ".entity_relations"
 
 
 def _generate_path_components(hash: str, component_length: int = 12) -> list[str]:
@@ -20,14 +29,26 @@ def _generate_path_components(hash: str, component_length: int = 12) -> list[str
     return components
 
 
+@dataclasses.dataclass
+class StoreLayout:
+    version: int
+    fanout_depth: int
+    # until set, content may still be found under the legacy layout
+    migrated: bool
+
+
 @dataclasses.dataclass
 class DiskStore:
     root_directory: str
     logging_func: Callable[[str], None] = print
+    # only applied when initializing an empty store, else the recorded layout wins
+    fanout_depth: int = _DEFAULT_FANOUT_DEPTH
+
+    def __post_init__(self):
+        self.layout = self._load_layout()
 
     def has_document_content(self, hash: str) -> bool:
-        content_path = self._hash_path(hash)
-        return os.path.exists(content_path)
+        return self._resolve_path(hash) is not None
 
     def save_document_content(self, hash: str, documents: list[Document]):
         self.logging_func(f"Saving {hash}")
@@ -35,93 +56,280 @@ class DiskStore:
 
         os.makedirs(os.path.dirname(content_path), exist_ok=True)
 
-        with open(content_path, "w+") as f:
+        # written aside and swapped in, concurrent readers never see a partial file
+        temp_path = f"{content_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
             self.logging_func(f"Saving document {os.path.abspath(content_path)}")
-            document_dict = {}
-            for i, doc in enumerate(documents):
-                document_dict[i] = {"c": doc.page_content}
-                if doc.metadata:
-                    document_dict[i]["m"] = doc.metadata
-
-            json.dump(document_dict, f)
+            document_format.write_documents(f, documents)
+        os.replace(temp_path, content_path)
 
     def restore_document_content(self, hash: str) -> list[Document]:
         self.logging_func(f"Loading document for {hash}")
-        content_path = self._hash_path(hash)
+        content_path = self._content_path(hash)
 
-        with open(content_path, "r") as f:
-            doc_content = json.load(f)
+        def load() -> list[Document]:
+            with open(content_path, "rb") as f:
+                return document_format.read_documents(f)
 
-        sorted_doc_content = sorted(doc_content.items())
-        return [
-            Document(
-                page_content=doc["c"],
-                metadata=doc.get("m", {}),
-            )
-            for _, doc in sorted_doc_content
-        ]
+        documents = read_cache.default_cache().get_or_load(
+            (self.root_directory, "content", hash),
+            self._file_validator(content_path),
+            load,
+            read_cache.documents_size,
+        )
+        # the cached list is shared, callers may modify their copy
+        return list(documents)
 
-    def delete_document_content(self, hash: str):
-        content_path = self._hash_path(hash)
-        os.remove(content_path)
+    def iter_document_content(self, hash: str) -> Iterator[Document]:
+        """Yields the document's chunks in order, decoding one at a time."""
+        with open(self._content_path(hash), "rb") as f:
+            yield from document_format.iter_documents(f)
+
+    def document_chunk_count(self, hash: str) -> int:
+        with open(self._content_path(hash), "rb") as f:
+            return document_format.count_documents(f)
 
-        os.removedirs(os.path.dirname(content_path))
+    def get_document_chunk(self, hash: str, index: int) -> Document:
+        with open(self._content_path(hash), "rb") as f:
+            return document_format.read_document(f, index)
+
+    def delete_document_content(self, hash: str):
+        for content_path in self._candidate_paths(hash):
+            for path in [content_path, content_path + _ENTITY_RELATIONS_SUFFIX]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._prune_directories(os.path.dirname(content_path))
 
     def has_entity_relations(self, hash: str) -> bool:
-        content_path = self._hash_path(hash)
-        entity_relations_path = f"{content_path}.entity_relations"
-        return os.path.exists(entity_relations_path)
+        return self._resolve_path(hash, _ENTITY_RELATIONS_SUFFIX) is not None
 
     def load_entity_relations(self, hash: str) -> list[extraction.EntityRelationSchema]:
-        content_path = self._hash_path(hash)
-        entity_relations_path = f"{content_path}.entity_relations"
-        if not os.path.exists(entity_relations_path):
+        entity_relations_path = self._resolve_path(hash, _ENTITY_RELATIONS_SUFFIX)
+        if entity_relations_path is None:
             return []
-        with open(entity_relations_path, "r") as f:
-            return [extraction.EntityRelationSchema(**x) for x in list(json.load(f))]
+
+        def load() -> list[extraction.EntityRelationSchema]:
+            with open(entity_relations_path, "r") as f:
+                return [
+                    extraction.EntityRelationSchema(**x) for x in list(json.load(f))
+                ]
+
+        entity_relations = read_cache.default_cache().get_or_load(
+            (self.root_directory, "entity_relations", hash),
+            self._file_validator(entity_relations_path),
+            load,
+            read_cache.relations_size,
+        )
+        return list(entity_relations)
 
     def save_entity_relations(
         self,
         hash: str,
         entity_relations: list[extraction.EntityRelationSchema],
     ):
-        content_path = self._hash_path(hash)
-        entity_relations_path = f"{content_path}.entity_relations"
-        if os.path.exists(entity_relations_path):
-            return
+        entity_relations_path = self._hash_path(hash) + _ENTITY_RELATIONS_SUFFIX
+        os.makedirs(os.path.dirname(entity_relations_path), exist_ok=True)
 
+        # replaces relations of a previous extraction, as their indexed rows are
         print(f"saving {len(entity_relations)} relations")
-        with open(entity_relations_path, "w+") as f:
+        temp_path = f"{entity_relations_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
             json.dump([x.model_dump() for x in entity_relations], f)
+        os.replace(temp_path, entity_relations_path)
+
+    def migrate_layout(self) -> int:
+        """Moves content stored under the legacy layout, returning the files moved.
+
+        Safe to run while the store is in use, readers fall back to the legacy
+        location of each file until it has been moved.
+        """
+        moved = 0
+        for hash, suffix, legacy_path in self._legacy_files():
+            target_path = self._hash_path(hash) + suffix
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            if os.path.exists(target_path):
+                # rewritten since the layout changed, the legacy copy is stale
+                os.remove(legacy_path)
+            else:
+                os.replace(legacy_path, target_path)
+                moved += 1
+            self._prune_directories(os.path.dirname(legacy_path))
+
+        self.layout.migrated = True
+        self._save_layout(self.layout)
+        return moved
+
+    def _legacy_files(self) -> Iterator[tuple[str, str, str]]:
+        legacy_depth = _LEGACY_FANOUT_DEPTH + 1
+        for directory, _, files in os.walk(self.root_directory):
+            relative_directory = os.path.relpath(directory, self.root_directory)
+            components = relative_directory.split(os.sep)
+            if len(components) != _LEGACY_FANOUT_DEPTH:
+                continue
+
+            for file_name in files:
+                suffix = ""
+                if file_name.endswith(_ENTITY_RELATIONS_SUFFIX):
+                    suffix = _ENTITY_RELATIONS_SUFFIX
+                    file_name = file_name[: -len(suffix)]
+                path_components = components + [file_name]
+                if len(path_components) != legacy_depth:
+                    continue
+                hash = "".join(path_components)
+                yield hash, suffix, os.path.join(directory, file_name + suffix)
+
+    def _load_layout(self) -> StoreLayout:
+        marker_path = os.path.join(self.root_directory, _LAYOUT_MARKER)
+        if os.path.exists(marker_path):
+            with open(marker_path, "r") as f:
+                return StoreLayout(**json.load(f))
+
+        has_content = os.path.isdir(self.root_directory) and any(
+            x != _LAYOUT_MARKER for x in os.listdir(self.root_directory)
+        )
+        layout = StoreLayout(
+            version=_LAYOUT_VERSION,
+            fanout_depth=self.fanout_depth,
+            migrated=not has_content,
+        )
+        self._save_layout(layout)
+        return layout
+
+    def _save_layout(self, layout: StoreLayout):
+        os.makedirs(self.root_directory, exist_ok=True)
+        marker_path = os.path.join(self.root_directory, _LAYOUT_MARKER)
+        # written aside and swapped in, concurrent readers never see a partial file
+        temp_path = f"{marker_path}.{os.getpid()}"
+        with open(temp_path, "w+") as f:
+            json.dump(dataclasses.asdict(layout), f)
+        os.replace(temp_path, marker_path)
+
+    def _prune_directories(self, directory: str):
+        root = os.path.abspath(self.root_directory)
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # not empty, or already removed by a concurrent caller
+                return
+            directory = os.path.dirname(directory)
+
+    def _candidate_paths(self, hash: str) -> list[str]:
+        paths = [self._hash_path(hash)]
+        if not self.layout.migrated:
+            paths.append(self._legacy_hash_path(hash))
+        return paths
+
+    def _file_validator(self, path: str) -> tuple[int, int, int]:
+        # files are replaced rather than rewritten, so any change alters the inode
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _content_path(self, hash: str) -> str:
+        content_path = self._resolve_path(hash)
+        if content_path is None:
+            raise FileNotFoundError(f"No document content for {hash}")
+        return content_path
+
+    def _resolve_path(self, hash: str, suffix: str = "") -> str | None:
+        return next(
+            (
+                x + suffix
+                for x in self._candidate_paths(hash)
+                if os.path.exists(x + suffix)
+            ),
+            None,
+        )
 
     def _hash_path(self, hash: str) -> str:
-        return os.path.join(self.root_directory, *_generate_path_components(hash))
+        return os.path.join(
+            self.root_directory,
+            *_generate_path_components(hash, self.layout.fanout_depth),
+        )
+
+    def _legacy_hash_path(self, hash: str) -> str:
+        return os.path.join(
+            self.root_directory,
+            *_generate_path_components(hash, _LEGACY_FANOUT_DEPTH),
+        )
 
 
 def default_store(**kwargs):
     root = os.environ.get("HOME", ".")
+    backend = kwargs.pop("backend", os.environ.get("KMS_STORE_BACKEND", "disk"))
+    if backend == "segment":
+        return segment_store.open_store(
+            root_directory=kwargs.pop("root_directory", f"{root}/kms/segments"),
+            **kwargs,
+        )
+
+    if backend != "disk":
+        raise ValueError(f"Unknown document store backend [{backend}]")
+
     return DiskStore(
         root_directory=kwargs.pop("root_directory", f"{root}/kms/docs"), **kwargs
     )
 
 
 if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    if sys.argv[1:] == ["migrate"]:
+        # python -m doc_store.disk_store migrate
+        moved = default_store().migrate_layout()
+        print(f"Moved {moved} files to the current layout")
+        sys.exit(0)
+
     # correct length of initial hash shcema
     hash = "1234567890123456" * 4
     docs = [
         Document(page_content="1234", metadata={}),
         Document(page_content="5678", metadata={"test": "1234"}),
     ]
-    store = DiskStore(root_directory="root_path")
-    store.save_document_content(
-        hash,
-        docs,
-    )
+    with tempfile.TemporaryDirectory() as root:
+        store = DiskStore(root_directory=root)
+        store.save_document_content(
+            hash,
+            docs,
+        )
+
+        try:
+            restored_docs = store.restore_document_content(hash)
+            for i, doc in enumerate(restored_docs):
+                print(doc)
+                assert docs[i] == doc
+            assert list(store.iter_document_content(hash)) == docs
+
+            # repeated reads are served from memory until the file changes
+            hits = read_cache.get_cache_stats().hits
+            assert store.restore_document_content(hash) == docs
+            assert read_cache.get_cache_stats().hits == hits + 1
+            store.save_document_content(hash, docs[:1])
+            assert store.restore_document_content(hash) == docs[:1]
+            assert read_cache.get_cache_stats().hits == hits + 1
+            store.save_document_content(hash, docs)
+            assert store.document_chunk_count(hash) == len(docs)
+            assert store.get_document_chunk(hash, 1) == docs[1]
+        finally:
+            store.delete_document_content(hash)
+        assert os.listdir(root) == [_LAYOUT_MARKER]
+
+    # content written under the legacy layout remains readable until migrated
+    with tempfile.TemporaryDirectory() as root:
+        legacy_store = DiskStore(root_directory=root)
+        legacy_path = legacy_store._legacy_hash_path(hash)
+        os.makedirs(os.path.dirname(legacy_path))
+        with open(legacy_path, "w+") as f:
+            json.dump({"0": {"c": "1234"}}, f)
+        os.remove(os.path.join(root, _LAYOUT_MARKER))
+
+        store = DiskStore(root_directory=root)
+        assert not store.layout.migrated
+        assert store.has_document_content(hash)
 
-    try:
-        restored_docs = store.restore_document_content(hash)
-        for i, doc in enumerate(docs):
-            print(doc)
-            assert docs[i] == doc
-    finally:
-        store.delete_document_content(hash)
+        assert store.migrate_layout() == 1
+        assert DiskStore(root_directory=root).layout.migrated
+        assert os.path.exists(store._hash_path(hash))
+        assert store.restore_document_content(hash)[0].page_content == "1234"
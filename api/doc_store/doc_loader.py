@@ -4,6 +4,11 @@ from loaders import loaders
 
 
 def get_url_documents(url: str) -> list[Document]:
+    """Loads the documents of `url`, downloaded within the limits of its host.
+
+    Raises `fetch_scheduler.HostUnavailableError` when the host is busy or
+    throttled, for the fetch to be retried later.
+    """
     loader = loaders.locate(url)
     if loader is not None:
         docs = loader.load()
@@ -0,0 +1,257 @@
+"""Versioned binary container for stored document chunks.
+
+Layout, little-endian:
+
+    header  magic "KMSD" | version u16 | codec u8 | reserved u8 | chunk count u32
+    index   chunk count * (offset u64 | length u64), relative to the first chunk
+    chunks  compressed JSON objects {"c": page_content, "m": metadata}
+
+Chunks are compressed individually so any one of them can be read without
+decompressing the others. Files written before the container existed are plain
+JSON objects keyed by chunk index, and remain readable.
+"""
+import dataclasses
+import enum
+import json
+import struct
+import threading
+import zlib
+from typing import BinaryIO, Iterator
+
+from langchain.docstore.document import Document
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_VERSION = 1
+
+_MAGIC = b"KMSD"
+_HEADER = struct.Struct("<4sHBBI")
+_INDEX_ENTRY = struct.Struct("<QQ")
+
+# zstandard contexts are costly to create per chunk and unsafe to share across
+# threads
+_zstd_contexts = threading.local()
+
+
+class Codec(enum.IntEnum):
+    NONE = 0
+    ZLIB = 1
+    ZSTD = 2
+
+
+DEFAULT_CODEC = Codec.ZSTD if zstandard is not None else Codec.ZLIB
+
+
+class DocumentFormatError(Exception):
+    """Raised when stored content cannot be decoded."""
+
+
+@dataclasses.dataclass
+class Header:
+    version: int
+    codec: Codec
+    # (offset, length) of each chunk, relative to `data_offset`
+    chunks: list[tuple[int, int]]
+    data_offset: int
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.chunks)
+
+
+def _zstd_compressor() -> "zstandard.ZstdCompressor":
+    if not hasattr(_zstd_contexts, "compressor"):
+        _zstd_contexts.compressor = zstandard.ZstdCompressor()
+    return _zstd_contexts.compressor
+
+
+def _zstd_decompressor() -> "zstandard.ZstdDecompressor":
+    if not hasattr(_zstd_contexts, "decompressor"):
+        _zstd_contexts.decompressor = zstandard.ZstdDecompressor()
+    return _zstd_contexts.decompressor
+
+
+def _compress(codec: Codec, data: bytes) -> bytes:
+    match codec:
+        case Codec.NONE:
+            return data
+        case Codec.ZLIB:
+            return zlib.compress(data)
+        case Codec.ZSTD:
+            if zstandard is None:
+                raise DocumentFormatError("zstandard is required for Codec.ZSTD")
+            return _zstd_compressor().compress(data)
+
+    raise DocumentFormatError(f"Unknown codec {codec}")
+
+
+def _decompress(codec: Codec, data: bytes) -> bytes:
+    match codec:
+        case Codec.NONE:
+            return data
+        case Codec.ZLIB:
+            return zlib.decompress(data)
+        case Codec.ZSTD:
+            if zstandard is None:
+                raise DocumentFormatError("zstandard is required to read this file")
+            return _zstd_decompressor().decompress(data)
+
+    raise DocumentFormatError(f"Unknown codec {codec}")
+
+
+def _encode_document(document: Document) -> bytes:
+    value: dict = {"c": document.page_content}
+    if document.metadata:
+        value["m"] = document.metadata
+    return json.dumps(value).encode()
+
+
+def _decode_document(data: bytes) -> Document:
+    value = json.loads(data)
+    return Document(page_content=value["c"], metadata=value.get("m", {}))
+
+
+def write_documents(
+    f: BinaryIO,
+    documents: list[Document],
+    codec: Codec = DEFAULT_CODEC,
+):
+    chunks = [_compress(codec, _encode_document(x)) for x in documents]
+
+    f.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, codec, 0, len(chunks)))
+    offset = 0
+    for chunk in chunks:
+        f.write(_INDEX_ENTRY.pack(offset, len(chunk)))
+        offset += len(chunk)
+    for chunk in chunks:
+        f.write(chunk)
+
+
+def is_container(f: BinaryIO) -> bool:
+    """Whether the file holds a container, rather than legacy JSON."""
+    position = f.tell()
+    magic = f.read(len(_MAGIC))
+    f.seek(position)
+    return magic == _MAGIC
+
+
+def read_header(f: BinaryIO, base_offset: int = 0) -> Header:
+    """Reads the header of a container starting `base_offset` bytes into `f`."""
+    f.seek(base_offset)
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        raise DocumentFormatError("Truncated header")
+
+    magic, version, codec, _, chunk_count = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        raise DocumentFormatError("Not a document container")
+    if version > FORMAT_VERSION:
+        raise DocumentFormatError(f"Unsupported format version {version}")
+
+    index = f.read(_INDEX_ENTRY.size * chunk_count)
+    if len(index) != _INDEX_ENTRY.size * chunk_count:
+        raise DocumentFormatError("Truncated chunk index")
+
+    return Header(
+        version=version,
+        codec=Codec(codec),
+        chunks=[
+            _INDEX_ENTRY.unpack_from(index, i * _INDEX_ENTRY.size)
+            for i in range(chunk_count)
+        ],
+        data_offset=base_offset + _HEADER.size + len(index),
+    )
+
+
+def read_chunk(f: BinaryIO, header: Header, index: int) -> Document:
+    offset, length = header.chunks[index]
+    f.seek(header.data_offset + offset)
+    return _decode_document(_decompress(header.codec, f.read(length)))
+
+
+def read_legacy_documents(f: BinaryIO) -> list[Document]:
+    doc_content = json.load(f)
+    # keys are stringified indices, "10" must follow "9"
+    sorted_doc_content = sorted(doc_content.items(), key=lambda x: int(x[0]))
+    return [
+        Document(
+            page_content=doc["c"],
+            metadata=doc.get("m", {}),
+        )
+        for _, doc in sorted_doc_content
+    ]
+
+
+def iter_documents(f: BinaryIO, base_offset: int = 0) -> Iterator[Document]:
+    """Yields chunks in order, holding a single decoded chunk at a time.
+
+    Legacy JSON files can only be decoded whole, and are materialized first.
+    """
+    f.seek(base_offset)
+    if not is_container(f):
+        yield from read_legacy_documents(f)
+        return
+
+    header = read_header(f, base_offset)
+    for i in range(header.chunk_count):
+        yield read_chunk(f, header, i)
+
+
+def read_documents(f: BinaryIO, base_offset: int = 0) -> list[Document]:
+    return list(iter_documents(f, base_offset))
+
+
+def count_documents(f: BinaryIO, base_offset: int = 0) -> int:
+    f.seek(base_offset)
+    if not is_container(f):
+        return len(read_legacy_documents(f))
+
+    return read_header(f, base_offset).chunk_count
+
+
+def read_document(f: BinaryIO, index: int, base_offset: int = 0) -> Document:
+    """Reads the chunk at `index`, decoding no other chunk of a container."""
+    f.seek(base_offset)
+    if not is_container(f):
+        return read_legacy_documents(f)[index]
+
+    return read_chunk(f, read_header(f, base_offset), index)
+
+
+if __name__ == "__main__":
+    import io
+
+    docs = [
+        Document(page_content=f"chunk {i}", metadata={"i": i} if i % 2 else {})
+        for i in range(12)
+    ]
+
+    for codec in [Codec.NONE, Codec.ZLIB, DEFAULT_CODEC]:
+        buffer = io.BytesIO()
+        write_documents(buffer, docs, codec)
+        buffer.seek(0)
+        assert read_documents(buffer) == docs
+
+        header = read_header(buffer)
+        assert header.chunk_count == len(docs)
+        assert read_chunk(buffer, header, 10) == docs[10]
+
+    legacy = {i: {"c": doc.page_content} for i, doc in enumerate(docs)}
+    for i, doc in enumerate(docs):
+        if doc.metadata:
+            legacy[i]["m"] = doc.metadata
+    buffer = io.BytesIO(json.dumps(legacy).encode())
+    assert read_documents(buffer) == docs
+
+    # containers embedded within a larger file
+    buffer = io.BytesIO()
+    buffer.write(b"prefix")
+    write_documents(buffer, docs)
+    header = read_header(buffer, len(b"prefix"))
+    assert read_chunk(buffer, header, 3) == docs[3]
+    assert list(iter_documents(buffer, len(b"prefix"))) == docs
+    assert count_documents(buffer, len(b"prefix")) == len(docs)
+    assert read_document(buffer, 11, len(b"prefix")) == docs[11]
@@ -0,0 +1,73 @@
+# Compares the stored size and load time of the legacy JSON format against the
+# document container, for each available codec.
+#
+# cd api; python -m doc_store.format_benchmark [chunk_count]
+import io
+import json
+import random
+import sys
+import time
+
+from langchain.docstore.document import Document
+
+from doc_store import document_format
+
+_WORDS = (
+    "the model document summary relation entity graph knowledge reading list "
+    "transcript page paper article browser extension pipeline process task"
+).split()
+
+
+def _generate_documents(chunk_count: int) -> list[Document]:
+    rng = random.Random(0)
+    return [
+        Document(
+            # matches the 1000 character chunks produced by the web page loader
+            page_content=" ".join(rng.choice(_WORDS) for _ in range(160))[:1000],
+            metadata={"source": "https://example.com/article", "page": i},
+        )
+        for i in range(chunk_count)
+    ]
+
+
+def _legacy_bytes(documents: list[Document]) -> bytes:
+    document_dict = {}
+    for i, doc in enumerate(documents):
+        document_dict[i] = {"c": doc.page_content}
+        if doc.metadata:
+            document_dict[i]["m"] = doc.metadata
+    return json.dumps(document_dict).encode()
+
+
+def _container_bytes(documents: list[Document], codec: document_format.Codec) -> bytes:
+    buffer = io.BytesIO()
+    document_format.write_documents(buffer, documents, codec)
+    return buffer.getvalue()
+
+
+def _time_load(data: bytes, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        document_format.read_documents(io.BytesIO(data))
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == "__main__":
+    chunk_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = 5
+    documents = _generate_documents(chunk_count)
+
+    candidates = {"legacy json": _legacy_bytes(documents)}
+    codecs = [document_format.Codec.NONE, document_format.Codec.ZLIB]
+    if document_format.zstandard is not None:
+        codecs.append(document_format.Codec.ZSTD)
+    for codec in codecs:
+        candidates[f"container {codec.name.lower()}"] = _container_bytes(
+            documents, codec
+        )
+
+    print(f"{chunk_count} chunks, load time averaged over {repeats} runs")
+    print(f"{'format':<20}{'bytes':>12}{'load ms':>12}")
+    for name, data in candidates.items():
+        load_ms = _time_load(data, repeats) * 1000
+        print(f"{name:<20}{len(data):>12}{load_ms:>12.1f}")
@@ -0,0 +1,132 @@
+import collections
+import dataclasses
+import os
+import threading
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+_DEFAULT_MAX_BYTES = int(os.environ.get("KMS_STORE_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+@dataclasses.dataclass
+class CacheStats:
+    max_bytes: int
+    size_bytes: int = 0
+    entries: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+@dataclasses.dataclass
+class _CacheEntry:
+    # identifies the stored version the value was read from
+    validator: Hashable
+    value: object
+    size_bytes: int
+
+
+class ReadCache:
+    """Size-bounded LRU of decoded store reads, shared within a process.
+
+    Entries are keyed by what was read, and only served while the caller's
+    validator (e.g. file mtime and size) matches the one recorded with them.
+    """
+
+    def __init__(self, max_bytes: int = _DEFAULT_MAX_BYTES):
+        self._lock = threading.Lock()
+        self._entries: collections.OrderedDict[Hashable, _CacheEntry] = (
+            collections.OrderedDict()
+        )
+        self._stats = CacheStats(max_bytes=max_bytes)
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        validator: Hashable,
+        load: Callable[[], T],
+        size_of: Callable[[T], int],
+    ) -> T:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.validator == validator:
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                return entry.value  # type: ignore
+            self._stats.misses += 1
+
+        value = load()
+        self._put(key, _CacheEntry(validator, value, size_of(value)))
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._remove(key)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return dataclasses.replace(self._stats, entries=len(self._entries))
+
+    def _put(self, key: Hashable, entry: _CacheEntry):
+        with self._lock:
+            self._remove(key)
+            if entry.size_bytes > self._stats.max_bytes:
+                return
+
+            self._entries[key] = entry
+            self._stats.size_bytes += entry.size_bytes
+            while self._stats.size_bytes > self._stats.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._stats.size_bytes -= evicted.size_bytes
+                self._stats.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._stats.size_bytes -= entry.size_bytes
+
+
+_DEFAULT_CACHE = ReadCache()
+
+
+def default_cache() -> ReadCache:
+    return _DEFAULT_CACHE
+
+
+def get_cache_stats() -> CacheStats:
+    return _DEFAULT_CACHE.stats()
+
+
+def documents_size(documents: list) -> int:
+    """Approximates the memory held by decoded documents."""
+    return sum(len(x.page_content) + len(str(x.metadata)) for x in documents)
+
+
+def relations_size(relations: list) -> int:
+    return sum(len(x.entity) + len(x.target) + len(x.relationship) for x in relations)
+
+
+if __name__ == "__main__":
+    cache = ReadCache(max_bytes=10)
+    loads = []
+
+    def loader(value: str) -> Callable[[], str]:
+        def load():
+            loads.append(value)
+            return value
+
+        return load
+
+    assert cache.get_or_load("a", 1, loader("aaaa"), len) == "aaaa"
+    assert cache.get_or_load("a", 1, loader("xxxx"), len) == "aaaa"
+    # a changed validator is a miss
+    assert cache.get_or_load("a", 2, loader("bbbb"), len) == "bbbb"
+
+    cache.get_or_load("c", 1, loader("cccc"), len)
+    cache.get_or_load("d", 1, loader("dddd"), len)
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.size_bytes == 8
+    assert (stats.hits, stats.misses) == (1, 4)
+    assert loads == ["aaaa", "bbbb", "cccc", "dddd"]
@@ -0,0 +1,443 @@
+import contextlib
+import dataclasses
+import enum
+import fcntl
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+from langchain.docstore.document import Document
+from typing import BinaryIO, Callable, Hashable, Iterator
+
+from analyzers import extraction
+from doc_store import document_format, read_cache
+
+# segments are rolled over once they exceed this size
+_MAX_SEGMENT_BYTES = int(os.environ.get("KMS_SEGMENT_MAX_BYTES", 256 * 1024 * 1024))
+
+_INDEX_FILE = "index.dat"
+_LOCK_FILE = "store.lock"
+_INDEX_MAGIC = b"KMSI"
+_INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct("<4sHH")
+# kind | hash | segment id | offset | length
+_INDEX_ENTRY = struct.Struct("<B64sIQQ")
+_RECORD_MAGIC = b"KMSR"
+# magic | kind | hash | payload length
+_RECORD_HEADER = struct.Struct("<4sB64sQ")
+
+
+class RecordKind(enum.IntEnum):
+    CONTENT = 1
+    ENTITY_RELATIONS = 2
+    # supersedes every other kind for the hash
+    DELETED = 3
+
+
+@dataclasses.dataclass
+class RecordLocation:
+    segment: int
+    # offset of the payload, past the record header
+    offset: int
+    length: int
+
+
+def _segment_name(segment: int) -> str:
+    return f"segment-{segment:08d}.dat"
+
+
+@dataclasses.dataclass
+class SegmentStore:
+    """Stores all records in large append-only segment files.
+
+    Every write appends a record to the active segment, then an entry to the index
+    file. The index is read into memory when opened, and entries other processes
+    append are read once the index file grows, the latest entry for a (kind, hash)
+    pair being authoritative.
+    Superseded records are reclaimed by `compact`.
+    """
+
+    root_directory: str
+    logging_func: Callable[[str], None] = print
+
+    def __post_init__(self):
+        os.makedirs(self.root_directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_state = threading.local()
+        self._locations: dict[tuple[RecordKind, str], RecordLocation] = {}
+        self._index_inode = None
+        self._index_size = 0
+        self._refresh_index()
+
+    def has_document_content(self, hash: str) -> bool:
+        return self._locate(RecordKind.CONTENT, hash) is not None
+
+    def save_document_content(self, hash: str, documents: list[Document]):
+        self.logging_func(f"Saving {hash}")
+        buffer = io.BytesIO()
+        document_format.write_documents(buffer, documents)
+        self._append(RecordKind.CONTENT, hash, buffer.getvalue())
+
+    def restore_document_content(self, hash: str) -> list[Document]:
+        self.logging_func(f"Loading document for {hash}")
+
+        def load() -> list[Document]:
+            with self._open_record(RecordKind.CONTENT, hash) as (f, location):
+                return document_format.read_documents(f, location.offset)
+
+        documents = read_cache.default_cache().get_or_load(
+            (self.root_directory, RecordKind.CONTENT, hash),
+            self._record_validator(RecordKind.CONTENT, hash),
+            load,
+            read_cache.documents_size,
+        )
+        # the cached list is shared, callers may modify their copy
+        return list(documents)
+
+    def iter_document_content(self, hash: str) -> Iterator[Document]:
+        """Yields the document's chunks in order, decoding one at a time."""
+        with self._open_record(RecordKind.CONTENT, hash) as (f, location):
+            yield from document_format.iter_documents(f, location.offset)
+
+    def document_chunk_count(self, hash: str) -> int:
+        with self._open_record(RecordKind.CONTENT, hash) as (f, location):
+            return document_format.count_documents(f, location.offset)
+
+    def get_document_chunk(self, hash: str, index: int) -> Document:
+        with self._open_record(RecordKind.CONTENT, hash) as (f, location):
+            return document_format.read_document(f, index, location.offset)
+
+    def delete_document_content(self, hash: str):
+        self._append(RecordKind.DELETED, hash, b"")
+
+    def has_entity_relations(self, hash: str) -> bool:
+        return self._locate(RecordKind.ENTITY_RELATIONS, hash) is not None
+
+    def load_entity_relations(self, hash: str) -> list[extraction.EntityRelationSchema]:
+        if not self.has_entity_relations(hash):
+            return []
+
+        def load() -> list[extraction.EntityRelationSchema]:
+            with self._open_record(RecordKind.ENTITY_RELATIONS, hash) as (f, location):
+                f.seek(location.offset)
+                relations = json.loads(f.read(location.length))
+                return [extraction.EntityRelationSchema(**x) for x in list(relations)]
+
+        entity_relations = read_cache.default_cache().get_or_load(
+            (self.root_directory, RecordKind.ENTITY_RELATIONS, hash),
+            self._record_validator(RecordKind.ENTITY_RELATIONS, hash),
+            load,
+            read_cache.relations_size,
+        )
+        return list(entity_relations)
+
+    def save_entity_relations(
+        self,
+        hash: str,
+        entity_relations: list[extraction.EntityRelationSchema],
+    ):
+        # supersedes relations of a previous extraction, as their indexed rows are
+        print(f"saving {len(entity_relations)} relations")
+        payload = json.dumps([x.model_dump() for x in entity_relations]).encode()
+        self._append(RecordKind.ENTITY_RELATIONS, hash, payload)
+
+    def compact(self) -> int:
+        """Rewrites live records into new segments, returning the bytes reclaimed."""
+        with self._exclusive():
+            self._refresh_index()
+            old_segments = self._segment_ids()
+            next_segment = (old_segments[-1] + 1) if old_segments else 0
+
+            # deleted and superseded records have no location, and are dropped
+            live = dict(self._locations)
+            entries = []
+            segment = next_segment
+            segment_file = open(self._segment_path(segment), "ab")
+            try:
+                for (kind, hash), location in live.items():
+                    if segment_file.tell() >= _MAX_SEGMENT_BYTES:
+                        segment_file.close()
+                        segment += 1
+                        segment_file = open(self._segment_path(segment), "ab")
+                    payload = self._read_payload(location)
+                    new_location = self._write_record(
+                        segment_file, segment, kind, hash, payload
+                    )
+                    entries.append((kind, hash, new_location))
+            finally:
+                segment_file.close()
+
+            # swapped in atomically, readers observe the inode change and reload
+            index_path = os.path.join(self.root_directory, _INDEX_FILE)
+            temp_path = f"{index_path}.compact"
+            with open(temp_path, "wb") as f:
+                f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, 0))
+                for kind, hash, location in entries:
+                    f.write(self._pack_entry(kind, hash, location))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, index_path)
+
+            reclaimed = 0
+            for old_segment in old_segments:
+                path = self._segment_path(old_segment)
+                reclaimed += os.path.getsize(path)
+                os.remove(path)
+            reclaimed -= sum(
+                os.path.getsize(self._segment_path(x))
+                for x in range(next_segment, segment + 1)
+            )
+
+            self._refresh_index()
+            return reclaimed
+
+    def _record_validator(self, kind: RecordKind, hash: str) -> Hashable:
+        # records are never rewritten in place, a new write has a new location
+        location = self._locate(kind, hash)
+        if location is None:
+            raise FileNotFoundError(f"No {kind.name.lower()} record for {hash}")
+        return location.segment, location.offset, location.length
+
+    def _locate(self, kind: RecordKind, hash: str) -> RecordLocation | None:
+        with self._lock:
+            self._refresh_index()
+            return self._locations.get((kind, hash))
+
+    @contextlib.contextmanager
+    def _open_record(
+        self, kind: RecordKind, hash: str
+    ) -> Iterator[tuple[BinaryIO, RecordLocation]]:
+        """Opens the segment holding the record, for reads from its location.
+
+        An open segment remains readable after it is removed by compaction.
+        """
+        location = self._locate(kind, hash)
+        if location is None:
+            raise FileNotFoundError(f"No {kind.name.lower()} record for {hash}")
+
+        try:
+            f = open(self._segment_path(location.segment), "rb")
+        except FileNotFoundError:
+            # segment removed by a concurrent compaction, locations have moved
+            with self._lock:
+                self._index_inode = None
+            location = self._locate(kind, hash)
+            if location is None:
+                raise
+            f = open(self._segment_path(location.segment), "rb")
+
+        with f:
+            yield f, location
+
+    def _read_payload(self, location: RecordLocation) -> bytes:
+        with open(self._segment_path(location.segment), "rb") as f:
+            f.seek(location.offset)
+            return f.read(location.length)
+
+    def _append(self, kind: RecordKind, hash: str, payload: bytes):
+        with self._exclusive():
+            segment_ids = self._segment_ids()
+            segment = segment_ids[-1] if segment_ids else 0
+            segment_path = self._segment_path(segment)
+            if os.path.exists(segment_path):
+                if os.path.getsize(segment_path) >= _MAX_SEGMENT_BYTES:
+                    segment += 1
+
+            with open(self._segment_path(segment), "ab") as f:
+                location = self._write_record(f, segment, kind, hash, payload)
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(os.path.join(self.root_directory, _INDEX_FILE), "ab") as f:
+                f.write(self._pack_entry(kind, hash, location))
+
+            self._refresh_index()
+
+    def _write_record(
+        self,
+        f: BinaryIO,
+        segment: int,
+        kind: RecordKind,
+        hash: str,
+        payload: bytes,
+    ) -> RecordLocation:
+        f.seek(0, os.SEEK_END)
+        f.write(_RECORD_HEADER.pack(_RECORD_MAGIC, kind, hash.encode(), len(payload)))
+        offset = f.tell()
+        f.write(payload)
+        return RecordLocation(segment=segment, offset=offset, length=len(payload))
+
+    def _pack_entry(
+        self, kind: RecordKind, hash: str, location: RecordLocation
+    ) -> bytes:
+        return _INDEX_ENTRY.pack(
+            kind,
+            hash.encode(),
+            location.segment,
+            location.offset,
+            location.length,
+        )
+
+    def _refresh_index(self):
+        """Applies index entries appended since the last refresh."""
+        index_path = os.path.join(self.root_directory, _INDEX_FILE)
+        with self._lock:
+            # lookups of an unchanged index take no file lock, a partially written
+            # entry is skipped below just as it is under the lock
+            try:
+                stat = os.stat(index_path)
+                if (
+                    stat.st_ino == self._index_inode
+                    and stat.st_size == self._index_size
+                ):
+                    return
+            except FileNotFoundError:
+                pass
+
+            with self._shared():
+                if not os.path.exists(index_path):
+                    with open(index_path, "wb") as f:
+                        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, 0))
+
+                stat = os.stat(index_path)
+                if stat.st_ino != self._index_inode:
+                    # replaced by compaction, entries are re-read from the start
+                    self._locations = {}
+                    self._index_inode = stat.st_ino
+                    self._index_size = 0
+                if stat.st_size == self._index_size:
+                    return
+
+                with open(index_path, "rb") as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                        self._apply_entries(index)
+
+    def _apply_entries(self, index: mmap.mmap):
+        start = self._index_size
+        if start == 0:
+            magic, version, _ = _INDEX_HEADER.unpack_from(index, 0)
+            if magic != _INDEX_MAGIC or version > _INDEX_VERSION:
+                raise document_format.DocumentFormatError("Unsupported segment index")
+            start = _INDEX_HEADER.size
+
+        # a partially written trailing entry is applied on a later refresh
+        end = start + (len(index) - start) // _INDEX_ENTRY.size * _INDEX_ENTRY.size
+        for kind, hash, segment, offset, length in _INDEX_ENTRY.iter_unpack(
+            index[start:end]
+        ):
+            kind = RecordKind(kind)
+            hash = hash.decode()
+            if kind == RecordKind.DELETED:
+                self._locations.pop((RecordKind.CONTENT, hash), None)
+                self._locations.pop((RecordKind.ENTITY_RELATIONS, hash), None)
+                continue
+            self._locations[(kind, hash)] = RecordLocation(
+                segment=segment,
+                offset=offset,
+                length=length,
+            )
+        self._index_size = end
+
+    def _segment_ids(self) -> list[int]:
+        return sorted(
+            int(x[len("segment-") : -len(".dat")])
+            for x in os.listdir(self.root_directory)
+            if x.startswith("segment-") and x.endswith(".dat")
+        )
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.root_directory, _segment_name(segment))
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_EX):
+                yield
+
+    @contextlib.contextmanager
+    def _shared(self):
+        with self._file_lock(fcntl.LOCK_SH):
+            yield
+
+    @contextlib.contextmanager
+    def _file_lock(self, operation: int):
+        # flock is per open file, nested acquisitions must not re-lock (and so
+        # downgrade) the lock already held by this thread
+        if getattr(self._lock_state, "held", False):
+            yield
+            return
+
+        with open(os.path.join(self.root_directory, _LOCK_FILE), "a") as f:
+            fcntl.flock(f.fileno(), operation)
+            self._lock_state.held = True
+            try:
+                yield
+            finally:
+                self._lock_state.held = False
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+_OPEN_STORES: dict[tuple[int, str], SegmentStore] = {}
+_OPEN_STORES_LOCK = threading.Lock()
+
+
+def open_store(root_directory: str, **kwargs) -> SegmentStore:
+    """Returns the process-wide store for the directory, sharing its index."""
+    key = (os.getpid(), os.path.abspath(root_directory))
+    with _OPEN_STORES_LOCK:
+        store = _OPEN_STORES.get(key)
+        if store is None:
+            store = SegmentStore(root_directory=root_directory, **kwargs)
+            _OPEN_STORES[key] = store
+        return store
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    if sys.argv[1:] == ["compact"]:
+        # python -m doc_store.segment_store compact
+        from doc_store import disk_store
+
+        reclaimed = disk_store.default_store(backend="segment").compact()
+        print(f"Reclaimed {reclaimed} bytes")
+        sys.exit(0)
+
+    hash = "1234567890123456" * 4
+    docs = [
+        Document(page_content="1234", metadata={}),
+        Document(page_content="5678", metadata={"test": "1234"}),
+    ]
+    relations = [
+        extraction.EntityRelationSchema(entity="a", target="b", relationship="c")
+    ]
+
+    with tempfile.TemporaryDirectory() as root:
+        store = SegmentStore(root_directory=root)
+        assert not store.has_document_content(hash)
+
+        store.save_document_content(hash, docs[:1])
+        store.save_document_content(hash, docs)
+        store.save_entity_relations(hash, relations)
+        assert store.restore_document_content(hash) == docs
+        assert list(store.iter_document_content(hash)) == docs
+        assert store.get_document_chunk(hash, 1) == docs[1]
+        assert store.document_chunk_count(hash) == len(docs)
+        assert store.load_entity_relations(hash) == relations
+        store.save_entity_relations(hash, relations * 2)
+        assert store.load_entity_relations(hash) == relations * 2
+
+        # a second process observes appended entries
+        reader = SegmentStore(root_directory=root)
+        assert reader.restore_document_content(hash) == docs
+
+        assert store.compact() > 0
+        assert store.restore_document_content(hash) == docs
+        assert reader.restore_document_content(hash) == docs
+
+        store.delete_document_content(hash)
+        assert not reader.has_document_content(hash)
+        assert not reader.has_entity_relations(hash)
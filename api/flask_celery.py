@@ -1,10 +1,13 @@
 from functools import partial
 from typing import Callable
 
-from celery import shared_task, group
+from celery import shared_task, group, chain
 from celery.canvas import Signature
+import httpx
 
 from analyzers import tasks as analyzer_tasks
+from loaders import arxiv_papers
+from services import fetch_scheduler
 from services.persist import task
 import constants
 
@@ -32,12 +35,21 @@ def _register_task(
 
 
 @shared_task(bind=True, trail=True)
-def process_content(self, hash: str, requested_task_name: str | None = None):
+def process_content(
+    self,
+    hash: str,
+    requested_task_name: str | None = None,
+    priority: int = constants.BULK_PRIORITY,
+):
     # map must remain within a celery annotated function, else ampq failures will occur
     task_name_map = {
         constants.SUMMARY_TASK: analyzer_tasks.summarize_content.si,
         constants.ENTITIES_TASK: analyzer_tasks.extract_entity_relations.si,
     }
+    if requested_task_name == constants.FETCH_TASK:
+        # re-running the fetch stage resumes the analyzers which depend on it
+        requested_task_name = None
+
     task_requests = []
     if requested_task_name is None:
         task_requests.extend(list(map(tuple, task_name_map.items())))
@@ -61,14 +73,51 @@ def process_content(self, hash: str, requested_task_name: str | None = None):
         return
 
     tasks = []
+    task_names = []
     for name, task_func in task_requests:
         requested_task = register_task(name, task_func)
         if requested_task is None:
             print(f"Task creation failed for {name}")
             continue
         tasks.append(requested_task)
+        task_names.append(name)
 
     if not tasks:
         print("No tasks created")
         return
-    group(tasks).apply_async()
+
+    # content is fetched once, a failed fetch stops every analyzer for the hash
+    task.create_processing_action(hash, self.request.id, constants.FETCH_TASK)
+    fetch_task = analyzer_tasks.fetch_content.si(hash, self.request.id, task_names)
+    # every stage keeps the priority of the originating request
+    chain(
+        fetch_task.set(priority=priority),
+        group(x.set(priority=priority) for x in tasks),
+    ).apply_async()
+
+
+def process_content_async(
+    hash: str, priority: int, requested_task_name: str | None = None
+):
+    """Queues `process_content` ahead of any queued work of a lower priority."""
+    return process_content.apply_async(
+        (hash, requested_task_name, priority),
+        priority=priority,
+    )
+
+
+@shared_task
+def prefetch_arxiv_papers(arxiv_ids: list[str]):
+    """Caches the metadata of arXiv papers, in one request per batch of papers.
+
+    Papers not prefetched are looked up when loaded, so failures are only logged.
+    """
+    scheduler = fetch_scheduler.default_scheduler()
+    try:
+        # the API host shares the slots of arxiv.org, taken by document loads
+        papers = arxiv_papers.fetch_papers(arxiv_ids, download_context=scheduler.slot)
+    except (httpx.HTTPError, fetch_scheduler.HostUnavailableError) as e:
+        print(f"Prefetch of {len(arxiv_ids)} arXiv papers failed: {e}")
+        return
+
+    print(f"Prefetched {len(papers)} of {len(arxiv_ids)} arXiv papers")
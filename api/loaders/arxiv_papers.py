@@ -0,0 +1,282 @@
+"""Exact arXiv ID lookups, batched into single API requests.
+
+Metadata of up to `_BATCH_SIZE` papers is fetched by one `id_list` query of the
+arXiv API. Papers are cached by versioned ID, as the metadata and text of a
+version never change. The version an unversioned ID refers to is looked up
+again once `KMS_ARXIV_METADATA_TTL` seconds have passed.
+"""
+import contextlib
+import dataclasses
+import json
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import Callable, ContextManager
+
+import fitz
+
+from loaders import http_fetch, response_cache
+
+API_URL = os.environ.get("KMS_ARXIV_API_URL", "https://export.arxiv.org/api/query")
+_CACHE_DIRECTORY = os.environ.get(
+    "KMS_ARXIV_CACHE_DIR", os.path.join(os.path.expanduser("~"), "kms", "arxiv")
+)
+_METADATA_TTL_SECONDS = float(os.environ.get("KMS_ARXIV_METADATA_TTL", 24 * 3600))
+_BATCH_SIZE = 100
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+# 2305.05003, 2305.05003v2, or hep-th/9711200v3 prior to 2007
+_ID_PATTERN = re.compile(
+    r"^(?P<id>[0-9]{4}\.[0-9]{4,5}|[a-z\-]+(\.[A-Z]{2})?/[0-9]{7})"
+    r"(v(?P<version>[0-9]+))?$"
+)
+
+
+def split_arxiv_id(arxiv_id: str) -> tuple[str, int | None]:
+    """Returns the ID without its version, and the version if any."""
+    id_match = _ID_PATTERN.match(arxiv_id)
+    if id_match is None:
+        raise ValueError(f"Invalid arXiv ID [{arxiv_id}]")
+    version = id_match.group("version")
+    return id_match.group("id"), int(version) if version is not None else None
+
+
+@dataclasses.dataclass
+class ArxivPaper:
+    # versioned, as in 2305.05003v2
+    id: str
+    title: str
+    summary: str
+    authors: list[str]
+    published: str
+    updated: str
+    pdf_url: str
+
+    def document_metadata(self) -> dict[str, str]:
+        # matches the metadata of langchain's ArxivLoader
+        return {
+            "Published": self.updated[:10],
+            "Title": self.title,
+            "Authors": ", ".join(self.authors),
+            "Summary": self.summary,
+        }
+
+
+def parse_feed(feed: bytes) -> list[ArxivPaper]:
+    """Parses the papers of an API response, skipping error entries."""
+    papers = []
+    for entry in ElementTree.fromstring(feed).iter(f"{_ATOM}entry"):
+        abs_url = entry.findtext(f"{_ATOM}id", "")
+        _, _, arxiv_id = abs_url.partition("/abs/")
+        if not arxiv_id:
+            continue
+
+        pdf_url = next(
+            (
+                x.get("href", "")
+                for x in entry.iter(f"{_ATOM}link")
+                if x.get("title") == "pdf"
+            ),
+            abs_url.replace("/abs/", "/pdf/"),
+        )
+        papers.append(
+            ArxivPaper(
+                id=arxiv_id,
+                title=" ".join(entry.findtext(f"{_ATOM}title", "").split()),
+                summary=entry.findtext(f"{_ATOM}summary", "").strip(),
+                authors=[
+                    x.findtext(f"{_ATOM}name", "") for x in entry.iter(f"{_ATOM}author")
+                ],
+                published=entry.findtext(f"{_ATOM}published", ""),
+                updated=entry.findtext(f"{_ATOM}updated", ""),
+                pdf_url=pdf_url,
+            )
+        )
+    return papers
+
+
+class PaperCache:
+    """Metadata and text of papers on disk, by versioned ID.
+
+    Unversioned IDs point at the version they were last resolved to.
+    """
+
+    def __init__(
+        self,
+        directory: str = _CACHE_DIRECTORY,
+        metadata_ttl_seconds: float = _METADATA_TTL_SECONDS,
+    ):
+        self.directory = directory
+        self.metadata_ttl_seconds = metadata_ttl_seconds
+
+    def get_paper(self, arxiv_id: str) -> ArxivPaper | None:
+        base_id, version = split_arxiv_id(arxiv_id)
+        if version is None:
+            latest_path = self._path("latest", base_id, ".json")
+            try:
+                if time.time() - os.stat(latest_path).st_mtime > (
+                    self.metadata_ttl_seconds
+                ):
+                    return None
+                with open(latest_path, "r", encoding="utf-8") as f:
+                    arxiv_id = json.load(f)["id"]
+            except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                return None
+
+        try:
+            paper_path = self._path("papers", arxiv_id, ".json")
+            with open(paper_path, "r", encoding="utf-8") as f:
+                return ArxivPaper(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def put_paper(self, paper: ArxivPaper, latest: bool = False):
+        """Stores the paper, as the latest version of its ID if `latest`."""
+        self._write(
+            self._path("papers", paper.id, ".json"),
+            json.dumps(dataclasses.asdict(paper)),
+        )
+        if latest:
+            base_id, _ = split_arxiv_id(paper.id)
+            self._write(
+                self._path("latest", base_id, ".json"), json.dumps({"id": paper.id})
+            )
+
+    def get_text(self, paper: ArxivPaper) -> str | None:
+        try:
+            text_path = self._path("papers", paper.id, ".txt")
+            with open(text_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_text(self, paper: ArxivPaper, text: str):
+        self._write(self._path("papers", paper.id, ".txt"), text)
+
+    def _path(self, kind: str, arxiv_id: str, suffix: str) -> str:
+        # IDs prior to 2007 hold their archive, as in hep-th/9711200
+        return os.path.join(self.directory, kind, arxiv_id.replace("/", "_") + suffix)
+
+    @staticmethod
+    def _write(path: str, content: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+
+def fetch_papers(
+    arxiv_ids: list[str],
+    cache: PaperCache | None = None,
+    api_url: str = API_URL,
+    download_context: Callable[[str], ContextManager] = contextlib.nullcontext,
+) -> dict[str, ArxivPaper]:
+    """Returns the papers of `arxiv_ids` found, by the ID requested.
+
+    Papers missing from the cache are fetched in as few requests as possible,
+    each within `download_context` of the API URL, and invalid IDs are skipped.
+    Raises `httpx.HTTPError` for failed requests.
+    """
+    cache = cache or PaperCache()
+    papers = {}
+    missing = []
+    for arxiv_id in dict.fromkeys(arxiv_ids):
+        try:
+            paper = cache.get_paper(arxiv_id)
+        except ValueError as e:
+            print(e)
+            continue
+        if paper is not None:
+            papers[arxiv_id] = paper
+        else:
+            missing.append(arxiv_id)
+
+    for i in range(0, len(missing), _BATCH_SIZE):
+        batch = missing[i : i + _BATCH_SIZE]
+        with download_context(api_url):
+            response = http_fetch.client().get(
+                api_url,
+                params={"id_list": ",".join(batch), "max_results": len(batch)},
+            )
+            response.raise_for_status()
+
+        fetched = {}
+        for paper in parse_feed(response.content):
+            fetched[paper.id] = paper
+            fetched.setdefault(split_arxiv_id(paper.id)[0], paper)
+        for arxiv_id in batch:
+            paper = fetched.get(arxiv_id)
+            if paper is not None:
+                # only an unversioned request resolves the latest version
+                cache.put_paper(paper, latest=split_arxiv_id(arxiv_id)[1] is None)
+                papers[arxiv_id] = paper
+    return papers
+
+
+def paper_text(
+    paper: ArxivPaper,
+    cache: PaperCache | None = None,
+    http_cache: response_cache.ResponseCache | None = None,
+    download_context: Callable[[str], ContextManager] = contextlib.nullcontext,
+) -> str:
+    """Returns the text of the paper's PDF, only downloaded on a cache miss.
+
+    The download, but not the parsing of the PDF, runs within
+    `download_context` of the PDF URL.
+    """
+    cache = cache or PaperCache()
+    text = cache.get_text(paper)
+    if text is None:
+        http_cache = http_cache or response_cache.default_cache()
+        with download_context(paper.pdf_url):
+            with http_cache.fetch(http_fetch.client(), paper.pdf_url) as response:
+                content = response.file.read()
+        with fitz.open(stream=content, filetype="pdf") as pdf:
+            text = "".join(page.get_text() for page in pdf)
+        cache.put_text(paper, text)
+    return text
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from loaders import fetch_fixtures
+
+    assert split_arxiv_id("2305.05003") == ("2305.05003", None)
+    assert split_arxiv_id("hep-th/9711200v3") == ("hep-th/9711200", 3)
+
+    # the fixture server stands in for the arXiv API, from entries it records
+    with tempfile.TemporaryDirectory() as d, fetch_fixtures.serve() as base_url:
+        cache = PaperCache(os.path.join(d, "papers"))
+        api_url = f"{base_url}/arxiv/api/query"
+        arxiv_ids = ["1706.03762", "1810.04805v2", "hep-th/9711200", "2401.00001"]
+
+        papers = fetch_papers(arxiv_ids, cache, api_url)
+        assert fetch_fixtures.arxiv_queries == [arxiv_ids]
+        assert sorted(papers) == sorted(arxiv_ids[:3])
+        assert papers["1706.03762"].id == "1706.03762v7"
+        assert papers["1810.04805v2"].title.startswith("BERT: Pre-training of Deep")
+        assert papers["hep-th/9711200"].authors == ["Juan M. Maldacena"]
+        assert papers["1706.03762"].document_metadata()["Published"] == "2023-08-02"
+
+        # cached by the versioned ID the unversioned ID resolved to
+        cached = fetch_papers(["1706.03762", "1706.03762v7"], cache, api_url)
+        assert cached["1706.03762"] == cached["1706.03762v7"] == papers["1706.03762"]
+        assert len(fetch_fixtures.arxiv_queries) == 1
+
+        http_cache = response_cache.ResponseCache(os.path.join(d, "http"))
+        text = paper_text(papers["1706.03762"], cache, http_cache)
+        assert text.strip() == "Fixture paper 1706.03762v7"
+        assert http_cache.stats().entries == 1
+        assert paper_text(papers["1706.03762"], cache) == text
+
+        # unversioned IDs are resolved again once their entry expires
+        expired = PaperCache(cache.directory, metadata_ttl_seconds=0)
+        fetch_papers(["1706.03762"], expired, api_url)
+        assert fetch_fixtures.arxiv_queries[-1] == ["1706.03762"]
+
+        assert fetch_papers(["not an id"], cache, api_url) == {}
+        assert len(fetch_fixtures.arxiv_queries) == 2
@@ -0,0 +1,260 @@
+import contextlib
+import dataclasses
+import os
+import threading
+import time
+from typing import Iterator
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver import Chrome
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+
+from loaders.pages import PageFetch, build_page_metadata
+
+_MAX_SESSIONS = int(os.environ.get("KMS_BROWSER_SESSIONS", 1))
+# browsers accumulate memory across navigations, and are restarted periodically
+_MAX_PAGES_PER_SESSION = int(os.environ.get("KMS_BROWSER_MAX_PAGES", 50))
+_PAGE_LOAD_TIMEOUT = float(os.environ.get("KMS_BROWSER_PAGE_TIMEOUT", 30))
+_CHECKOUT_TIMEOUT = float(os.environ.get("KMS_BROWSER_CHECKOUT_TIMEOUT", 120))
+
+_METADATA_SCRIPT = """
+const description = document.querySelector('meta[name="description"]');
+return [
+    document.title,
+    description ? description.getAttribute("content") : null,
+    document.documentElement.getAttribute("lang"),
+];
+"""
+
+
+class BrowserTimeoutError(Exception):
+    """Raised when no browser session could be checked out within the timeout."""
+
+
+@dataclasses.dataclass
+class BrowserPoolStats:
+    max_sessions: int
+    # sessions currently running, idle or checked out
+    size: int = 0
+    idle: int = 0
+    sessions_started: int = 0
+    sessions_recycled: int = 0
+    pages_loaded: int = 0
+    startup_seconds: float = 0.0
+
+
+class BrowserSession:
+    """A running headless browser, used by one thread at a time."""
+
+    def __init__(self, page_load_timeout: float = _PAGE_LOAD_TIMEOUT):
+        self.page_load_timeout = page_load_timeout
+        self.pages_loaded = 0
+
+        options = ChromeOptions()
+        options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        start = time.perf_counter()
+        self._driver = Chrome(options=options)
+        self._driver.set_page_load_timeout(page_load_timeout)
+        self.startup_seconds = time.perf_counter() - start
+        # reported by the first page loaded, after which the session is warm
+        self._pending_startup_seconds = self.startup_seconds
+
+    def load(self, url: str) -> PageFetch:
+        start = time.perf_counter()
+        try:
+            self._driver.get(url)
+        except TimeoutException:
+            self._driver.execute_script("window.stop();")
+            raise
+        navigation_seconds = time.perf_counter() - start
+        return self._read_page(url, navigation_seconds)
+
+    def quit(self):
+        try:
+            self._driver.quit()
+        except WebDriverException as e:
+            print(f"Failed to stop browser: {e}")
+
+    def _read_page(self, url: str, navigation_seconds: float) -> PageFetch:
+        self.pages_loaded += 1
+        startup_seconds = self._pending_startup_seconds
+        self._pending_startup_seconds = 0.0
+        return PageFetch(
+            url=url,
+            page_source=self._driver.page_source,
+            metadata=build_page_metadata(
+                url, *self._driver.execute_script(_METADATA_SCRIPT)
+            ),
+            startup_seconds=startup_seconds,
+            navigation_seconds=navigation_seconds,
+        )
+
+
+class BrowserPool:
+    """Warm headless browser sessions, owned by a single process.
+
+    Sessions are started on demand, kept between fetches and restarted after
+    `max_pages` pages. A session which fails for any reason other than a page
+    load timeout is discarded, as the state of its browser is unknown.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = _MAX_SESSIONS,
+        max_pages: int = _MAX_PAGES_PER_SESSION,
+        page_load_timeout: float = _PAGE_LOAD_TIMEOUT,
+    ):
+        if max_sessions < 1 or max_pages < 1:
+            raise ValueError("Browser pool bounds must be positive")
+
+        self.max_sessions = max_sessions
+        self.max_pages = max_pages
+        self.page_load_timeout = page_load_timeout
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle: list[BrowserSession] = []
+        self._size = 0
+        self._stats = BrowserPoolStats(max_sessions=self.max_sessions)
+
+    def _check_pid(self):
+        # a forked child cannot drive the browsers started by its parent
+        if self._pid != os.getpid():
+            self._reset()
+
+    @contextlib.contextmanager
+    def session(
+        self, timeout: float = _CHECKOUT_TIMEOUT
+    ) -> Iterator[BrowserSession]:
+        browser = self._checkout(timeout)
+        pages_loaded = browser.pages_loaded
+        discard = False
+        try:
+            yield browser
+        except TimeoutException:
+            raise
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            self._checkin(browser, browser.pages_loaded - pages_loaded, discard)
+
+    def load_page(self, url: str) -> PageFetch:
+        with self.session() as browser:
+            return browser.load(url)
+
+    def close(self):
+        self._check_pid()
+        with self._available:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for browser in idle:
+            browser.quit()
+
+    def stats(self) -> BrowserPoolStats:
+        self._check_pid()
+        with self._lock:
+            return dataclasses.replace(
+                self._stats,
+                size=self._size,
+                idle=len(self._idle),
+            )
+
+    def _checkout(self, timeout: float) -> BrowserSession:
+        self._check_pid()
+        deadline = time.monotonic() + timeout
+        with self._available:
+            while not self._idle and self._size >= self.max_sessions:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BrowserTimeoutError(f"No browser available after {timeout}s")
+                self._available.wait(remaining)
+
+            if self._idle:
+                return self._idle.pop()
+            # reserve the slot, start the browser outside of the lock
+            self._size += 1
+
+        try:
+            browser = BrowserSession(self.page_load_timeout)
+        except BaseException:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+        with self._lock:
+            self._stats.sessions_started += 1
+            self._stats.startup_seconds += browser.startup_seconds
+        return browser
+
+    def _checkin(self, browser: BrowserSession, pages_loaded: int, discard: bool):
+        if self._pid != os.getpid():
+            return
+
+        recycle = discard or browser.pages_loaded >= self.max_pages
+        with self._available:
+            self._stats.pages_loaded += pages_loaded
+            if recycle:
+                self._size -= 1
+                self._stats.sessions_recycled += 1
+            else:
+                self._idle.append(browser)
+            self._available.notify()
+
+        if recycle:
+            browser.quit()
+
+
+_DEFAULT_POOL: BrowserPool | None = None
+_DEFAULT_POOL_LOCK = threading.Lock()
+
+
+def default_pool() -> BrowserPool:
+    global _DEFAULT_POOL
+    if _DEFAULT_POOL is None:
+        with _DEFAULT_POOL_LOCK:
+            if _DEFAULT_POOL is None:
+                _DEFAULT_POOL = BrowserPool()
+    return _DEFAULT_POOL
+
+
+def close_default_pool():
+    if _DEFAULT_POOL is not None:
+        _DEFAULT_POOL.close()
+
+
+def get_pool_stats() -> BrowserPoolStats:
+    return default_pool().stats()
+
+
+if __name__ == "__main__":
+    import sys
+
+    urls = sys.argv[1:] or [
+        "https://docs.python.org/3/library/urllib.parse.html",
+        "https://docs.python.org/3/library/urllib.request.html",
+        "https://docs.python.org/3/library/http.client.html",
+    ]
+    browser_pool = BrowserPool(max_sessions=1, max_pages=len(urls) * 2)
+
+    print(f"{'pass':<8}{'startup s':>12}{'navigation s':>14}  url")
+    for load_pass in ["cold", "warm"]:
+        for url in urls:
+            fetch = browser_pool.load_page(url)
+            assert fetch.page_source
+            print(
+                f"{load_pass:<8}{fetch.startup_seconds:>12.2f}"
+                f"{fetch.navigation_seconds:>14.2f}  {fetch.url}"
+            )
+
+    stats = browser_pool.stats()
+    # every page after the first is served by the warm session
+    assert stats.sessions_started == 1
+    assert stats.pages_loaded == len(urls) * 2
+    browser_pool.close()
@@ -0,0 +1,46 @@
+# Compares loading a server rendered page over plain HTTP against a warm
+# headless browser, using the local fixture server.
+#
+# cd api; python -m loaders.fetch_benchmark [repeats]
+import statistics
+import sys
+import time
+from typing import Callable
+
+from loaders import browser_pool, fetch_fixtures, http_fetch
+from loaders.pages import PageFetch
+
+
+def _time_fetches(fetch: Callable[[], PageFetch | None], repeats: int) -> list[float]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        assert fetch() is not None
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    with fetch_fixtures.serve() as base_url:
+        article_url = f"{base_url}/article"
+        browser = browser_pool.BrowserPool(max_sessions=1, max_pages=repeats + 1)
+        # started ahead of timing, as the pool keeps browsers warm between fetches
+        cold_start = browser.load_page(article_url).startup_seconds
+
+        candidates = {
+            "http": lambda: http_fetch.fetch_page(article_url),
+            "http gzip": lambda: http_fetch.fetch_page(f"{article_url}?encoding=gzip"),
+            "browser": lambda: browser.load_page(article_url),
+        }
+
+        print(f"{repeats} fetches, browser startup {cold_start * 1000:.0f} ms")
+        print(f"{'path':<12}{'p50 ms':>10}{'max ms':>10}")
+        for name, fetch in candidates.items():
+            timings = _time_fetches(fetch, repeats)
+            print(
+                f"{name:<12}{statistics.median(timings) * 1000:>10.1f}"
+                f"{max(timings) * 1000:>10.1f}"
+            )
+        browser.close()
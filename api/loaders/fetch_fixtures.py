@@ -0,0 +1,258 @@
+# Local HTTP server of representative pages, for exercising loaders offline.
+import contextlib
+import gzip
+import hashlib
+import http.server
+import re
+import threading
+from typing import Iterator
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_PARAGRAPH = (
+    "Knowledge management starts with reading. Each document is loaded, split "
+    "into chunks and summarized, and the relations between the entities it "
+    "names are extracted so related documents can be found later. "
+)
+
+ARTICLE_HTML = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>Fixture article</title>
+<meta name="description" content="A server rendered article">
+<style>body {{ font-family: serif; }}</style>
+</head>
+<body>
+<nav><a href="/">Home</a></nav>
+<article>
+<h1>Fixture article</h1>
+{"".join(f"<p>{_PARAGRAPH * 3}</p>" for _ in range(20))}
+</article>
+</body>
+</html>
+"""
+
+# the text only exists once the script has run
+APP_HTML = f"""<!DOCTYPE html>
+<html lang="en">
+<head><title>Fixture app</title></head>
+<body>
+<div id="root"></div>
+<noscript>You need to enable JavaScript to run this app.</noscript>
+<script>
+document.getElementById("root").innerHTML =
+    {"".join(f"'<p>{_PARAGRAPH * 3}</p>' + " for _ in range(20))} "";
+</script>
+</body>
+</html>
+"""
+
+
+# entries of the arXiv API Atom feed, by versioned ID
+ARXIV_ENTRIES = {
+    "1706.03762v7": """<entry>
+    <id>http://arxiv.org/abs/1706.03762v7</id>
+    <updated>2023-08-02T00:41:18Z</updated>
+    <published>2017-06-12T17:57:34Z</published>
+    <title>Attention Is All You Need</title>
+    <summary>  The dominant sequence transduction models are based on complex recurrent or
+convolutional neural networks in an encoder-decoder configuration.
+</summary>
+    <author>
+      <name>Ashish Vaswani</name>
+    </author>
+    <author>
+      <name>Noam Shazeer</name>
+    </author>
+    <arxiv:comment xmlns:arxiv="http://arxiv.org/schemas/atom">15 pages, 5 figures</arxiv:comment>
+    <link href="http://arxiv.org/abs/1706.03762v7" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/1706.03762v7" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""",
+    "1810.04805v2": """<entry>
+    <id>http://arxiv.org/abs/1810.04805v2</id>
+    <updated>2019-05-24T20:37:26Z</updated>
+    <published>2018-10-11T00:50:01Z</published>
+    <title>BERT: Pre-training of Deep Bidirectional Transformers for Language
+  Understanding</title>
+    <summary>  We introduce a new language representation model called BERT, which stands
+for Bidirectional Encoder Representations from Transformers.
+</summary>
+    <author>
+      <name>Jacob Devlin</name>
+    </author>
+    <author>
+      <name>Ming-Wei Chang</name>
+    </author>
+    <link href="http://arxiv.org/abs/1810.04805v2" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/1810.04805v2" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""",
+    "hep-th/9711200v3": """<entry>
+    <id>http://arxiv.org/abs/hep-th/9711200v3</id>
+    <updated>1998-01-22T20:22:11Z</updated>
+    <published>1997-11-27T20:56:04Z</published>
+    <title>The Large N Limit of Superconformal Field Theories and Supergravity</title>
+    <summary>  We show that the large N limit of certain conformal field theories in
+various dimensions include in their Hilbert space a sector describing
+supergravity on the product of Anti-deSitter spacetimes, spheres and other
+compact manifolds.
+</summary>
+    <author>
+      <name>Juan M. Maldacena</name>
+    </author>
+    <arxiv:journal_ref xmlns:arxiv="http://arxiv.org/schemas/atom">Adv.Theor.Math.Phys.2:231-252,1998</arxiv:journal_ref>
+    <link href="http://arxiv.org/abs/hep-th/9711200v3" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/hep-th/9711200v3" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="hep-th" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="hep-th" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""",
+}
+
+_ARXIV_FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title type="html">ArXiv Query: search_query=&amp;id_list={id_list}</title>
+  <id>http://arxiv.org/api/fixture</id>
+  <updated>2024-01-01T00:00:00-05:00</updated>
+  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{count}</opensearch:totalResults>
+  <opensearch:startIndex xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">0</opensearch:startIndex>
+  <opensearch:itemsPerPage xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{count}</opensearch:itemsPerPage>
+  {entries}
+</feed>
+"""
+
+_ARXIV_ERROR_ENTRY = """<entry>
+    <id>http://arxiv.org/api/errors#incorrect_id_format_for_{id}</id>
+    <title>Error</title>
+    <summary>incorrect id format for {id}</summary>
+    <updated>2024-01-01T00:00:00-05:00</updated>
+    <link href="http://arxiv.org/api/errors#incorrect_id_format_for_{id}" rel="alternate" type="text/html"/>
+    <author>
+      <name>arXiv api core</name>
+    </author>
+  </entry>"""
+
+_ARXIV_VERSION_PATTERN = re.compile(r"v[0-9]+$")
+
+# the `id_list` of every arXiv API request served, in order
+arxiv_queries: list[list[str]] = []
+
+
+def _arxiv_feed(id_list: list[str], base_url: str) -> str:
+    entries = []
+    for requested_id in id_list:
+        for versioned_id, entry in ARXIV_ENTRIES.items():
+            if requested_id in [
+                versioned_id,
+                _ARXIV_VERSION_PATTERN.sub("", versioned_id),
+            ]:
+                entries.append(entry)
+                break
+        else:
+            if not re.match(r"^[a-z\-]*/?[0-9.]+(v[0-9]+)?$", requested_id):
+                entries.append(_ARXIV_ERROR_ENTRY.format(id=requested_id))
+
+    feed = _ARXIV_FEED.format(
+        id_list=",".join(id_list), count=len(entries), entries="\n  ".join(entries)
+    )
+    # links lead back to the fixture server
+    return feed.replace("http://arxiv.org/pdf/", f"{base_url}/arxiv/pdf/")
+
+
+def _arxiv_pdf(arxiv_id: str) -> bytes:
+    import fitz
+
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), f"Fixture paper {arxiv_id}")
+        return pdf.tobytes()
+
+
+class _FixtureHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        match url.path:
+            case "/article":
+                self._send_html(ARTICLE_HTML, parse_qs(url.query).get("encoding"))
+            case "/app":
+                self._send_html(APP_HTML)
+            case "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "/article")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            case "/arxiv/api/query":
+                id_list = parse_qs(url.query).get("id_list", [""])[0].split(",")
+                arxiv_queries.append(id_list)
+                base_url = f"http://{self.headers['Host']}"
+                self._send(
+                    _arxiv_feed(id_list, base_url).encode(),
+                    "application/atom+xml; charset=utf-8",
+                )
+            case path if path.startswith("/arxiv/pdf/"):
+                arxiv_id = path.removeprefix("/arxiv/pdf/")
+                if arxiv_id in ARXIV_ENTRIES:
+                    self._send(_arxiv_pdf(arxiv_id), "application/pdf")
+                else:
+                    self.send_error(404)
+            case _:
+                self.send_error(404)
+
+    def _send_html(self, html: str, encoding: list[str] | None = None):
+        body = html.encode()
+        # only the article supports conditional requests
+        etag = None
+        if html is ARTICLE_HTML:
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if etag is not None:
+            self.send_header("ETag", etag)
+        match encoding:
+            case ["gzip"]:
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            case ["br"] if brotli is not None:
+                body = brotli.compress(body)
+                self.send_header("Content-Encoding", "br")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve() -> Iterator[str]:
+    """Serves the fixture pages on an ephemeral port, yielding the base URL."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
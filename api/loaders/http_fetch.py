@@ -0,0 +1,176 @@
+import dataclasses
+import os
+import threading
+import time
+from html.parser import HTMLParser
+
+import httpx
+
+from loaders import response_cache
+from loaders.pages import PageFetch, build_page_metadata
+
+_HTTP_TIMEOUT = float(os.environ.get("KMS_HTTP_TIMEOUT", 15))
+_MAX_REDIRECTS = int(os.environ.get("KMS_HTTP_MAX_REDIRECTS", 10))
+# pages below either bound are assumed to be rendered by scripts
+_MIN_TEXT_LENGTH = int(os.environ.get("KMS_HTTP_MIN_TEXT_LENGTH", 500))
+_MIN_TEXT_DENSITY = float(os.environ.get("KMS_HTTP_MIN_TEXT_DENSITY", 0.02))
+
+_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+}
+_HTML_CONTENT_TYPES = ["text/html", "application/xhtml+xml"]
+# left to the caller, a browser would be throttled the same way
+_THROTTLED_STATUS_CODES = [429, 503]
+_HIDDEN_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+
+
+@dataclasses.dataclass
+class PageText:
+    title: str | None = None
+    description: str | None = None
+    language: str | None = None
+    # characters of text a reader would see, excluding whitespace runs
+    text_length: int = 0
+    html_length: int = 0
+
+    @property
+    def text_density(self) -> float:
+        return self.text_length / self.html_length if self.html_length else 0.0
+
+
+class _PageTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.page_text = PageText()
+        self._hidden_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "html":
+            self.page_text.language = attributes.get("lang")
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta" and attributes.get("name") == "description":
+            self.page_text.description = attributes.get("content")
+
+        if tag in _HIDDEN_TAGS:
+            self._hidden_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in _HIDDEN_TAGS and self._hidden_depth > 0:
+            self._hidden_depth -= 1
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.page_text.title = (self.page_text.title or "") + data.strip()
+        elif self._hidden_depth == 0:
+            self.page_text.text_length += len(" ".join(data.split()))
+
+
+def measure_page_text(html: str) -> PageText:
+    parser = _PageTextParser()
+    parser.feed(html)
+    parser.close()
+    parser.page_text.html_length = len(html)
+    return parser.page_text
+
+
+def has_usable_text(
+    page_text: PageText,
+    min_text_length: int = _MIN_TEXT_LENGTH,
+    min_text_density: float = _MIN_TEXT_DENSITY,
+) -> bool:
+    """Whether served HTML holds the page text, without running its scripts."""
+    return (
+        page_text.text_length >= min_text_length
+        and page_text.text_density >= min_text_density
+    )
+
+
+_CLIENT: httpx.Client | None = None
+_CLIENT_PID: int | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def client() -> httpx.Client:
+    """Returns the pooled HTTP client of this process."""
+    global _CLIENT, _CLIENT_PID
+    with _CLIENT_LOCK:
+        # pooled connections are not shared with a forked child
+        if _CLIENT is None or _CLIENT_PID != os.getpid():
+            # gzip is always accepted, brotli when the brotli package is installed
+            _CLIENT = httpx.Client(
+                headers=_HEADERS,
+                timeout=_HTTP_TIMEOUT,
+                follow_redirects=True,
+                max_redirects=_MAX_REDIRECTS,
+                limits=httpx.Limits(max_keepalive_connections=20),
+            )
+            _CLIENT_PID = os.getpid()
+        return _CLIENT
+
+
+def fetch_page(url: str) -> PageFetch | None:
+    """Fetches `url` without a browser, if it serves usable HTML."""
+    start = time.perf_counter()
+    try:
+        with response_cache.default_cache().fetch(client(), url) as response:
+            content_type = response.content_type
+            html = response.text() if content_type in _HTML_CONTENT_TYPES else None
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in _THROTTLED_STATUS_CODES:
+            raise
+        print(f"HTTP fetch failed for [{url}]: {e}")
+        return None
+    except httpx.HTTPError as e:
+        print(f"HTTP fetch failed for [{url}]: {e}")
+        return None
+    navigation_seconds = time.perf_counter() - start
+
+    if html is None:
+        print(f"HTTP fetch of [{url}] returned {content_type or 'no content type'}")
+        return None
+
+    page_text = measure_page_text(html)
+    if not has_usable_text(page_text):
+        print(
+            f"HTTP fetch of [{url}] has too little text: {page_text.text_length} "
+            f"characters, density {page_text.text_density:.3f}"
+        )
+        return None
+
+    return PageFetch(
+        url=url,
+        page_source=html,
+        metadata=build_page_metadata(
+            url, page_text.title, page_text.description, page_text.language
+        ),
+        startup_seconds=0.0,
+        navigation_seconds=navigation_seconds,
+    )
+
+
+if __name__ == "__main__":
+    from loaders import fetch_fixtures
+
+    with fetch_fixtures.serve() as base_url:
+        page = fetch_page(f"{base_url}/article")
+        assert page is not None
+        assert page.metadata["title"] == "Fixture article"
+        assert page.metadata["language"] == "en"
+
+        # compressed and redirected responses are decoded transparently
+        for path in ["/article?encoding=gzip", "/article?encoding=br", "/redirect"]:
+            redirected = fetch_page(f"{base_url}{path}")
+            assert redirected is not None
+            assert redirected.page_source == page.page_source
+
+        assert fetch_page(f"{base_url}/app") is None
+        assert fetch_page(f"{base_url}/missing") is None
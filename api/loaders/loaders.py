@@ -1,48 +1,40 @@
-import abc
+import contextlib
+import glob
+import os
 import re
-import tempfile
+import time
 
-from urllib.parse import urlparse, ParseResult
+from typing import ContextManager
+from urllib.parse import ParseResult
 from langchain.docstore.document import Document
-from langchain.document_loaders import PyPDFLoader
-from langchain.document_loaders import ArxivLoader
-from langchain.document_loaders import SeleniumURLLoader
 from langchain.document_loaders import HNLoader
 from langchain.document_loaders import WikipediaLoader
 from langchain.text_splitter import NLTKTextSplitter
 from langchain.document_transformers import Html2TextTransformer
+from langchain.document_loaders.blob_loaders import FileSystemBlobLoader
 from langchain.document_loaders.blob_loaders.youtube_audio import YoutubeAudioLoader
 from langchain.document_loaders.generic import GenericLoader
-from langchain.document_loaders.parsers.audio import OpenAIWhisperParserLocal
+from unstructured.partition.html import partition_html
 
+from loaders import (
+    arxiv_papers,
+    browser_pool,
+    http_fetch,
+    pdf_pages,
+    response_cache,
+    transcription,
+)
+from loaders.registry import DocumentLoader, LoaderRegistry, ResolvedLoader
+from services import fetch_scheduler
 
-def _get_url_extension(url: ParseResult) -> str:
-    return url.path.split(".")[-1]
+# bounds the pages read from a single PDF, unbounded when 0
+_PDF_MAX_PAGES = int(os.environ.get("KMS_PDF_MAX_PAGES", 0))
+_HACKER_NEWS_ID_PATTERN = re.compile(r"^id=([0-9]+)$")
 
 
-class DocumentLoader(abc.ABC):
-    url: ParseResult
-
-    def __init__(self, url: ParseResult):
-        self.url = url
-
-    @staticmethod
-    @abc.abstractmethod
-    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        raise NotImplementedError()
-
-    @staticmethod
-    @abc.abstractmethod
-    def can_load(url: ParseResult) -> bool:
-        raise NotImplementedError()
-
-    @abc.abstractmethod
-    def load(self) -> list[Document]:
-        raise NotImplementedError()
-
-    @property
-    def target_url(self) -> str:
-        return self.url.geturl()
+def _fetch_slot(url: str) -> ContextManager[fetch_scheduler.FetchSlot]:
+    # held while downloading within the limits of the host, not while parsing
+    return fetch_scheduler.default_scheduler().slot(url)
 
 
 class DefaultDocumentLoader(DocumentLoader):
@@ -50,63 +42,49 @@ class DefaultDocumentLoader(DocumentLoader):
     def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
         return None
 
-    @staticmethod
-    def can_load(url: ParseResult) -> bool:
-        return True
-
     def load(self) -> list[Document]:
         return []
 
 
 class HackerNewsDocumentLoader(DocumentLoader):
-    @staticmethod
-    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        if HackerNewsDocumentLoader.can_load(url):
-            id_match = re.match(r"^id=([0-9]+)$", url.query)
-            if id_match:
-                id = id_match.group()
-            else:
-                raise RuntimeError("Cannot be loadable without id param")
-            return {
-                "loader": "hacker_news",
-                "id": id,
-            }
-
-        return None
+    # https://news.ycombinator.com/item?id=34817881
+    hosts = ["news.ycombinator.com"]
+    path_pattern = re.compile(r"/item$")
 
     @staticmethod
-    def can_load(url: ParseResult) -> bool:
-        # https://news.ycombinator.com/item?id=34817881
-        valid_site = url.netloc in ["news.ycombinator.com"]
-        has_valid_path = url.path == "/item"
-        has_id = re.match(r"^id=[0-9]+$", url.query) is not None
-
-        return valid_site and has_valid_path and has_id
+    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+        id_match = _HACKER_NEWS_ID_PATTERN.match(url.query)
+        if id_match:
+            id = id_match.group()
+        else:
+            raise RuntimeError("Cannot be loadable without id param")
+        return {
+            "loader": "hacker_news",
+            "id": id,
+        }
+
+    @classmethod
+    def can_load(cls, url: ParseResult) -> bool:
+        has_id = _HACKER_NEWS_ID_PATTERN.match(url.query) is not None
+        return has_id and super().can_load(url)
 
     def load(self) -> list[Document]:
         loader = HNLoader(self.target_url)
-        return loader.load()
+        with _fetch_slot(self.target_url):
+            return loader.load()
 
 
 class WikipediaDocumentLoader(DocumentLoader):
-    @staticmethod
-    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        if WikipediaDocumentLoader.can_load(url):
-            query = url.path.split("/")[-1]
-            return {
-                "loader": "wikipedia",
-                "id": query,
-            }
-
-        return None
+    hosts = ["wikipedia.org", "en.wikipedia.org"]
+    path_pattern = re.compile(r"/wiki/")
 
     @staticmethod
-    def can_load(url: ParseResult) -> bool:
-        valid_site = url.netloc in ["wikipedia.org", "en.wikipedia.org"]
-        valid_path_prefixes = ["/wiki/"]
-        has_valid_path_prefix = any(url.path.startswith(x) for x in valid_path_prefixes)
-
-        return valid_site and has_valid_path_prefix
+    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+        query = url.path.split("/")[-1]
+        return {
+            "loader": "wikipedia",
+            "id": query,
+        }
 
     def load(self) -> list[Document]:
         query = self._load_query()
@@ -114,82 +92,98 @@ class WikipediaDocumentLoader(DocumentLoader):
             raise ValueError("Invalid Wikipedia URL requested")
 
         loader = WikipediaLoader(query=query)
-        return loader.load()
+        with _fetch_slot(self.target_url):
+            return loader.load()
 
     def _load_query(self) -> str:
         # https://en.wikipedia.org/wiki/Walt_Disney
         return self.url.path.split("/")[-1]
 
 
-def _load_arxiv_query(url: ParseResult) -> str:
-    if url.path.startswith("/pdf/"):
-        # https://arxiv.org/pdf/2305.05003.pdf
-        return url.path[1:].strip("pdf")[1:-1]
+# matches the default of langchain's ArxivLoader, used prior to the response cache
+_ARXIV_CONTENT_CHARS_MAX = 4000
 
-    # https://arxiv.org/abs/2305.05003
-    return url.path.split("/")[-1]
 
+def _load_arxiv_query(url: ParseResult) -> str:
+    # https://arxiv.org/abs/2305.05003, https://arxiv.org/pdf/2305.05003v2.pdf
+    # or https://arxiv.org/abs/hep-th/9711200
+    return url.path.split("/", 2)[-1].removesuffix(".pdf")
 
-class ArxivDocumentLoader(DocumentLoader):
-    @staticmethod
-    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        if WikipediaDocumentLoader.can_load(url):
-            return {
-                "loader": "arxiv",
-                "id": _load_arxiv_query(url),
-            }
 
-        return None
+class ArxivDocumentLoader(DocumentLoader):
+    hosts = ["arxiv.org"]
+    path_pattern = re.compile(r"/(pdf|abs)/")
 
     @staticmethod
-    def can_load(url: ParseResult) -> bool:
-        valid_site = url.netloc == "arxiv.org"
-        valid_path_prefixes = ["/pdf/", "/abs/"]
-        has_valid_path_prefix = any(url.path.startswith(x) for x in valid_path_prefixes)
-
-        return valid_site and has_valid_path_prefix
+    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+        return {
+            "loader": "arxiv",
+            "id": _load_arxiv_query(url),
+        }
 
     def load(self) -> list[Document]:
         query = _load_arxiv_query(self.url)
         if not query:
             raise ValueError("Invalid Arxiv URL requested")
 
-        loader = ArxivLoader(query=query)
-        return loader.load()
+        # an exact ID lookup, likely cached by a batch prefetch of metadata
+        papers = arxiv_papers.fetch_papers([query], download_context=_fetch_slot)
+        paper = papers.get(query)
+        if paper is None:
+            raise ValueError(f"arXiv paper [{query}] not found")
+
+        text = arxiv_papers.paper_text(paper, download_context=_fetch_slot)
+        return [
+            Document(
+                page_content=text[:_ARXIV_CONTENT_CHARS_MAX],
+                metadata=paper.document_metadata(),
+            )
+        ]
 
 
 class PDFDocumentLoader(DocumentLoader):
-    @staticmethod
-    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        if PDFDocumentLoader.can_load(url):
-            return {
-                "loader": "pdf",
-                "url": url.geturl(),
-            }
-
-        return None
+    extensions = ["pdf"]
 
     @staticmethod
-    def can_load(url: ParseResult) -> bool:
-        extension = _get_url_extension(url)
-        return extension.lower() in ["pdf"]
+    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+        return {
+            "loader": "pdf",
+            "url": url.geturl(),
+        }
 
     def load(self) -> list[Document]:
-        loader = PyPDFLoader(self.target_url)
-        pages = loader.load_and_split()
+        stats = pdf_pages.ExtractionStats()
+        with contextlib.ExitStack() as stack:
+            with _fetch_slot(self.target_url), response_cache.default_cache().fetch(
+                http_fetch.client(), self.target_url
+            ) as response:
+                # read by the page workers once the slot is released
+                pdf_path = stack.enter_context(response.detached_path())
+            pages = [
+                Document(
+                    page_content=page.text,
+                    metadata={"source": self.target_url, "page": page.index},
+                )
+                for page in pdf_pages.iter_pages(
+                    pdf_path, max_pages=_PDF_MAX_PAGES or None, stats=stats
+                )
+                if page.text.strip()
+            ]
+
+        print(
+            f"Extracted {stats.pages} pages of [{self.target_url}], "
+            f"{stats.cached_pages} cached, at {stats.pages_per_second:.1f} pages/s"
+        )
         return pages
 
 
 class WebPageDocumentLoader(DocumentLoader):
     @staticmethod
     def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        if WebPageDocumentLoader.can_load(url):
-            return {
-                "loader": "webpage",
-                "url": url.geturl(),
-            }
-
-        return None
+        return {
+            "loader": "webpage",
+            "url": url.geturl(),
+        }
 
     @staticmethod
     def can_load(url: ParseResult) -> bool:
@@ -197,45 +191,71 @@ class WebPageDocumentLoader(DocumentLoader):
         return url.scheme in valid_schemes
 
     def load(self) -> list[Document]:
-        loader = SeleniumURLLoader(urls=[self.target_url])
-        text = loader.load()
+        # server rendered pages need no browser, scripted pages fall back to one
+        fetch_path = "http"
+        with _fetch_slot(self.target_url):
+            page = http_fetch.fetch_page(self.target_url)
+            if page is None:
+                fetch_path = "browser"
+                # a warm browser of this process is reused across pages
+                page = browser_pool.default_pool().load_page(self.target_url)
+
+        start = time.perf_counter()
+        elements = partition_html(text=page.page_source)
+        text = Document(
+            page_content="\n\n".join(str(x) for x in elements),
+            metadata={**page.metadata, "fetch_path": fetch_path},
+        )
 
         html2text = Html2TextTransformer()
-        docs_transformed = html2text.transform_documents(text)
+        docs_transformed = html2text.transform_documents([text])
 
         text_splitter = NLTKTextSplitter(chunk_size=1000, chunk_overlap=300)
         texts = text_splitter.split_documents(docs_transformed)
-
+        extraction_seconds = time.perf_counter() - start
+
+        print(
+            f"Loaded [{self.target_url}] by {fetch_path}: "
+            f"startup {page.startup_seconds:.2f}s, "
+            f"navigation {page.navigation_seconds:.2f}s, "
+            f"extraction {extraction_seconds:.2f}s"
+        )
         return texts
 
 
 class YouTubeVideoDocumentLoader(DocumentLoader):
+    hosts = ["www.youtube.com", "youtube.com"]
+
     @staticmethod
     def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
-        if YouTubeVideoDocumentLoader.can_load(url):
-            return {
-                "loader": "youtube",
-                "url": url.geturl(),
-            }
-
-        return None
+        return {
+            "loader": "youtube",
+            "url": url.geturl(),
+        }
 
-    @staticmethod
-    def can_load(url: ParseResult) -> bool:
-        is_youtube = url.netloc in ["www.youtube.com", "youtube.com"]
+    @classmethod
+    def can_load(cls, url: ParseResult) -> bool:
         valid_schemes = ["http", "https"]
-        return (url.scheme in valid_schemes) and is_youtube
+        return (url.scheme in valid_schemes) and super().can_load(url)
 
     def load(self) -> list[Document]:
-        with tempfile.TemporaryDirectory() as d:
-            loader = GenericLoader(
-                YoutubeAudioLoader([self.target_url], d), OpenAIWhisperParserLocal()
-            )
-            return loader.load()
+        # audio is kept with cached responses, and only downloaded once
+        d = response_cache.default_cache().media_directory(self.target_url)
+        if not glob.glob(os.path.join(d, "*.m4a")):
+            # transcription runs outside the limits of the host
+            with _fetch_slot(self.target_url):
+                for _ in YoutubeAudioLoader([self.target_url], d).yield_blobs():
+                    pass
+        # the Whisper model stays loaded for later videos
+        loader = GenericLoader(
+            FileSystemBlobLoader(d, glob="*.m4a"),
+            transcription.WhisperTranscriptParser(),
+        )
+        return loader.load()
 
 
-# TODO: Define by namespace lookup
-_ORDERED_LOADERS = [
+_REGISTRY = LoaderRegistry()
+for _loader_type in [
     # site specific
     ArxivDocumentLoader,
     WikipediaDocumentLoader,
@@ -246,31 +266,24 @@ _ORDERED_LOADERS = [
     # Fallback
     WebPageDocumentLoader,
     DefaultDocumentLoader,
-]
+]:
+    _REGISTRY.register(_loader_type)
+# installed plugins take precedence over the loaders above
+_REGISTRY.load_entry_points()
+
+
+def resolve(url: str) -> ResolvedLoader | None:
+    return _REGISTRY.resolve(url)
 
 
 def get_loader_spec(url: str) -> dict[str, str] | None:
-    parsed_url = urlparse(url)
-    return next(
-        (
-            x.get_loader_spec(parsed_url)
-            for x in _ORDERED_LOADERS
-            if x.get_loader_spec(parsed_url) is not None
-        ),
-        None,
-    )
+    resolved = resolve(url)
+    return resolved.loader_spec if resolved is not None else None
 
 
 def locate(url: str) -> DocumentLoader | None:
-    parsed_url = urlparse(url)
-    loader = next(
-        (x for x in _ORDERED_LOADERS if x.can_load(parsed_url)),
-        None,
-    )
-    if loader is not None:
-        return loader(parsed_url)
-
-    return None
+    resolved = resolve(url)
+    return resolved.loader if resolved is not None else None
 
 
 if __name__ == "__main__":
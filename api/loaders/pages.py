@@ -0,0 +1,26 @@
+import dataclasses
+
+
+@dataclasses.dataclass
+class PageFetch:
+    url: str
+    page_source: str
+    metadata: dict[str, str]
+    # zero unless a browser was started for this page
+    startup_seconds: float
+    navigation_seconds: float
+
+
+def build_page_metadata(
+    url: str,
+    title: str | None,
+    description: str | None,
+    language: str | None,
+) -> dict[str, str]:
+    # matches the metadata of langchain's SeleniumURLLoader, used prior to the pool
+    return {
+        "source": url,
+        "title": title or "No title found.",
+        "description": description or "No description found.",
+        "language": language or "No language found.",
+    }
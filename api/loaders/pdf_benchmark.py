@@ -0,0 +1,74 @@
+# Compares serial PDF page extraction against `pdf_pages.iter_pages`, which
+# parses in a process pool of KMS_PDF_WORKERS, and against pages served from
+# the page cache, over a directory of PDFs. `iter_pages` is also measured from a
+# daemonic process, as the PDF loader runs within Celery's prefork pool.
+#
+# cd api; python -m loaders.pdf_benchmark [pdf_directory]
+#
+# A corpus of generated PDFs is used when no directory is given.
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import billiard
+import fitz
+
+from loaders import pdf_pages
+
+
+def _generate_corpus(directory: str, document_count: int = 4, page_count: int = 200):
+    for i in range(document_count):
+        with fitz.open() as pdf:
+            for j in range(page_count):
+                page = pdf.new_page()
+                page.insert_textbox(
+                    fitz.Rect(72, 72, 540, 720),
+                    f"Document {i} page {j}. " * 120,
+                )
+            pdf.save(os.path.join(directory, f"generated_{i}.pdf"))
+
+
+def _extract_corpus(paths: list[str], page_cache: pdf_pages.PageCache) -> float:
+    stats = pdf_pages.ExtractionStats()
+    start = time.perf_counter()
+    for path in paths:
+        for _ in pdf_pages.iter_pages(path, page_cache=page_cache, stats=stats):
+            pass
+    return stats.pages / (time.perf_counter() - start)
+
+
+def _extract_serial(paths: list[str]) -> float:
+    pages = 0
+    start = time.perf_counter()
+    for path in paths:
+        with fitz.open(path) as pdf:
+            pages += len([page.get_text() for page in pdf])
+    return pages / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        corpus_directory = sys.argv[1] if len(sys.argv) > 1 else None
+        if corpus_directory is None:
+            corpus_directory = os.path.join(d, "corpus")
+            os.makedirs(corpus_directory)
+            _generate_corpus(corpus_directory)
+        paths = sorted(glob.glob(os.path.join(corpus_directory, "*.pdf")))
+
+        page_cache = pdf_pages.PageCache(os.path.join(d, "pages"))
+        # started ahead of timing, as workers are kept between documents
+        pdf_pages._pool().apply(int)
+
+        print(f"{len(paths)} PDFs from {corpus_directory}")
+        print(f"{'mode':<16}{'pages/s':>12}")
+        print(f"{'serial':<16}{_extract_serial(paths):>12.1f}")
+        print(f"{'iter_pages':<16}{_extract_corpus(paths, page_cache):>12.1f}")
+        print(f"{'page cache':<16}{_extract_corpus(paths, page_cache):>12.1f}")
+
+        # forked as Celery's prefork pool, workers are started within the timing
+        with billiard.get_context("fork").Pool(processes=1) as prefork_pool:
+            daemon_cache = pdf_pages.PageCache(os.path.join(d, "daemon_pages"))
+            rate = prefork_pool.apply(_extract_corpus, (paths, daemon_cache))
+        print(f"{'prefork child':<16}{rate:>12.1f}")
@@ -0,0 +1,210 @@
+"""Parallel extraction of PDF page text, cached by the digest of the file.
+
+Pages are parsed in batches by a process pool and yielded in page order, each
+batch as soon as it and every batch before it have finished. The pool is
+billiard's, Celery's fork of multiprocessing, which unlike the standard library
+starts processes from daemonic ones, as the children of Celery's prefork pool.
+"""
+import collections
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Iterator
+
+import billiard
+import billiard.pool
+import fitz
+
+_PAGE_CACHE_DIRECTORY = os.environ.get(
+    "KMS_PDF_PAGE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), "kms", "pdf_pages"),
+)
+_MAX_WORKERS = int(os.environ.get("KMS_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+_PAGE_BATCH_SIZE = 8
+# batches submitted ahead of the one being yielded, per worker
+_BATCHES_IN_FLIGHT_PER_WORKER = 2
+
+
+@dataclasses.dataclass
+class PdfPage:
+    # zero based, matching the `page` metadata of langchain's PDF loaders
+    index: int
+    text: str
+
+
+@dataclasses.dataclass
+class ExtractionStats:
+    pages: int = 0
+    cached_pages: int = 0
+    seconds: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+
+def _extract_batch(path: str, start: int, stop: int) -> tuple[int, list[str], bool]:
+    with fitz.open(path) as pdf:
+        return start, [pdf[i].get_text() for i in range(start, stop)], False
+
+
+def file_digest(source: str | bytes) -> str:
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    with open(source, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class PageCache:
+    """Extracted page text on disk, one file per batch of pages of a digest.
+
+    Batches start at multiples of the batch size, so entries are shared by
+    every page range overlapping them.
+    """
+
+    def __init__(self, directory: str = _PAGE_CACHE_DIRECTORY):
+        self.directory = directory
+
+    def get(self, digest: str, start: int) -> list[str] | None:
+        try:
+            with open(self._path(digest, start), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, digest: str, start: int, texts: list[str]):
+        path = self._path(digest, start)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique to the writer, without the cost of a random temporary name
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(texts, f)
+        os.replace(temp_path, path)
+
+    def _path(self, digest: str, start: int) -> str:
+        return os.path.join(self.directory, digest, f"{start}.json")
+
+
+_POOL: billiard.pool.Pool | None = None
+_POOL_PID: int | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool() -> billiard.pool.Pool:
+    global _POOL, _POOL_PID
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != os.getpid():
+            # workers are spawned, forking a process running threads is unsafe
+            _POOL = billiard.get_context("spawn").Pool(processes=_MAX_WORKERS)
+            _POOL_PID = os.getpid()
+        return _POOL
+
+
+def iter_pages(
+    source: str | bytes,
+    first_page: int = 0,
+    max_pages: int | None = None,
+    page_cache: PageCache | None = None,
+    stats: ExtractionStats | None = None,
+) -> Iterator[PdfPage]:
+    """Yields the text of pages [first_page, first_page + max_pages) in order.
+
+    `source` is the path of the PDF, or its content. Only PDFs given by path
+    are parsed by the process pool, the path must remain readable until then.
+    """
+    start_time = time.perf_counter()
+    page_cache = page_cache or PageCache()
+    stats = stats if stats is not None else ExtractionStats()
+    digest = file_digest(source)
+    with contextlib.ExitStack() as stack:
+        if isinstance(source, bytes):
+            pdf = stack.enter_context(fitz.open(stream=source, filetype="pdf"))
+        else:
+            pdf = stack.enter_context(fitz.open(source))
+        page_count = pdf.page_count
+        stop = page_count
+        if max_pages is not None:
+            stop = min(stop, first_page + max_pages)
+        # without parallelism, the round trip to a worker is pure overhead
+        parallel = (
+            isinstance(source, str)
+            and _MAX_WORKERS > 1
+            and stop - first_page > _PAGE_BATCH_SIZE
+        )
+        if parallel:
+            stack.close()
+
+        def submit(start: int) -> Callable[[], tuple[int, list[str], bool]]:
+            # returns a call waiting for the batch
+            end = min(start + _PAGE_BATCH_SIZE, page_count)
+            texts = page_cache.get(digest, start)
+            if texts is not None:
+                return lambda: (start, texts, True)
+            if parallel:
+                return _pool().apply_async(_extract_batch, (source, start, end)).get
+            texts = [pdf[i].get_text() for i in range(start, end)]
+            return lambda: (start, texts, False)
+
+        # whole aligned batches are extracted, pages outside the range skipped
+        aligned_start = first_page - first_page % _PAGE_BATCH_SIZE
+        batch_starts = collections.deque(range(aligned_start, stop, _PAGE_BATCH_SIZE))
+        in_flight: collections.deque[Callable] = collections.deque()
+        max_in_flight = _MAX_WORKERS * _BATCHES_IN_FLIGHT_PER_WORKER
+        while batch_starts or in_flight:
+            while batch_starts and len(in_flight) < max_in_flight:
+                in_flight.append(submit(batch_starts.popleft()))
+
+            start, texts, cached = in_flight.popleft()()
+            if not cached:
+                page_cache.put(digest, start, texts)
+            for index, text in enumerate(texts, start):
+                if not first_page <= index < stop:
+                    continue
+                stats.pages += 1
+                stats.cached_pages += cached
+                stats.seconds = time.perf_counter() - start_time
+                yield PdfPage(index=index, text=text)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        pdf_path = os.path.join(d, "sample.pdf")
+        with fitz.open() as pdf:
+            for i in range(30):
+                pdf.new_page().insert_text((72, 72), f"page {i}")
+            pdf.save(pdf_path)
+
+        cache = PageCache(os.path.join(d, "pages"))
+        stats = ExtractionStats()
+        pages = list(iter_pages(pdf_path, page_cache=cache, stats=stats))
+        assert [x.index for x in pages] == list(range(30))
+        assert all(x.text.strip() == f"page {x.index}" for x in pages)
+        assert stats.cached_pages == 0
+
+        stats = ExtractionStats()
+        pages = list(iter_pages(pdf_path, 5, 10, page_cache=cache, stats=stats))
+        assert [x.index for x in pages] == list(range(5, 15))
+        assert stats.cached_pages == 10
+
+        # content is parsed inline, sharing cached pages with its path
+        with open(pdf_path, "rb") as f:
+            content = f.read()
+        stats = ExtractionStats()
+        pages = list(iter_pages(content, 28, page_cache=cache, stats=stats))
+        assert [x.text.strip() for x in pages] == ["page 28", "page 29"]
+        assert stats.cached_pages == 2
+
+        # a daemonic process forked as by Celery's prefork pool starts workers too
+        def extract_in_daemon(path: str, cache_directory: str) -> tuple[int, bool]:
+            pages = list(iter_pages(path, page_cache=PageCache(cache_directory)))
+            return len(pages), _POOL is not None
+
+        with billiard.get_context("fork").Pool(processes=1) as prefork_pool:
+            assert prefork_pool.apply(
+                extract_in_daemon, (pdf_path, os.path.join(d, "daemon_pages"))
+            ) == (30, _MAX_WORKERS > 1)
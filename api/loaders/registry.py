@@ -0,0 +1,175 @@
+"""Dispatch of URLs to document loaders.
+
+Loaders declare the hosts, path pattern and file extensions they handle. A URL
+is resolved by looking up the loaders of its host, then those of its extension,
+then the fallback loaders which declare neither, taking the first whose
+`can_load` accepts it. Third-party loaders are registered through the `kms.loaders`
+entry point group, and are tried before built-in loaders of the same kind.
+"""
+import abc
+import collections
+import dataclasses
+import importlib.metadata
+import re
+from typing import ClassVar
+from urllib.parse import urlparse, ParseResult
+
+from langchain.docstore.document import Document
+
+ENTRY_POINT_GROUP = "kms.loaders"
+
+
+def get_url_extension(url: ParseResult) -> str:
+    return url.path.split(".")[-1]
+
+
+class DocumentLoader(abc.ABC):
+    # netlocs handled by the loader, matched exactly
+    hosts: ClassVar[list[str]] = []
+    # matched against the start of the path
+    path_pattern: ClassVar[re.Pattern[str] | None] = None
+    # file extensions handled by the loader on any host, matched in lower case
+    extensions: ClassVar[list[str]] = []
+
+    url: ParseResult
+
+    def __init__(self, url: ParseResult):
+        self.url = url
+
+    @staticmethod
+    @abc.abstractmethod
+    def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+        """Describes the document, for a URL accepted by `can_load`."""
+        raise NotImplementedError()
+
+    @classmethod
+    def can_load(cls, url: ParseResult) -> bool:
+        """Whether the URL matches the hosts, path pattern and extensions declared."""
+        if cls.hosts and url.netloc not in cls.hosts:
+            return False
+        if cls.extensions and get_url_extension(url).lower() not in cls.extensions:
+            return False
+        return cls.path_pattern is None or cls.path_pattern.match(url.path) is not None
+
+    @abc.abstractmethod
+    def load(self) -> list[Document]:
+        raise NotImplementedError()
+
+    @property
+    def target_url(self) -> str:
+        return self.url.geturl()
+
+
+@dataclasses.dataclass
+class ResolvedLoader:
+    # None when no loader supports the URL
+    loader_spec: dict[str, str] | None
+    loader: DocumentLoader
+
+
+class LoaderRegistry:
+    def __init__(self):
+        self._by_host: dict[str, list[type[DocumentLoader]]] = (
+            collections.defaultdict(list)
+        )
+        self._by_extension: dict[str, list[type[DocumentLoader]]] = (
+            collections.defaultdict(list)
+        )
+        self._fallbacks: list[type[DocumentLoader]] = []
+
+    def register(self, loader_type: type[DocumentLoader], first: bool = False):
+        """Adds a loader, after those already registered unless `first`."""
+        buckets = [self._by_host[x] for x in loader_type.hosts]
+        buckets.extend(self._by_extension[x.lower()] for x in loader_type.extensions)
+        if not buckets:
+            buckets.append(self._fallbacks)
+
+        for bucket in buckets:
+            if loader_type in bucket:
+                continue
+            if first:
+                bucket.insert(0, loader_type)
+            else:
+                bucket.append(loader_type)
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP) -> list[str]:
+        """Registers loaders of installed plugins, returning their names."""
+        registered = []
+        for entry_point in importlib.metadata.entry_points(group=group):
+            try:
+                loader_type = entry_point.load()
+            except Exception as e:
+                print(f"Failed to load loader plugin [{entry_point.name}]: {e}")
+                continue
+            if not (
+                isinstance(loader_type, type) and issubclass(loader_type, DocumentLoader)
+            ):
+                print(f"Loader plugin [{entry_point.name}] is not a DocumentLoader")
+                continue
+
+            self.register(loader_type, first=True)
+            registered.append(entry_point.name)
+        return registered
+
+    def resolve(self, url: str) -> ResolvedLoader | None:
+        parsed_url = urlparse(url)
+        for candidates in (
+            self._by_host.get(parsed_url.netloc),
+            self._by_extension.get(get_url_extension(parsed_url).lower()),
+            self._fallbacks,
+        ):
+            for loader_type in candidates or []:
+                if loader_type.can_load(parsed_url):
+                    return ResolvedLoader(
+                        loader_spec=loader_type.get_loader_spec(parsed_url),
+                        loader=loader_type(parsed_url),
+                    )
+
+        return None
+
+
+if __name__ == "__main__":
+
+    class _ExampleLoader(DocumentLoader):
+        hosts = ["example.com"]
+        path_pattern = re.compile(r"/docs/")
+
+        @staticmethod
+        def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+            return {"loader": "example", "path": url.path}
+
+        def load(self) -> list[Document]:
+            return []
+
+    class _TextLoader(_ExampleLoader):
+        hosts = []
+        path_pattern = None
+        extensions = ["txt"]
+
+        @staticmethod
+        def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+            return {"loader": "text", "url": url.geturl()}
+
+    class _FallbackLoader(_TextLoader):
+        extensions = []
+
+        @staticmethod
+        def get_loader_spec(url: ParseResult) -> dict[str, str] | None:
+            return None
+
+    registry = LoaderRegistry()
+    registry.register(_FallbackLoader)
+    registry.register(_TextLoader)
+    registry.register(_ExampleLoader)
+
+    resolved = registry.resolve("https://example.com/docs/a.txt")
+    assert resolved is not None and isinstance(resolved.loader, _ExampleLoader)
+    assert resolved.loader_spec == {"loader": "example", "path": "/docs/a.txt"}
+
+    # the host loader declines, the extension loader accepts
+    resolved = registry.resolve("https://example.com/notes.TXT")
+    assert resolved is not None and isinstance(resolved.loader, _TextLoader)
+
+    resolved = registry.resolve("https://other.com/page")
+    assert resolved is not None and resolved.loader_spec is None
+    assert LoaderRegistry().resolve("https://other.com/page") is None
@@ -0,0 +1,330 @@
+"""Disk cache of raw fetched responses, revalidated with conditional requests.
+
+Each entry is a `<key>.json` record next to its `<key>.body`, where the key is
+the digest of the canonical URL. Media downloaded by other tools is kept in a
+`<key>.media` directory instead. Entries are evicted least recently used first
+once the cache exceeds its size, recency being the mtime of the record or
+directory.
+"""
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import BinaryIO, Iterator
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import httpx
+
+_CACHE_DIRECTORY = os.environ.get(
+    "KMS_HTTP_CACHE_DIR", os.path.join(os.path.expanduser("~"), "kms", "http_cache")
+)
+_CACHE_MAX_BYTES = int(os.environ.get("KMS_HTTP_CACHE_BYTES", 2 * 1024**3))
+
+_RECORD_SUFFIX = ".json"
+_BODY_SUFFIX = ".body"
+_MEDIA_SUFFIX = ".media"
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_TRACKING_PARAMETER_PREFIXES = ("utm_",)
+_TRACKING_PARAMETERS = {"fbclid", "gclid", "mc_cid", "mc_eid"}
+
+
+def canonical_url(url: str) -> str:
+    """Normalizes the spellings of a URL which address the same resource."""
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port is not None and parsed.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not name.startswith(_TRACKING_PARAMETER_PREFIXES)
+        and name not in _TRACKING_PARAMETERS
+    )
+    return urlunparse(
+        (scheme, host, parsed.path or "/", parsed.params, urlencode(query), "")
+    )
+
+
+def _cache_key(url: str) -> str:
+    return hashlib.sha256(canonical_url(url).encode()).hexdigest()
+
+
+@dataclasses.dataclass
+class CacheRecord:
+    url: str
+    content_type: str | None
+    etag: str | None
+    last_modified: str | None
+    size_bytes: int
+
+    @property
+    def validators(self) -> dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    record: CacheRecord
+    # body of the response, decoded of any content encoding
+    file: BinaryIO
+    # may be replaced by a concurrent fetch of the same URL, unlike `file`
+    path: str
+    # whether the body was served from the cache
+    from_cache: bool
+
+    @property
+    def content_type(self) -> str:
+        return (self.record.content_type or "").split(";")[0].strip().lower()
+
+    def text(self) -> str:
+        encoding = "utf-8"
+        for parameter in (self.record.content_type or "").split(";")[1:]:
+            name, _, value = parameter.strip().partition("=")
+            if name.lower() == "charset" and value:
+                encoding = value.strip('"')
+        self.file.seek(0)
+        return self.file.read().decode(encoding, errors="replace")
+
+    @contextlib.contextmanager
+    def detached_path(self) -> Iterator[str]:
+        """Yields a path of the body, which outlives eviction of the entry.
+
+        The body is hard linked, or copied from `file` if `path` was replaced
+        by a concurrent fetch. Usable once `file` is closed.
+        """
+        detached_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(self.path, detached_path)
+                body_inode = os.fstat(self.file.fileno()).st_ino
+                linked = os.stat(detached_path).st_ino == body_inode
+            except OSError:
+                # evicted, or unsupported by the file system
+                linked = False
+            if not linked:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(detached_path)
+                self.file.seek(0)
+                with open(detached_path, "wb") as f:
+                    shutil.copyfileobj(self.file, f)
+            yield detached_path
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(detached_path)
+
+
+@dataclasses.dataclass
+class CacheStats:
+    max_bytes: int
+    size_bytes: int = 0
+    entries: int = 0
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        directory: str = _CACHE_DIRECTORY,
+        max_bytes: int = _CACHE_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def fetch(self, client: httpx.Client, url: str) -> Iterator[CachedResponse]:
+        """Yields the response body for `url`, downloading it only if it changed.
+
+        Raises `httpx.HTTPError` for failed requests and error statuses.
+        """
+        key = _cache_key(url)
+        record = self._load_record(key)
+        file = self._open_body(key) if record is not None else None
+        try:
+            headers = record.validators if file is not None else {}
+            with client.stream("GET", url, headers=headers) as response:
+                from_cache = file is not None and response.status_code == 304
+                if not from_cache:
+                    response.raise_for_status()
+                    if file is not None:
+                        file.close()
+                        file = None
+                    record, file = self._store(key, url, response)
+
+            if from_cache:
+                self._touch(key)
+            yield CachedResponse(record, file, self._path(key), from_cache)
+        finally:
+            if file is not None:
+                file.close()
+
+    def media_directory(self, url: str) -> str:
+        """Returns the directory kept for media of `url` downloaded by other tools.
+
+        Such media cannot be revalidated, and is kept until evicted.
+        """
+        path = self._path(_cache_key(url), _MEDIA_SUFFIX)
+        os.makedirs(path, exist_ok=True)
+        os.utime(path)
+        return path
+
+    def stats(self) -> CacheStats:
+        records = self._records()
+        return CacheStats(
+            max_bytes=self.max_bytes,
+            size_bytes=sum(size for _, _, size in records),
+            entries=len(records),
+        )
+
+    def _path(self, key: str, suffix: str = _BODY_SUFFIX) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def _load_record(self, key: str) -> CacheRecord | None:
+        try:
+            with open(self._path(key, _RECORD_SUFFIX), "r") as f:
+                return CacheRecord(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def _open_body(self, key: str) -> BinaryIO | None:
+        # an open body stays readable if the entry is replaced or evicted
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, key: str):
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(self._path(key, _RECORD_SUFFIX))
+
+    def _store(
+        self, key: str, url: str, response: httpx.Response
+    ) -> tuple[CacheRecord, BinaryIO]:
+        body_fd, body_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(body_fd, "w+b") as f:
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+                size_bytes = f.tell()
+        except BaseException:
+            os.remove(body_path)
+            raise
+
+        record = CacheRecord(
+            url=url,
+            content_type=response.headers.get("content-type"),
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            size_bytes=size_bytes,
+        )
+        file = open(body_path, "rb")
+        # the body is replaced first, a record never describes a missing body
+        os.replace(body_path, self._path(key))
+        record_fd, record_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(record_fd, "w") as f:
+            json.dump(dataclasses.asdict(record), f)
+        os.replace(record_path, self._path(key, _RECORD_SUFFIX))
+
+        self._evict()
+        return record, file
+
+    def _records(self) -> list[tuple[float, str, int]]:
+        """Returns (last used, name, size) of every entry."""
+        records = []
+        for entry in os.scandir(self.directory):
+            with contextlib.suppress(FileNotFoundError):
+                if entry.name.endswith(_RECORD_SUFFIX):
+                    key = entry.name[: -len(_RECORD_SUFFIX)]
+                    body_size = os.stat(self._path(key)).st_size
+                    records.append((entry.stat().st_mtime, key, body_size))
+                elif entry.name.endswith(_MEDIA_SUFFIX) and entry.is_dir():
+                    media_size = sum(
+                        x.stat().st_size for x in os.scandir(entry.path) if x.is_file()
+                    )
+                    records.append((entry.stat().st_mtime, entry.name, media_size))
+        return records
+
+    def _evict(self):
+        with self._lock:
+            records = sorted(self._records())
+            size_bytes = sum(size for _, _, size in records)
+            for _, name, size in records:
+                if size_bytes <= self.max_bytes:
+                    break
+                if name.endswith(_MEDIA_SUFFIX):
+                    media_path = os.path.join(self.directory, name)
+                    shutil.rmtree(media_path, ignore_errors=True)
+                else:
+                    for suffix in [_RECORD_SUFFIX, _BODY_SUFFIX]:
+                        with contextlib.suppress(FileNotFoundError):
+                            os.remove(self._path(name, suffix))
+                size_bytes -= size
+
+
+_DEFAULT_CACHE: ResponseCache | None = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def default_cache() -> ResponseCache:
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        with _DEFAULT_CACHE_LOCK:
+            if _DEFAULT_CACHE is None:
+                _DEFAULT_CACHE = ResponseCache()
+    return _DEFAULT_CACHE
+
+
+if __name__ == "__main__":
+    from loaders import fetch_fixtures
+
+    assert canonical_url("HTTPS://Example.com:443?b=2&a=1&utm_source=x#top") == (
+        "https://example.com/?a=1&b=2"
+    )
+
+    with tempfile.TemporaryDirectory() as d, fetch_fixtures.serve() as base_url:
+        cache = ResponseCache(d, max_bytes=64 * 1024)
+        client = httpx.Client()
+
+        with cache.fetch(client, f"{base_url}/article?encoding=gzip") as response:
+            assert not response.from_cache
+            assert response.content_type == "text/html"
+            article = response.text()
+        assert article == fetch_fixtures.ARTICLE_HTML
+
+        # the fixture server answers conditional requests with 304
+        with cache.fetch(client, f"{base_url}/article?encoding=gzip") as response:
+            assert response.from_cache
+            assert response.text() == article
+
+        # detached bodies remain readable once the entry is evicted
+        with contextlib.ExitStack() as stack:
+            with cache.fetch(client, f"{base_url}/article?encoding=gzip") as response:
+                detached_path = stack.enter_context(response.detached_path())
+            os.remove(response.path)
+            with open(detached_path, "rb") as f:
+                assert f.read().decode() == article
+        assert not os.path.exists(detached_path)
+
+        # responses without validators are downloaded again
+        with cache.fetch(client, f"{base_url}/app") as response:
+            assert not response.from_cache
+        with cache.fetch(client, f"{base_url}/app") as response:
+            assert not response.from_cache
+
+        for i in range(5):
+            with cache.fetch(client, f"{base_url}/article?copy={i}"):
+                pass
+        stats = cache.stats()
+        assert stats.size_bytes <= stats.max_bytes
+        assert stats.entries < 7
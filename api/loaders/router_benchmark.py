@@ -0,0 +1,78 @@
+# Compares loader dispatch through the registry against a scan of every loader.
+import random
+import sys
+import time
+from urllib.parse import urlparse
+
+from loaders import loaders
+
+_ORDERED_LOADERS = [
+    loaders.ArxivDocumentLoader,
+    loaders.WikipediaDocumentLoader,
+    loaders.HackerNewsDocumentLoader,
+    loaders.YouTubeVideoDocumentLoader,
+    loaders.PDFDocumentLoader,
+    loaders.WebPageDocumentLoader,
+    loaders.DefaultDocumentLoader,
+]
+
+
+def _url_corpus(size: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    templates = [
+        "https://arxiv.org/abs/{n:04d}.{m:05d}",
+        "https://arxiv.org/pdf/{n:04d}.{m:05d}.pdf",
+        "https://en.wikipedia.org/wiki/Article_{n}",
+        "https://news.ycombinator.com/item?id={n}{m}",
+        "https://www.youtube.com/watch?v=video{n}",
+        "https://papers.example.org/{n}/paper_{m}.pdf",
+        "https://blog{n}.example.com/posts/{m}",
+        "https://docs.example.net/{n}/guide.html?page={m}",
+        "ftp://files.example.org/{n}/{m}",
+    ]
+    return [
+        rng.choice(templates).format(n=rng.randrange(10000), m=rng.randrange(100000))
+        for _ in range(size)
+    ]
+
+
+def _scan(url: str):
+    # dispatch prior to the registry, a scan for the spec and another to locate
+    parsed_url = urlparse(url)
+    loader_spec = next(
+        (
+            x.get_loader_spec(parsed_url)
+            for x in _ORDERED_LOADERS
+            if x.can_load(parsed_url)
+        ),
+        None,
+    )
+    loader_type = next(x for x in _ORDERED_LOADERS if x.can_load(parsed_url))
+    return loader_spec, loader_type(parsed_url)
+
+
+def main(size: int):
+    urls = _url_corpus(size)
+
+    start = time.perf_counter()
+    scanned = [_scan(x) for x in urls]
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    resolved = [loaders.resolve(x) for x in urls]
+    resolve_seconds = time.perf_counter() - start
+
+    for (loader_spec, loader), x in zip(scanned, resolved):
+        assert x is not None
+        assert loader_spec == x.loader_spec
+        assert type(loader) is type(x.loader)
+
+    for name, seconds in [("scan", scan_seconds), ("registry", resolve_seconds)]:
+        print(
+            f"{name}: {len(urls) / seconds:,.0f} URLs/s, "
+            f"{seconds / len(urls) * 1e6:.2f}us per URL"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
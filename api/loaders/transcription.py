@@ -0,0 +1,225 @@
+"""Whisper transcription, with the model loaded once per process.
+
+Audio is split at silence into segments no longer than Whisper's 30 second
+window, which are transcribed in batches. Transcripts are cached by the digest
+of the audio file and the model used.
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterator
+
+import librosa
+import numpy as np
+import torch
+from langchain.docstore.document import Document
+from langchain.document_loaders.base import BaseBlobParser
+from langchain.document_loaders.blob_loaders import Blob
+from pydub import AudioSegment
+from transformers import pipeline
+
+_MODEL = os.environ.get("KMS_WHISPER_MODEL")
+_BATCH_SIZE = int(os.environ.get("KMS_WHISPER_BATCH_SIZE", 8))
+# threads used for inference on machines without a GPU
+_CPU_THREADS = int(os.environ.get("KMS_WHISPER_CPU_THREADS", os.cpu_count() or 1))
+# audio quieter than the peak by this many decibels is treated as silence
+_SILENCE_TOP_DB = float(os.environ.get("KMS_WHISPER_SILENCE_DB", 40))
+_TRANSCRIPT_CACHE_DIRECTORY = os.environ.get(
+    "KMS_TRANSCRIPT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), "kms", "transcripts"),
+)
+
+_SAMPLE_RATE = 16000
+_SEGMENT_SECONDS = 30
+
+
+@dataclasses.dataclass
+class Transcript:
+    text: str
+    segment_count: int
+    audio_seconds: float
+    # zero when served from the cache, or by an already loaded model
+    model_load_seconds: float = 0.0
+    decode_seconds: float = 0.0
+    transcribe_seconds: float = 0.0
+    cached: bool = False
+
+
+def plan_segments(
+    intervals: list[tuple[int, int]], max_samples: int
+) -> list[tuple[int, int]]:
+    """Groups consecutive non-silent intervals into segments of `max_samples`.
+
+    Segments end at silence, unless a single interval is longer than a segment.
+    """
+    segments: list[tuple[int, int]] = []
+    for start, end in intervals:
+        while end - start > max_samples:
+            segments.append((start, start + max_samples))
+            start += max_samples
+        if segments and end - segments[-1][0] <= max_samples:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def _device() -> str:
+    return "cuda:0" if torch.cuda.is_available() else "cpu"
+
+
+def _default_model(device: str) -> str:
+    # matches the selection of langchain's OpenAIWhisperParserLocal
+    if device == "cpu":
+        return "openai/whisper-base"
+
+    memory_mb = torch.cuda.get_device_properties(device).total_memory / (1024**2)
+    if memory_mb < 5000:
+        return "openai/whisper-base"
+    elif memory_mb < 7000:
+        return "openai/whisper-small"
+    elif memory_mb < 12000:
+        return "openai/whisper-medium"
+    return "openai/whisper-large"
+
+
+def _decode_audio(path: str) -> np.ndarray:
+    audio = AudioSegment.from_file(path).set_channels(1).set_frame_rate(_SAMPLE_RATE)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    return samples / float(1 << (8 * audio.sample_width - 1))
+
+
+class TranscriptionEngine:
+    def __init__(self, model: str | None = _MODEL, batch_size: int = _BATCH_SIZE):
+        start = time.perf_counter()
+        self.device = _device()
+        if self.device == "cpu":
+            torch.set_num_threads(_CPU_THREADS)
+        self.model = model or _default_model(self.device)
+        self.batch_size = batch_size
+        self._pipe = pipeline(
+            "automatic-speech-recognition",
+            model=self.model,
+            chunk_length_s=_SEGMENT_SECONDS,
+            device=self.device,
+        )
+        self._lock = threading.Lock()
+        self.load_seconds = time.perf_counter() - start
+        # reported by the first transcript, after which the model is warm
+        self._pending_load_seconds = self.load_seconds
+
+    def transcribe(self, path: str) -> Transcript:
+        start = time.perf_counter()
+        samples = _decode_audio(path)
+        intervals = librosa.effects.split(samples, top_db=_SILENCE_TOP_DB)
+        segments = plan_segments(
+            [(int(x), int(y)) for x, y in intervals], _SEGMENT_SECONDS * _SAMPLE_RATE
+        )
+        decode_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with self._lock:
+            predictions = []
+            if segments:
+                predictions = self._pipe(
+                    [samples[x:y] for x, y in segments], batch_size=self.batch_size
+                )
+            load_seconds = self._pending_load_seconds
+            self._pending_load_seconds = 0.0
+        transcribe_seconds = time.perf_counter() - start
+
+        return Transcript(
+            text=" ".join(x["text"].strip() for x in predictions),
+            segment_count=len(segments),
+            audio_seconds=len(samples) / _SAMPLE_RATE,
+            model_load_seconds=load_seconds,
+            decode_seconds=decode_seconds,
+            transcribe_seconds=transcribe_seconds,
+        )
+
+
+class TranscriptCache:
+    def __init__(self, directory: str = _TRANSCRIPT_CACHE_DIRECTORY):
+        self.directory = directory
+
+    def get(self, digest: str, model: str) -> Transcript | None:
+        try:
+            with open(self._path(digest, model), "r", encoding="utf-8") as f:
+                return Transcript(**json.load(f), cached=True)
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def put(self, digest: str, model: str, transcript: Transcript):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(digest, model)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "text": transcript.text,
+                    "segment_count": transcript.segment_count,
+                    "audio_seconds": transcript.audio_seconds,
+                },
+                f,
+            )
+        os.replace(temp_path, path)
+
+    def _path(self, digest: str, model: str) -> str:
+        return os.path.join(self.directory, f"{digest}.{model.replace('/', '_')}.json")
+
+
+_DEFAULT_ENGINE: TranscriptionEngine | None = None
+_DEFAULT_ENGINE_PID: int | None = None
+_DEFAULT_ENGINE_LOCK = threading.Lock()
+
+
+def default_engine() -> TranscriptionEngine:
+    global _DEFAULT_ENGINE, _DEFAULT_ENGINE_PID
+    with _DEFAULT_ENGINE_LOCK:
+        # a model inherited across a fork would share its device state
+        if _DEFAULT_ENGINE is None or _DEFAULT_ENGINE_PID != os.getpid():
+            _DEFAULT_ENGINE = TranscriptionEngine()
+            _DEFAULT_ENGINE_PID = os.getpid()
+        return _DEFAULT_ENGINE
+
+
+def transcribe(path: str, cache: TranscriptCache | None = None) -> Transcript:
+    """Transcribes the audio at `path`, loading the model only on a cache miss."""
+    cache = cache or TranscriptCache()
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+    transcript = cache.get(digest, _MODEL or _default_model(_device()))
+    if transcript is None:
+        engine = default_engine()
+        transcript = engine.transcribe(path)
+        cache.put(digest, engine.model, transcript)
+    return transcript
+
+
+class WhisperTranscriptParser(BaseBlobParser):
+    """Transcribes audio blobs with the shared engine of this process."""
+
+    def lazy_parse(self, blob: Blob) -> Iterator[Document]:
+        transcript = transcribe(str(blob.path))
+        print(
+            f"Transcribed [{blob.source}]: {transcript.audio_seconds:.0f}s of audio "
+            f"in {transcript.segment_count} segments, cached {transcript.cached}, "
+            f"model load {transcript.model_load_seconds:.1f}s, "
+            f"decode {transcript.decode_seconds:.1f}s, "
+            f"transcription {transcript.transcribe_seconds:.1f}s"
+        )
+        yield Document(
+            page_content=transcript.text,
+            metadata={"source": blob.source},
+        )
+
+
+if __name__ == "__main__":
+    # two utterances separated by silence fit one segment, a long one is cut
+    assert plan_segments([(0, 10), (20, 30)], 40) == [(0, 30)]
+    assert plan_segments([(0, 10), (20, 30), (35, 60)], 40) == [(0, 30), (35, 60)]
+    assert plan_segments([(0, 100)], 40) == [(0, 40), (40, 80), (80, 100)]
@@ -1,6 +1,7 @@
 import dataclasses
 from flask import request, Flask
 
+from doc_store import read_cache
 from services.persist import document
 
 
@@ -13,13 +14,13 @@ def register_routes(app: Flask):
     @app.post("/documents/<hash>/annotations")
     async def add_document_annotation(hash: str):
         request_body = ModifyAnnotationRequest(**request.json)  # type: ignore
-        document.add_document_annotation(hash, request_body.annotation)
+        await document.add_document_annotation_async(hash, request_body.annotation)
 
         return {}
 
     @app.get("/documents/<hash>/annotations")
     async def get_document_annotation(hash: str):
-        document_annotations = document.get_document_annotations(hash)
+        document_annotations = await document.get_document_annotations_async(hash)
 
         return {
             "annotations": document_annotations,
@@ -28,6 +29,10 @@ def register_routes(app: Flask):
     @app.delete("/documents/<hash>/annotations")
     async def remove_document_annotation(hash: str):
         request_body = ModifyAnnotationRequest(**request.json)  # type: ignore
-        document.remove_document_annotation(hash, request_body.annotation)
+        await document.remove_document_annotation_async(hash, request_body.annotation)
 
         return {}
+
+    @app.get("/documents/cache")
+    def get_document_cache_stats():
+        return dataclasses.asdict(read_cache.get_cache_stats())
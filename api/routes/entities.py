@@ -1,6 +1,19 @@
-from flask import jsonify, Flask
+import dataclasses
+
+from flask import jsonify, request, Flask
 
 from content_workflow import DocumentEntitiesContainer, Context
+from services.persist import entities
+
+_DEFAULT_QUERY_LIMIT = 50
+_MAX_QUERY_LIMIT = 1000
+
+
+def _get_query_limit() -> int:
+    limit = request.args.get("limit", _DEFAULT_QUERY_LIMIT, type=int)
+    if not 0 < limit <= _MAX_QUERY_LIMIT:
+        raise ValueError(f"limit must be within [1, {_MAX_QUERY_LIMIT}]")
+    return limit
 
 
 def register_routes(app: Flask):
@@ -8,8 +21,31 @@ def register_routes(app: Flask):
     async def get_entities(hash: str):
         content_retriever = DocumentEntitiesContainer()
         context = Context(hash=hash)
-        if content_retriever.has_processed(context):
+        if await content_retriever.has_processed_async(context):
             entity_relations = await content_retriever.get_output_type(context)
             return jsonify([x.model_dump() for x in entity_relations])
 
         return []
+
+    @app.get("/entities/neighbors")
+    async def get_entity_neighbors():
+        entity = request.args.get("entity", None, type=str)
+        if not entity:
+            raise ValueError("entity is required")
+
+        neighbors = await entities.get_entity_neighbors_async(
+            entity, _get_query_limit()
+        )
+        return jsonify([dataclasses.asdict(x) for x in neighbors])
+
+    @app.get("/entities/documents")
+    async def get_entity_documents():
+        """Documents mentioning every `entity` argument."""
+        entity_names = request.args.getlist("entity", type=str)
+        if not entity_names:
+            raise ValueError("entity is required")
+
+        documents = await entities.get_entity_documents_async(
+            entity_names, _get_query_limit()
+        )
+        return jsonify([dataclasses.asdict(x) for x in documents])
@@ -1,7 +1,10 @@
 import dataclasses
-from flask import request, Flask
+from celery import group
+from flask import abort, request, Flask, Response, current_app
 import flask_celery
+import constants
 
+from services import fetch_scheduler
 from services.persist import task, document, summary
 from routes import url_tools
 
@@ -21,18 +24,74 @@ class GenerateSummaryRequest:
     force_process: bool = True
 
 
+@dataclasses.dataclass
+class BatchDocumentRequest:
+    url: str
+    title: str | None = None
+
+
+@dataclasses.dataclass
+class GenerateSummariesRequest:
+    documents: list[BatchDocumentRequest]
+
+    force_process: bool = False
+
+    def __post_init__(self):
+        self.documents = [
+            x if isinstance(x, BatchDocumentRequest) else BatchDocumentRequest(**x)
+            for x in self.documents
+        ]
+
+
+_DEFAULT_PAGE_SIZE = 500
+_MAX_PAGE_SIZE = 5000
+
+
+class BatchRegistrationStatus:
+    REGISTERED = "registered"
+    REPROCESSING = "reprocessing"
+    EXISTS = "exists"
+    DUPLICATE = "duplicate"
+    UNSUPPORTED = "unsupported"
+
+
 def register_routes(app: Flask):
     @app.get("/process")
     def list_registration_results():
-        return [
-            {
-                "url": registration.url,
-                "hash": registration.hash,
-                "has_summary": registration.has_summary,
-                "last_updated": registration.last_updated,
-            }
-            for registration in document.get_loaded_documents()
-        ]
+        limit = request.args.get("limit", _DEFAULT_PAGE_SIZE, type=int)
+        if not 0 < limit <= _MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be within [1, {_MAX_PAGE_SIZE}]")
+        cursor = request.args.get("cursor", None, type=str)
+
+        # queried ahead of the response, so an invalid cursor is a 400 rather than
+        # a truncated body, and no connection is held while the client reads
+        try:
+            # one extra row determines whether another page exists
+            registrations = document.get_loaded_documents(limit + 1, cursor)
+        except ValueError as e:
+            abort(400, description=str(e))
+        next_cursor = None
+        if len(registrations) > limit:
+            registrations = registrations[:limit]
+            next_cursor = registrations[-1].cursor
+        json_provider = current_app.json
+
+        def generate():
+            yield '{"documents":['
+            for i, registration in enumerate(registrations):
+                if i > 0:
+                    yield ","
+                yield json_provider.dumps(
+                    {
+                        "url": registration.url,
+                        "hash": registration.hash,
+                        "has_summary": registration.has_summary,
+                        "last_updated": registration.last_updated,
+                    }
+                )
+            yield '],"next_cursor":' + json_provider.dumps(next_cursor) + "}"
+
+        return Response(generate(), mimetype="application/json")
 
     @app.post("/process")
     def register_url():
@@ -44,28 +103,123 @@ def register_routes(app: Flask):
         if loader_spec is None:
             raise ValueError("Could not process URL")
 
-        has_processed_spec = document.has_loader_spec_registered(loader_spec)
-        if has_processed_spec and not request_body.force_process:
-            print("URL already processed")
-            return {"result_id": None, "hash": target_url_hash}
-
-        document.register_document(
-            target_url_hash,
-            target_url,
-            loader_spec,
-            handle_exists=request_body.force_process,
-        )
+        registered_hash = document.get_loader_spec_hash(loader_spec)
+        if registered_hash is not None:
+            # the spec may have been registered through a different URL
+            target_url_hash = registered_hash
+            if not request_body.force_process:
+                print("URL already processed")
+                return {"result_id": None, "hash": target_url_hash}
+        else:
+            document.register_document(
+                target_url_hash,
+                target_url,
+                loader_spec,
+                handle_exists=request_body.force_process,
+            )
 
         # use target URL to dedupe against requests with fragment/query changes
-        process_request = flask_celery.process_content.delay(
-            target_url_hash
-        )  # type: ignore
+        process_request = flask_celery.process_content_async(
+            target_url_hash, constants.INTERACTIVE_PRIORITY
+        )
 
         return {
             "result_id": process_request.id,
             "hash": target_url_hash,
         }
 
+    @app.post("/process/batch")
+    def register_urls():
+        request_body = GenerateSummariesRequest(**request.json)  # type: ignore
+
+        results = []
+        registrations: dict[str, document.DocumentRegistration] = {}
+        registration_digests: dict[str, str] = {}
+        for requested_document in request_body.documents:
+            target_url = url_tools.extract_target_url(requested_document.url)
+            target_url_hash = url_tools.hash_url(target_url)
+            result = {
+                "url": requested_document.url,
+                "hash": target_url_hash,
+                "result_id": None,
+            }
+            results.append(result)
+
+            loader_spec = get_loader_spec(target_url)
+            if loader_spec is None:
+                result["status"] = BatchRegistrationStatus.UNSUPPORTED
+                continue
+
+            registration = document.DocumentRegistration(
+                hash=target_url_hash,
+                url=target_url,
+                loader_spec=loader_spec,
+            )
+            if registration.loader_spec_digest in registration_digests:
+                result["hash"] = registration_digests[registration.loader_spec_digest]
+                result["status"] = BatchRegistrationStatus.DUPLICATE
+                continue
+
+            registrations[target_url_hash] = registration
+            registration_digests[registration.loader_spec_digest] = target_url_hash
+
+        registered = document.get_registered_documents(list(registrations.values()))
+        inserted = document.register_documents(
+            [x for x in registrations.values() if x.hash not in registered]
+        )
+
+        process_hashes = list(inserted)
+        if request_body.force_process:
+            process_hashes.extend(
+                x for x in registrations.keys() if registered.get(x) == x
+            )
+
+        # hosts alternate in the queue, so workers are not all waiting on one host
+        process_hashes = fetch_scheduler.interleave_by_host(
+            process_hashes, lambda x: registrations[x].url
+        )
+        arxiv_ids = [
+            registrations[x].loader_spec["id"]
+            for x in process_hashes
+            if registrations[x].loader_spec["loader"] == "arxiv"
+        ]
+        if len(arxiv_ids) > 1:
+            # queued ahead of the fetches, which then find the metadata cached
+            flask_celery.prefetch_arxiv_papers.apply_async(
+                (arxiv_ids,), priority=constants.BULK_PRIORITY
+            )
+
+        process_results = {}
+        if process_hashes:
+            # use target URL to dedupe against requests with fragment/query changes
+            group_result = group(
+                flask_celery.process_content.si(
+                    x, priority=constants.BULK_PRIORITY
+                ).set(priority=constants.BULK_PRIORITY)
+                for x in process_hashes
+            ).apply_async()
+            process_results = {
+                hash: child.id
+                for hash, child in zip(process_hashes, group_result.results)  # type: ignore
+            }
+
+        for result in results:
+            if "status" in result:
+                continue
+
+            hash = result["hash"]
+            result["result_id"] = process_results.get(hash)
+            if hash in inserted:
+                result["status"] = BatchRegistrationStatus.REGISTERED
+            elif hash in process_results:
+                result["status"] = BatchRegistrationStatus.REPROCESSING
+            else:
+                # an existing spec may be registered under another URL's hash
+                result["hash"] = registered.get(hash, hash)
+                result["status"] = BatchRegistrationStatus.EXISTS
+
+        return results
+
     @app.post("/process/<hash>/results")
     def get_processing_result_content(hash: str):
         value = {}
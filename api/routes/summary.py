@@ -25,7 +25,7 @@ def register_routes(app: Flask):
     async def has_summary(hash: str):
         content_retriever = DocumentSummaryContainer()
         context = Context(hash=hash)
-        if content_retriever.has_processed(context):
+        if await content_retriever.has_processed_async(context):
             summary = await content_retriever.get_output_type(context)
         else:
             summary = None
@@ -1,9 +1,15 @@
 import dataclasses
+import datetime
 from flask import request, Flask
 import flask_celery
+import constants
 from itertools import chain
 
-from services.persist import task
+from services.persist import task, metrics
+
+
+_DEFAULT_PAGE_SIZE = 500
+_MAX_PAGE_SIZE = 5000
 
 
 @dataclasses.dataclass
@@ -16,7 +22,7 @@ def _get_task_type_statuses(task_type: str) -> list[str]:
         case "all":
             return []
         case "pending":
-            return ["PENDING", "STARTED"]
+            return ["PENDING", "STARTED", "DEFERRED"]
         case "complete":
             return ["COMPLETED"]
         case "failed":
@@ -49,16 +55,49 @@ def register_routes(app: Flask):
             chain.from_iterable(map(_get_task_type_statuses, task_types))
         )
 
-        registrations = task.get_processing_registrations()
-        if status_filters:
-            registrations = filter(lambda x: x.status in status_filters, registrations)
-
-        show_retried_tasks = request.args.get("include_retried", False, type=bool)
-        registrations = filter(
-            lambda x: x.retry_task_id is None or show_retried_tasks, registrations
+        limit = request.args.get("limit", _DEFAULT_PAGE_SIZE, type=int)
+        if not 0 < limit <= _MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be within [1, {_MAX_PAGE_SIZE}]")
+
+        registration_filter = task.ProcessingRegistrationFilter(
+            statuses=status_filters,
+            task_names=request.args.getlist("task_name", type=str),
+            include_retried=request.args.get("include_retried", False, type=bool),
+            updated_after=request.args.get(
+                "updated_after", None, type=datetime.datetime.fromisoformat
+            ),
+            updated_before=request.args.get(
+                "updated_before", None, type=datetime.datetime.fromisoformat
+            ),
         )
 
-        return [dataclasses.asdict(registration) for registration in registrations]
+        # one extra row determines whether another page exists
+        registrations = task.get_processing_registrations(
+            registration_filter,
+            limit + 1,
+            request.args.get("cursor", None, type=str),
+        )
+        next_cursor = None
+        if len(registrations) > limit:
+            registrations = registrations[:limit]
+            next_cursor = registrations[-1].cursor
+
+        return {
+            "tasks": [
+                dataclasses.asdict(registration) for registration in registrations
+            ],
+            "next_cursor": next_cursor,
+        }
+
+    @app.get("/tasks/queue_wait")
+    def get_queue_wait():
+        window_minutes = request.args.get("window_minutes", 60, type=int)
+        since = datetime.datetime.now() - datetime.timedelta(minutes=window_minutes)
+
+        return [
+            dataclasses.asdict(summary)
+            for summary in metrics.get_queue_wait_summary(since)
+        ]
 
     @app.post("/tasks/<task_id>/action")
     def reprocess_task(task_id: str):
@@ -69,9 +108,11 @@ def register_routes(app: Flask):
                 task_request = task.get_task_request(task_id)
                 if task_request is None:
                     raise ValueError("No such task exists")
-                reprocess_task = flask_celery.process_content.delay(
-                    task_request.hash, task_request.task_name
-                )  # type: ignore
+                reprocess_task = flask_celery.process_content_async(
+                    task_request.hash,
+                    constants.INTERACTIVE_PRIORITY,
+                    task_request.task_name,
+                )
 
                 task.set_retry_child(task_id, reprocess_task.id)
 
@@ -0,0 +1,381 @@
+"""Per-host scheduling of document fetches, shared by every worker through Redis.
+
+Each host allows a bounded number of concurrent fetches, started no closer
+together than its interval. A host answering 429 or 503 is paused for its
+Retry-After. A fetch which cannot start within a short wait raises
+`HostUnavailableError`, so its task can be requeued behind fetches of other
+hosts rather than holding a worker. Requeued fetches of a host are retried an
+interval apart, after those deferred before them, rather than all at once.
+"""
+import collections
+import contextlib
+import dataclasses
+import email.utils
+import math
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, Iterator, TypeVar
+from urllib.parse import urlparse
+
+import redis
+
+from services import locks
+
+T = TypeVar("T")
+
+_HOST_CONCURRENCY = int(os.environ.get("KMS_FETCH_HOST_CONCURRENCY", 2))
+_HOST_INTERVAL_SECONDS = float(os.environ.get("KMS_FETCH_HOST_INTERVAL", 1.0))
+# "host=concurrency/interval" pairs, separated by commas
+_HOST_POLICY_OVERRIDES = os.environ.get("KMS_FETCH_HOST_POLICIES", "")
+# waited within the worker, longer waits requeue the task
+_MAX_WAIT_SECONDS = float(os.environ.get("KMS_FETCH_MAX_WAIT", 3))
+# reclaims the slot of a worker which died while fetching
+_LEASE_SECONDS = float(os.environ.get("KMS_FETCH_LEASE_SECONDS", 900))
+# pause of a throttled host which did not send Retry-After
+_THROTTLE_SECONDS = float(os.environ.get("KMS_FETCH_THROTTLE_SECONDS", 60))
+_MAX_THROTTLE_SECONDS = 3600
+
+_POLL_SECONDS = 0.25
+_THROTTLED_STATUS_CODES = {429, 503}
+
+
+@dataclasses.dataclass
+class HostPolicy:
+    concurrency: int
+    interval_seconds: float
+
+
+_HOST_POLICIES = {
+    # https://info.arxiv.org/help/api/tou.html, a request every 3 seconds
+    "arxiv.org": HostPolicy(concurrency=1, interval_seconds=3.0),
+}
+# hosts sharing the limits of another
+_HOST_ALIASES = {
+    "export.arxiv.org": "arxiv.org",
+}
+
+
+def _parse_host_policies(value: str) -> dict[str, HostPolicy]:
+    policies = {}
+    for entry in filter(None, (x.strip() for x in value.split(","))):
+        host, _, limits = entry.partition("=")
+        concurrency, _, interval = limits.partition("/")
+        policies[host.strip().lower()] = HostPolicy(
+            concurrency=int(concurrency),
+            interval_seconds=float(interval or _HOST_INTERVAL_SECONDS),
+        )
+    return policies
+
+
+_HOST_POLICIES.update(_parse_host_policies(_HOST_POLICY_OVERRIDES))
+
+
+def fetch_host(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return _HOST_ALIASES.get(host, host)
+
+
+def host_policy(host: str) -> HostPolicy:
+    default_policy = HostPolicy(
+        concurrency=_HOST_CONCURRENCY, interval_seconds=_HOST_INTERVAL_SECONDS
+    )
+    return _HOST_POLICIES.get(host, default_policy)
+
+
+def interleave_by_host(items: Iterable[T], get_url: Callable[[T], str]) -> list[T]:
+    """Orders items round robin across hosts, keeping their order per host."""
+    by_host: dict[str, collections.deque[T]] = collections.defaultdict(
+        collections.deque
+    )
+    for item in items:
+        by_host[fetch_host(get_url(item))].append(item)
+
+    interleaved = []
+    queues = collections.deque(by_host.values())
+    while queues:
+        queue = queues.popleft()
+        interleaved.append(queue.popleft())
+        if queue:
+            queues.append(queue)
+    return interleaved
+
+
+def throttle_seconds(error: BaseException) -> float | None:
+    """Returns the pause requested by a 429 or 503 response raised as `error`.
+
+    Responses are read from the `response` of httpx and requests errors.
+    """
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    if status_code not in _THROTTLED_STATUS_CODES:
+        return None
+
+    retry_after = response.headers.get("retry-after")  # type: ignore
+    if retry_after is None:
+        return _THROTTLE_SECONDS
+    try:
+        seconds = float(retry_after)
+    except ValueError:
+        # otherwise an HTTP date
+        try:
+            seconds = email.utils.parsedate_to_datetime(retry_after).timestamp()
+            seconds -= time.time()
+        except (TypeError, ValueError):
+            return _THROTTLE_SECONDS
+    return min(max(seconds, 0.0), _MAX_THROTTLE_SECONDS)
+
+
+class HostUnavailableError(Exception):
+    """Raised when a fetch of a busy or throttled host cannot start in time."""
+
+    def __init__(self, host: str, retry_after_seconds: float):
+        super().__init__(
+            f"Host [{host}] unavailable, retry after {retry_after_seconds:.1f}s"
+        )
+        self.host = host
+        self.retry_after_seconds = retry_after_seconds
+
+
+@dataclasses.dataclass
+class FetchSlot:
+    host: str
+    wait_seconds: float
+
+
+# times are read from Redis, so workers agree regardless of their clocks
+_ACQUIRE_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now)
+
+local not_before = tonumber(redis.call("GET", KEYS[2]) or "0")
+if not_before > now then
+    return tostring(not_before - now)
+end
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[2]) then
+    local expiry = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")[2]
+    return tostring(math.min(tonumber(expiry) - now, tonumber(ARGV[5])))
+end
+
+local lease = tonumber(ARGV[4])
+redis.call("ZADD", KEYS[1], now + lease, ARGV[1])
+redis.call("PEXPIRE", KEYS[1], math.ceil(lease * 1000))
+local interval = tonumber(ARGV[3])
+if interval > 0 then
+    local expiry_ms = math.ceil(interval * 1000)
+    redis.call("SET", KEYS[2], tostring(now + interval), "PX", expiry_ms)
+end
+return "0"
+"""
+
+# reserves the next retry of a host, an interval after the last one reserved
+_DEFER_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local retry_at = math.max(
+    tonumber(redis.call("GET", KEYS[1]) or "0"), now + tonumber(ARGV[1])
+)
+local next_retry_at = retry_at + tonumber(ARGV[2])
+local expiry_ms = math.ceil((next_retry_at - now) * 1000)
+redis.call("SET", KEYS[1], tostring(next_retry_at), "PX", expiry_ms)
+return tostring(retry_at - now)
+"""
+
+_FIRST_DEFERRAL_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local first = redis.call("GET", KEYS[1])
+if not first then
+    redis.call("SET", KEYS[1], tostring(now), "EX", ARGV[1])
+    return "0"
+end
+return tostring(now - tonumber(first))
+"""
+
+_THROTTLE_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local seconds = tonumber(ARGV[1])
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+if now + seconds > current then
+    local expiry_ms = math.ceil(seconds * 1000)
+    redis.call("SET", KEYS[1], tostring(now + seconds), "PX", expiry_ms)
+end
+"""
+
+
+class FetchScheduler:
+    def __init__(
+        self,
+        client: redis.Redis | None = None,
+        max_wait_seconds: float = _MAX_WAIT_SECONDS,
+    ):
+        self._client = client if client is not None else locks.redis_client()
+        self._acquire_script = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._defer_script = self._client.register_script(_DEFER_SCRIPT)
+        self._first_deferral_script = self._client.register_script(
+            _FIRST_DEFERRAL_SCRIPT
+        )
+        self._throttle_script = self._client.register_script(_THROTTLE_SCRIPT)
+        self.max_wait_seconds = max_wait_seconds
+
+    def try_acquire(self, host: str, token: str) -> float:
+        """Takes a slot of `host`, or returns the seconds to wait before retrying."""
+        policy = host_policy(host)
+        wait = self._acquire_script(
+            keys=[self._slots_key(host), self._not_before_key(host)],
+            args=[
+                token,
+                policy.concurrency,
+                policy.interval_seconds,
+                _LEASE_SECONDS,
+                _POLL_SECONDS,
+            ],
+        )
+        return float(wait)
+
+    def release(self, host: str, token: str):
+        self._client.zrem(self._slots_key(host), token)
+
+    def defer(self, host: str, wait_seconds: float) -> float:
+        """Reserves a retry of a fetch of `host`, returning the seconds until it.
+
+        Retries are spaced by the host's interval, so a backlog of deferred
+        fetches is spread out instead of retried together.
+        """
+        spacing = max(host_policy(host).interval_seconds, _POLL_SECONDS)
+        retry_after = self._defer_script(
+            keys=[self._retry_at_key(host)], args=[wait_seconds, spacing]
+        )
+        return float(retry_after)
+
+    def deferred_seconds(self, task_id: str, expiry_seconds: float) -> float:
+        """Returns the seconds since the task was first deferred, 0 the first time.
+
+        The time of the first deferral is kept for `expiry_seconds`.
+        """
+        seconds = self._first_deferral_script(
+            keys=[f"kms:fetch:deferred:{task_id}"], args=[math.ceil(expiry_seconds)]
+        )
+        return float(seconds)
+
+    def throttle(self, host: str, seconds: float):
+        """Pauses fetches of `host`, unless already paused for longer."""
+        if seconds > 0:
+            self._throttle_script(keys=[self._not_before_key(host)], args=[seconds])
+
+    @contextlib.contextmanager
+    def slot(self, url: str) -> Iterator[FetchSlot]:
+        """Holds a fetch slot of the host of `url`.
+
+        Raises `HostUnavailableError` if no slot is available within the
+        maximum wait, or if the fetch was throttled by the host.
+        """
+        host = fetch_host(url)
+        token = uuid.uuid4().hex
+        start = time.monotonic()
+        while (wait := self.try_acquire(host, token)) > 0:
+            remaining = self.max_wait_seconds - (time.monotonic() - start)
+            if wait > remaining:
+                raise HostUnavailableError(host, self.defer(host, wait))
+            time.sleep(wait)
+
+        try:
+            yield FetchSlot(host=host, wait_seconds=time.monotonic() - start)
+        except Exception as e:
+            seconds = throttle_seconds(e)
+            if seconds is None:
+                raise
+            print(f"Fetch of [{url}] throttled, pausing [{host}] for {seconds:.0f}s")
+            self.throttle(host, seconds)
+            raise HostUnavailableError(host, seconds) from e
+        finally:
+            self.release(host, token)
+
+    @staticmethod
+    def _slots_key(host: str) -> str:
+        return f"kms:fetch:{host}:slots"
+
+    @staticmethod
+    def _not_before_key(host: str) -> str:
+        return f"kms:fetch:{host}:not-before"
+
+    @staticmethod
+    def _retry_at_key(host: str) -> str:
+        return f"kms:fetch:{host}:retry-at"
+
+
+_DEFAULT_SCHEDULER: FetchScheduler | None = None
+_DEFAULT_SCHEDULER_LOCK = threading.Lock()
+
+
+def default_scheduler() -> FetchScheduler:
+    global _DEFAULT_SCHEDULER
+    if _DEFAULT_SCHEDULER is None:
+        with _DEFAULT_SCHEDULER_LOCK:
+            if _DEFAULT_SCHEDULER is None:
+                _DEFAULT_SCHEDULER = FetchScheduler()
+    return _DEFAULT_SCHEDULER
+
+
+if __name__ == "__main__":
+    import concurrent.futures
+
+    urls = [f"https://{host}/{i}" for host in ["a.test", "b.test"] for i in range(3)]
+    assert [fetch_host(x) for x in interleave_by_host(urls, lambda x: x)] == [
+        "a.test",
+        "b.test",
+    ] * 3
+    assert fetch_host("https://export.arxiv.org/api/query") == "arxiv.org"
+    assert _parse_host_policies("a.test=1/0.5, b.test=4") == {
+        "a.test": HostPolicy(concurrency=1, interval_seconds=0.5),
+        "b.test": HostPolicy(concurrency=4, interval_seconds=_HOST_INTERVAL_SECONDS),
+    }
+
+    # requires a running Redis, at KMS_REDIS_URL
+    _HOST_POLICIES["scheduler-test.invalid"] = HostPolicy(2, interval_seconds=0.0)
+    scheduler = FetchScheduler(max_wait_seconds=2)
+    url = f"https://scheduler-test.invalid/{uuid.uuid4().hex}"
+    active = 0
+    max_active = 0
+    active_lock = threading.Lock()
+
+    def fetch():
+        global active, max_active
+        with scheduler.slot(url):
+            with active_lock:
+                active += 1
+                max_active = max(max_active, active)
+            time.sleep(0.1)
+            with active_lock:
+                active -= 1
+
+    with concurrent.futures.ThreadPoolExecutor(6) as executor:
+        for future in [executor.submit(fetch) for _ in range(6)]:
+            future.result()
+    assert max_active == 2
+
+    scheduler.throttle("scheduler-test.invalid", 5)
+    try:
+        with scheduler.slot(url):
+            raise AssertionError("throttled host was fetched")
+    except HostUnavailableError as e:
+        assert 4 < e.retry_after_seconds <= 5
+
+    # deferred fetches are retried an interval apart, after the one above
+    first_retry = scheduler.defer("scheduler-test.invalid", 1.0)
+    second_retry = scheduler.defer("scheduler-test.invalid", 1.0)
+    assert 4 + _POLL_SECONDS < first_retry <= 5 + _POLL_SECONDS
+    assert abs(second_retry - first_retry - _POLL_SECONDS) < 0.1
+    for key in [
+        scheduler._not_before_key("scheduler-test.invalid"),
+        scheduler._retry_at_key("scheduler-test.invalid"),
+    ]:
+        scheduler._client.delete(key)
+
+    task_id = uuid.uuid4().hex
+    assert scheduler.deferred_seconds(task_id, expiry_seconds=60) == 0
+    time.sleep(0.2)
+    assert 0.1 < scheduler.deferred_seconds(task_id, expiry_seconds=60) < 1
@@ -0,0 +1,101 @@
+import asyncio
+import contextlib
+import dataclasses
+import datetime
+import os
+import time
+from typing import AsyncIterator
+
+import redis
+from redis.exceptions import LockError
+from redis.lock import Lock
+
+REDIS_URL = os.environ.get("KMS_REDIS_URL", "redis://localhost:6379/0")
+
+# bounded by the analyzer task timeout, a crashed holder releases within the hour
+_LOCK_TIMEOUT_SECONDS = 3600
+# matches the polling of redis-py's blocking acquire
+_POLL_SECONDS = 0.1
+
+_CLIENT: redis.Redis | None = None
+
+
+def redis_client() -> redis.Redis:
+    global _CLIENT
+    if _CLIENT is None:
+        # the connection pool is reset by redis-py when used after a fork
+        _CLIENT = redis.Redis.from_url(REDIS_URL)
+    return _CLIENT
+
+
+class LockTimeoutError(Exception):
+    """Raised when a lock could not be acquired before the blocking timeout."""
+
+
+@dataclasses.dataclass
+class LockAcquisition:
+    name: str
+    acquired_at: datetime.datetime
+    wait_seconds: float
+
+
+@contextlib.asynccontextmanager
+async def single_flight(
+    key: str,
+    timeout: float = _LOCK_TIMEOUT_SECONDS,
+    blocking_timeout: float = _LOCK_TIMEOUT_SECONDS,
+) -> AsyncIterator[LockAcquisition]:
+    """Serializes work on `key` across every process sharing the Redis instance.
+
+    Callers are expected to re-check for a stored result once the lock is held,
+    as a concurrent holder may have produced it while they waited.
+    """
+    name = f"kms:single-flight:{key}"
+    # acquired on a worker thread and released on the loop thread, so the token
+    # cannot be kept in thread local storage
+    lock = redis_client().lock(
+        name,
+        timeout=timeout,
+        blocking_timeout=blocking_timeout,
+        thread_local=False,
+    )
+
+    def release_abandoned(attempt: asyncio.Future):
+        if not attempt.cancelled() and attempt.exception() is None:
+            if attempt.result():
+                _release(lock, name)
+
+    # polled rather than blocking a thread, which a cancelled caller cannot stop
+    start = time.monotonic()
+    while True:
+        attempt = asyncio.ensure_future(asyncio.to_thread(lock.acquire, blocking=False))
+        try:
+            acquired = await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            # an attempt in flight may still acquire the lock
+            attempt.add_done_callback(release_abandoned)
+            raise
+
+        wait_seconds = time.monotonic() - start
+        if acquired:
+            break
+        if wait_seconds >= blocking_timeout:
+            raise LockTimeoutError(f"Lock [{name}] not acquired after {wait_seconds}s")
+        await asyncio.sleep(_POLL_SECONDS)
+
+    try:
+        yield LockAcquisition(
+            name=name,
+            acquired_at=datetime.datetime.now(),
+            wait_seconds=wait_seconds,
+        )
+    finally:
+        _release(lock, name)
+
+
+def _release(lock: Lock, name: str):
+    try:
+        lock.release()
+    except LockError as e:
+        # expired while held, another caller may already own it
+        print(f"Lock [{name}] not released: {e}")
@@ -0,0 +1,50 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+from typing import Awaitable, Callable, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# bounds concurrent blocking disk and database calls made from async code,
+# the connection pool should allow at least as many connections
+_MAX_THREADS = int(os.environ.get("KMS_IO_THREADS", 8))
+
+_EXECUTOR: concurrent.futures.ThreadPoolExecutor | None = None
+_EXECUTOR_PID: int | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _EXECUTOR, _EXECUTOR_PID
+    with _EXECUTOR_LOCK:
+        # threads do not survive a fork, a child needs its own executor
+        if _EXECUTOR is None or _EXECUTOR_PID != os.getpid():
+            _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_MAX_THREADS,
+                thread_name_prefix="kms-io",
+            )
+            _EXECUTOR_PID = os.getpid()
+        return _EXECUTOR
+
+
+async def run_blocking(
+    func: Callable[P, T], *args: P.args, **kwargs: P.kwargs
+) -> T:
+    """Runs a blocking call on the shared I/O pool, without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def to_async(func: Callable[P, T]) -> Callable[P, Awaitable[T]]:
+    """Returns an async variant of a blocking function."""
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        return await run_blocking(func, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,10 @@
+# Run from the api directory: python -m services.persist.backfill
+from doc_store import disk_store
+from services.persist import document, entities
+
+if __name__ == "__main__":
+    updated = document.backfill_loader_spec_digests()
+    print(f"Backfilled {updated} loader spec digests")
+
+    backfilled = entities.backfill_entity_relations(disk_store.default_store())
+    print(f"Backfilled entity relations of {backfilled} documents")
@@ -1,31 +1,47 @@
 import dataclasses
 import datetime
+import hashlib
 import json
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from psycopg2.errors import UniqueViolation  # type: ignore
 
-from services.persist.utils import get_connection
+from services.offload import to_async
+from services.persist.pool import connection
+from services.persist.utils import encode_cursor, decode_cursor
 
 
-def has_loader_spec_registered(loader_spec: dict) -> bool:
-    with get_connection() as conn:
+def loader_spec_digest(loader_spec: dict) -> str:
+    """Returns a digest of the spec which is independent of key order."""
+    canonical_spec = json.dumps(
+        loader_spec,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical_spec.encode()).hexdigest()
+
+
+def get_loader_spec_hash(loader_spec: dict) -> str | None:
+    """Returns the hash of the document registered for the spec, if any."""
+    with connection() as conn:
         with conn.cursor() as curs:
-            query = "SELECT 1 from kms.document_paths where "
-            spec_components = [
-                f"loader_spec->>'{key}'=%s" for key in loader_spec.keys()
-            ]
-            spec_components_query = " and ".join(spec_components)
-            query += spec_components_query
             curs.execute(
-                query,
-                tuple(loader_spec.values()),
+                "SELECT hash from kms.document_paths where loader_spec_digest = %s",
+                (loader_spec_digest(loader_spec),),
             )
+            row = curs.fetchone()
+            if row is not None:
+                return str(row[0]).strip()
 
-            return curs.fetchone() is not None
+            return None
+
+
+def has_loader_spec_registered(loader_spec: dict) -> bool:
+    return get_loader_spec_hash(loader_spec) is not None
 
 
 def get_hash_url(hash: str) -> str:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute("SELECT url from kms.document_paths where hash = %s", (hash,))
             row = curs.fetchone()
@@ -38,17 +54,19 @@ def get_hash_url(hash: str) -> str:
 def register_document(
     hash: str, url: str, loader_spec: dict[str, str], handle_exists: bool
 ):
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             try:
                 curs.execute(
-                    "INSERT INTO kms.document_paths (hash, url, loader_spec, metadata) "
-                    "VALUES (%s, %s, %s, %s)",
+                    "INSERT INTO kms.document_paths "
+                    "(hash, url, loader_spec, loader_spec_digest, metadata) "
+                    "VALUES (%s, %s, %s, %s, %s)",
                     (
                         (
                             hash,
                             url,
                             loader_spec,
+                            loader_spec_digest(loader_spec),
                             {
                                 "annotations": [],
                             },
@@ -60,8 +78,135 @@ def register_document(
                     raise
 
 
+@dataclasses.dataclass
+class DocumentRegistration:
+    hash: str
+    url: str
+    loader_spec: dict[str, str]
+
+    @property
+    def loader_spec_digest(self) -> str:
+        return loader_spec_digest(self.loader_spec)
+
+
+def get_registered_documents(
+    registrations: list[DocumentRegistration],
+) -> dict[str, str]:
+    """Returns a mapping of requested hash to the hash already registered for it.
+
+    A registration matches an existing document by hash, or by an identical
+    loader spec registered under a different URL.
+    """
+    if not registrations:
+        return {}
+
+    with connection() as conn:
+        with conn.cursor() as curs:
+            curs.execute(
+                "SELECT hash, loader_spec_digest from kms.document_paths "
+                "where hash in %s or loader_spec_digest in %s",
+                (
+                    tuple(x.hash for x in registrations),
+                    tuple(x.loader_spec_digest for x in registrations),
+                ),
+            )
+            rows = curs.fetchall()
+
+    registered_hashes = {str(hash).strip() for hash, _ in rows}
+    registered_digests = {
+        str(digest).strip(): str(hash).strip()
+        for hash, digest in rows
+        if digest is not None
+    }
+
+    registered = {}
+    for registration in registrations:
+        if registration.hash in registered_hashes:
+            registered[registration.hash] = registration.hash
+        elif registration.loader_spec_digest in registered_digests:
+            registered[registration.hash] = registered_digests[
+                registration.loader_spec_digest
+            ]
+
+    return registered
+
+
+def register_documents(registrations: list[DocumentRegistration]) -> set[str]:
+    """Inserts all registrations in one statement, returning the inserted hashes."""
+    if not registrations:
+        return set()
+
+    with connection() as conn:
+        with conn.cursor() as curs:
+            rows = execute_values(
+                curs,
+                "INSERT INTO kms.document_paths "
+                "(hash, url, loader_spec, loader_spec_digest, metadata) "
+                "VALUES %s ON CONFLICT DO NOTHING RETURNING hash",
+                [
+                    (
+                        x.hash,
+                        x.url,
+                        x.loader_spec,
+                        x.loader_spec_digest,
+                        {
+                            "annotations": [],
+                        },
+                    )
+                    for x in registrations
+                ],
+                fetch=True,
+            )
+            return {str(row[0]).strip() for row in rows}
+
+
+def backfill_loader_spec_digests(batch_size: int = 1000) -> int:
+    """Populates missing digests, returning the number of rows updated.
+
+    When several documents share a spec, only the first by hash receives the
+    digest so the unique index holds; the others remain addressable by hash.
+    """
+    updated = 0
+    last_hash = ""
+    while True:
+        with connection() as conn:
+            with conn.cursor() as curs:
+                curs.execute(
+                    "SELECT hash, loader_spec from kms.document_paths "
+                    "where loader_spec_digest is null and hash > %s "
+                    "order by hash limit %s",
+                    (last_hash, batch_size),
+                )
+                rows = curs.fetchall()
+                if not rows:
+                    return updated
+                last_hash = rows[-1][0]
+
+                digests: dict[str, str] = {}
+                for hash, loader_spec in rows:
+                    digests.setdefault(loader_spec_digest(loader_spec), hash)
+
+                curs.execute(
+                    "SELECT loader_spec_digest from kms.document_paths "
+                    "where loader_spec_digest in %s",
+                    (tuple(digests.keys()),),
+                )
+                for (digest,) in curs.fetchall():
+                    digests.pop(digest, None)
+
+                if digests:
+                    execute_values(
+                        curs,
+                        "UPDATE kms.document_paths as t "
+                        "SET loader_spec_digest = v.digest "
+                        "FROM (VALUES %s) as v (hash, digest) where t.hash = v.hash",
+                        [(hash, digest) for digest, hash in digests.items()],
+                    )
+                    updated += len(digests)
+
+
 def get_document_annotations(hash: str) -> list[str]:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute(
                 "SELECT metadata->>'annotations' from kms.document_paths where hash = %s",
@@ -71,7 +216,7 @@ def get_document_annotations(hash: str) -> list[str]:
 
 
 def add_document_annotation(hash: str, annotation: str) -> None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             formatted_annotation = json.JSONEncoder().encode(annotation).strip('"')
             try:
@@ -91,7 +236,7 @@ def add_document_annotation(hash: str, annotation: str) -> None:
 
 
 def remove_document_annotation(hash: str, annotation: str) -> None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             formatted_annotation = json.JSONEncoder().encode(annotation).strip('"')
             curs.execute(
@@ -116,15 +261,40 @@ class DocumentProcessingResult:
         self.hash = self.hash.strip()
         self.url = self.url.strip()
 
+    @property
+    def cursor(self) -> str:
+        return encode_cursor(self.last_updated.isoformat(), self.hash)
+
 
-def get_loaded_documents() -> list[DocumentProcessingResult]:
-    with get_connection() as conn:
+def get_loaded_documents(
+    limit: int,
+    cursor: str | None = None,
+) -> list[DocumentProcessingResult]:
+    """Returns up to `limit` documents, most recently updated first.
+
+    Pages are keyed on (last_updated, hash), so each page is a single range scan
+    over `document_paths_last_updated_idx` regardless of library size.
+    """
+    query = (
+        "SELECT t.hash, t.url, t.last_updated, s.hash is not null as has_summary "
+        "from kms.document_paths as t "
+        "left join genai.summaries as s on s.hash=t.hash "
+    )
+    params: tuple = ()
+    if cursor is not None:
+        last_updated, hash = decode_cursor(cursor)
+        query += "where (t.last_updated, t.hash) < (%s, %s) "
+        params += (datetime.datetime.fromisoformat(last_updated), hash)
+    query += "order by t.last_updated desc, t.hash desc limit %s"
+    params += (limit,)
+
+    with connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as curs:
-            curs.execute(
-                "SELECT t.hash, t.url, "
-                "EXISTS(select 1 from genai.summaries where hash=t.hash) as has_summary, "
-                "(select updated_at from genai.process_tasks "
-                "where hash=t.hash order by updated_at desc limit 1) as last_updated "
-                "from kms.document_paths as t",
-            )
-            return [DocumentProcessingResult(**row) for row in curs]
+            curs.execute(query, params)
+            return [DocumentProcessingResult(**x) for x in curs.fetchall()]
+
+
+get_hash_url_async = to_async(get_hash_url)
+get_document_annotations_async = to_async(get_document_annotations)
+add_document_annotation_async = to_async(add_document_annotation)
+remove_document_annotation_async = to_async(remove_document_annotation)
@@ -0,0 +1,162 @@
+import csv
+import dataclasses
+import io
+import re
+import unicodedata
+from typing import Iterable
+
+from psycopg2.extras import RealDictCursor
+
+from analyzers.extraction import EntityRelationSchema
+from services.offload import to_async
+from services.persist.pool import connection
+
+_WHITESPACE_REGEX = re.compile(r"\s+")
+# quotes and trailing punctuation the extraction model wraps names in
+_SURROUNDING_PUNCTUATION = "\"'`.,;:!?()[]{}"
+
+
+def normalize_entity_key(name: str) -> str:
+    """Folds the spellings of a name the extractor produces onto a single key."""
+    key = unicodedata.normalize("NFKC", name).casefold()
+    key = _WHITESPACE_REGEX.sub(" ", key)
+    return key.strip().strip(_SURROUNDING_PUNCTUATION).strip()
+
+
+@dataclasses.dataclass
+class EntityNeighbor:
+    key: str
+    name: str
+    # "outgoing" when the queried entity is the origin of the relationships
+    direction: str
+    relationships: list[str]
+    document_count: int
+
+
+@dataclasses.dataclass
+class EntityDocument:
+    hash: str
+    name: str | None
+    url: str | None
+    relation_count: int
+
+
+def save_entity_relations(hash: str, relations: Iterable[EntityRelationSchema]):
+    """Replaces the relations stored for `hash`, loading the rows with COPY."""
+    buffer = io.StringIO()
+    # quoting every field keeps empty strings distinct from NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for relation in relations:
+        writer.writerow(
+            (
+                hash,
+                relation.entity,
+                relation.relationship,
+                relation.target,
+                normalize_entity_key(relation.entity),
+                normalize_entity_key(relation.target),
+            )
+        )
+    buffer.seek(0)
+
+    with connection() as conn:
+        with conn.cursor() as curs:
+            curs.execute("DELETE FROM genai.entity_relations where hash = %s", (hash,))
+            curs.copy_expert(
+                "COPY genai.entity_relations "
+                "(hash, entity, relationship, target, entity_key, target_key) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+
+
+def get_entity_neighbors(entity: str, limit: int) -> list[EntityNeighbor]:
+    """Returns the entities directly related to `entity` in any document."""
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as curs:
+            curs.execute(
+                "SELECT key, min(name) as name, direction, "
+                "array_agg(DISTINCT relationship) as relationships, "
+                "count(DISTINCT hash) as document_count FROM ("
+                "SELECT target_key as key, target as name, 'outgoing' as direction, "
+                "relationship, hash from genai.entity_relations "
+                "where entity_key = %(key)s "
+                "UNION ALL "
+                "SELECT entity_key, entity, 'incoming', relationship, hash "
+                "from genai.entity_relations where target_key = %(key)s"
+                ") as r group by key, direction "
+                "order by document_count desc, key, direction limit %(limit)s",
+                {"key": normalize_entity_key(entity), "limit": limit},
+            )
+            return [EntityNeighbor(**row) for row in curs]
+
+
+def get_entity_documents(entities: list[str], limit: int) -> list[EntityDocument]:
+    """Returns the documents with relations naming every one of `entities`."""
+    keys = list({normalize_entity_key(x) for x in entities})
+    if not keys:
+        return []
+
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as curs:
+            curs.execute(
+                "SELECT m.hash, p.name, p.url, count(*) as relation_count FROM ("
+                "SELECT hash, entity_key as key from genai.entity_relations "
+                "where entity_key = ANY(%(keys)s) "
+                "UNION ALL "
+                "SELECT hash, target_key from genai.entity_relations "
+                "where target_key = ANY(%(keys)s)"
+                ") as m LEFT JOIN kms.document_paths as p on p.hash = m.hash "
+                "group by m.hash, p.name, p.url "
+                "having count(DISTINCT m.key) = %(key_count)s "
+                "order by relation_count desc, m.hash limit %(limit)s",
+                {"keys": keys, "key_count": len(keys), "limit": limit},
+            )
+            return [
+                EntityDocument(
+                    hash=str(row["hash"]).strip(),
+                    name=row["name"],
+                    url=row["url"],
+                    relation_count=row["relation_count"],
+                )
+                for row in curs
+            ]
+
+
+def backfill_entity_relations(store, batch_size: int = 1000) -> int:
+    """Copies relations found in `store` for documents without any rows.
+
+    Returns the number of documents backfilled.
+    """
+    backfilled = 0
+    last_hash = ""
+    while True:
+        with connection() as conn:
+            with conn.cursor() as curs:
+                curs.execute(
+                    "SELECT p.hash from kms.document_paths as p "
+                    "where p.hash > %s and not exists ("
+                    "SELECT 1 from genai.entity_relations as r where r.hash = p.hash"
+                    ") order by p.hash limit %s",
+                    (last_hash, batch_size),
+                )
+                hashes = [str(row[0]).strip() for row in curs.fetchall()]
+        if not hashes:
+            return backfilled
+        last_hash = hashes[-1]
+
+        for hash in hashes:
+            if store.has_entity_relations(hash):
+                save_entity_relations(hash, store.load_entity_relations(hash))
+                backfilled += 1
+
+
+get_entity_neighbors_async = to_async(get_entity_neighbors)
+get_entity_documents_async = to_async(get_entity_documents)
+
+
+if __name__ == "__main__":
+    assert normalize_entity_key("  Walt\tDisney ") == "walt disney"
+    assert normalize_entity_key('"Walt Disney."') == "walt disney"
+    assert normalize_entity_key("ＤＩＳＮＥＹ") == "disney"
+    assert normalize_entity_key("Straße") == normalize_entity_key("STRASSE")
@@ -1,7 +1,8 @@
 import dataclasses
 import datetime
+from psycopg2.extras import RealDictCursor
 
-from services.persist.utils import get_connection
+from services.persist.pool import connection
 
 
 @dataclasses.dataclass
@@ -9,20 +10,75 @@ class TaskMetric:
     result: str
     duration_seconds: float
     started_at: datetime.datetime
+    priority: int | None = None
+    queue_wait_seconds: float | None = None
 
 
 def report_task_metrics(task_id: str, metrics: TaskMetric):
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute(
-                "INSERT INTO genai_ops.process_task_metrics (task_id, result, started_at, duration) "
-                "VALUES (%s, %s, %s, %s)",
+                "INSERT INTO genai_ops.process_task_metrics "
+                "(task_id, result, started_at, duration, priority, queue_wait) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
                 (
                     (
                         task_id,
                         metrics.result,
                         metrics.started_at,
                         metrics.duration_seconds,
+                        metrics.priority,
+                        metrics.queue_wait_seconds,
                     )
                 ),
             )
+
+
+@dataclasses.dataclass
+class QueueWaitSummary:
+    priority: int | None
+    task_count: int
+    p50_seconds: float
+    p95_seconds: float
+    max_seconds: float
+
+
+def get_queue_wait_summary(since: datetime.datetime) -> list[QueueWaitSummary]:
+    """Returns queue wait percentiles per priority, for tasks started since `since`."""
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as curs:
+            curs.execute(
+                "SELECT priority, count(*) as task_count, "
+                "percentile_cont(0.5) within group (order by queue_wait) as p50_seconds, "
+                "percentile_cont(0.95) within group (order by queue_wait) as p95_seconds, "
+                "max(queue_wait) as max_seconds "
+                "from genai_ops.process_task_metrics "
+                "where started_at >= %s and queue_wait is not null "
+                "group by priority order by priority",
+                (since,),
+            )
+            return [QueueWaitSummary(**row) for row in curs]
+
+
+@dataclasses.dataclass
+class LockMetric:
+    lock_name: str
+    acquired_at: datetime.datetime
+    wait_seconds: float
+    performed_work: bool
+
+
+def report_lock_metrics(metrics: LockMetric):
+    with connection() as conn:
+        with conn.cursor() as curs:
+            curs.execute(
+                "INSERT INTO genai_ops.lock_metrics "
+                "(lock_name, acquired_at, wait_duration, performed_work) "
+                "VALUES (%s, %s, %s, %s)",
+                (
+                    metrics.lock_name,
+                    metrics.acquired_at,
+                    metrics.wait_seconds,
+                    metrics.performed_work,
+                ),
+            )
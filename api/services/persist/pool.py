@@ -0,0 +1,242 @@
+import contextlib
+import dataclasses
+import os
+import threading
+import time
+from typing import Iterator
+
+from psycopg2.extensions import connection as Connection
+
+from services.persist.utils import get_connection
+
+_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN", 1))
+_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX", 8))
+_POOL_CHECKOUT_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+def _close_inherited(conn: Connection):
+    """Closes a connection inherited through a fork, leaving its session open.
+
+    Closing sends a Terminate message over the socket shared with the parent, so
+    this process's copy of the socket is first replaced with /dev/null. Left
+    open, the copy would keep the parent's session alive after the parent exits.
+    """
+    if conn.closed:
+        return
+    devnull = os.open(os.devnull, os.O_RDWR)
+    try:
+        os.dup2(devnull, conn.fileno())
+    finally:
+        os.close(devnull)
+    conn.close()
+
+
+@dataclasses.dataclass
+class PoolStats:
+    min_size: int
+    max_size: int
+    # connections currently open, idle or checked out
+    size: int = 0
+    idle: int = 0
+    checkouts: int = 0
+    # checkouts which had to wait for a connection to be returned
+    waits: int = 0
+    wait_seconds: float = 0.0
+    timeouts: int = 0
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections, owned by a single process.
+
+    Connections are never shared across a fork: a child process observing a
+    pool created by its parent closes the inherited connections without
+    terminating the parent's sessions.
+    """
+
+    def __init__(
+        self,
+        min_size: int = _POOL_MIN_SIZE,
+        max_size: int = _POOL_MAX_SIZE,
+        timeout: float = _POOL_CHECKOUT_TIMEOUT,
+        **connect_kwargs,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds [{min_size}, {max_size}]")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle: list[Connection] = []
+        self._size = 0
+        self._stats = PoolStats(min_size=self.min_size, max_size=self.max_size)
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            for conn in self._idle:
+                _close_inherited(conn)
+            self._reset()
+
+    def _connect(self) -> Connection:
+        return get_connection(**self._connect_kwargs)
+
+    def getconn(self) -> Connection:
+        self._check_pid()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        wait_start = time.monotonic()
+        with self._available:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if not conn.closed:
+                        self._record_checkout(waited, wait_start)
+                        return conn
+                    self._size -= 1
+
+                if self._size < self.max_size:
+                    # reserve the slot, connect outside of the lock
+                    self._size += 1
+                    self._record_checkout(waited, wait_start)
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats.timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No connection available after {self.timeout}s"
+                    )
+                waited = True
+                self._available.wait(remaining)
+
+        try:
+            return self._connect()
+        except BaseException:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+    def putconn(self, conn: Connection, close: bool = False):
+        if self._pid != os.getpid():
+            # connection belongs to a pool from the parent process
+            _close_inherited(conn)
+            return
+
+        with self._available:
+            if close or conn.closed or len(self._idle) >= self.max_size:
+                if not conn.closed:
+                    conn.close()
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._available.notify()
+
+    def closeall(self):
+        self._check_pid()
+        with self._available:
+            for conn in self._idle:
+                conn.close()
+            self._size -= len(self._idle)
+            self._idle.clear()
+
+    def warm(self):
+        """Opens connections until the pool holds at least `min_size`."""
+        self._check_pid()
+        conns = [self.getconn() for _ in range(max(self.min_size - self._size, 0))]
+        for conn in conns:
+            self.putconn(conn)
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Checks out a connection for the duration of one transaction.
+
+        The transaction is committed on a clean exit and rolled back otherwise,
+        matching the semantics of `with psycopg2.connect() as conn`.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            with conn:
+                yield conn
+        except BaseException:
+            discard = bool(conn.closed)
+            raise
+        finally:
+            self.putconn(conn, close=discard)
+
+    def stats(self) -> PoolStats:
+        self._check_pid()
+        with self._lock:
+            return dataclasses.replace(
+                self._stats,
+                size=self._size,
+                idle=len(self._idle),
+            )
+
+    def _record_checkout(self, waited: bool, wait_start: float):
+        self._stats.checkouts += 1
+        if waited:
+            self._stats.waits += 1
+            self._stats.wait_seconds += time.monotonic() - wait_start
+
+
+_DEFAULT_POOL: ConnectionPool | None = None
+_DEFAULT_POOL_LOCK = threading.Lock()
+
+
+def default_pool() -> ConnectionPool:
+    global _DEFAULT_POOL
+    if _DEFAULT_POOL is None:
+        with _DEFAULT_POOL_LOCK:
+            if _DEFAULT_POOL is None:
+                _DEFAULT_POOL = ConnectionPool()
+    return _DEFAULT_POOL
+
+
+def connection():
+    return default_pool().connection()
+
+
+def get_pool_stats() -> PoolStats:
+    return default_pool().stats()
+
+
+if __name__ == "__main__":
+    # requires a running Postgres, configured as by services.persist.utils
+    pool = ConnectionPool(min_size=1, max_size=2)
+    pool.warm()
+    assert pool.stats().idle == 1
+
+    def backend_pid() -> int:
+        with pool.connection() as conn:
+            with conn.cursor() as curs:
+                curs.execute("select pg_backend_pid()")
+                return curs.fetchone()[0]  # type: ignore
+
+    parent_backend_pid = backend_pid()
+    inherited_conn = pool._idle[-1]
+
+    # a forked child opens its own session, and closing the inherited connection
+    # leaves the parent's session open
+    child_pid = os.fork()
+    if child_pid == 0:
+        isolated = False
+        try:
+            isolated = backend_pid() != parent_backend_pid and inherited_conn.closed
+        finally:
+            os._exit(0 if isolated else 1)
+    _, status = os.waitpid(child_pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert backend_pid() == parent_backend_pid
+    print(pool.stats())
@@ -1,8 +1,9 @@
-from services.persist.utils import get_connection
+from services.offload import to_async
+from services.persist.pool import connection
 
 
 def get_summary(hash: str) -> str | None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute("SELECT summary from genai.summaries where hash = %s", (hash,))
             row = curs.fetchone()
@@ -17,7 +18,7 @@ def has_summary(hash: str) -> bool:
 
 
 def save_summary(hash: str, summary: str):
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             # upsert summary
             curs.execute(
@@ -25,3 +26,7 @@ def save_summary(hash: str, summary: str):
                 "ON CONFLICT(hash) DO UPDATE SET summary = EXCLUDED.summary",
                 ((hash, summary)),
             )
+
+
+get_summary_async = to_async(get_summary)
+has_summary_async = to_async(has_summary)
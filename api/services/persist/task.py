@@ -4,11 +4,12 @@ import enum
 from psycopg2.extras import RealDictCursor
 from types import TracebackType
 
-from services.persist.utils import get_connection
+from services.persist.pool import connection
+from services.persist.utils import encode_cursor, decode_cursor
 
 
 def create_processing_action(hash: str, parent_task_id: str, task_name: str):
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             # allow re-assignments for re-processing
             curs.execute(
@@ -19,7 +20,7 @@ def create_processing_action(hash: str, parent_task_id: str, task_name: str):
 
 
 def get_task_result(id: str) -> str | None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute(
                 "SELECT result from genai_ops.process_task_metrics where task_id = %s",
@@ -43,7 +44,7 @@ class TaskRequest:
 
 
 def get_task_request(task_id: str) -> TaskRequest | None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as curs:
             curs.execute(
                 "SELECT t.hash, t.task_name "
@@ -58,7 +59,7 @@ def get_task_request(task_id: str) -> TaskRequest | None:
 
 
 def set_retry_child(original_task_id: str, retry_task_id: str) -> None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute(
                 "UPDATE genai.process_tasks SET retry_task_id=%s where task_id=%s",
@@ -95,22 +96,69 @@ class ProcessingRegistration:
         if self.status_reason:
             self.status_reason = self.status_reason.strip()
 
+    @property
+    def cursor(self) -> str:
+        return encode_cursor(self.updated_at.isoformat(), self.hash, self.task_name)
 
-def get_processing_registrations() -> list[ProcessingRegistration]:
-    with get_connection() as conn:
+
+@dataclasses.dataclass
+class ProcessingRegistrationFilter:
+    # empty matches all statuses
+    statuses: list[str] = dataclasses.field(default_factory=list)
+    # empty matches all task names
+    task_names: list[str] = dataclasses.field(default_factory=list)
+    include_retried: bool = False
+    updated_after: datetime.datetime | None = None
+    updated_before: datetime.datetime | None = None
+
+
+def get_processing_registrations(
+    registration_filter: ProcessingRegistrationFilter,
+    limit: int,
+    cursor: str | None = None,
+) -> list[ProcessingRegistration]:
+    """Returns up to `limit` matching registrations, most recently updated first."""
+    conditions = []
+    params: tuple = ()
+    if registration_filter.statuses:
+        conditions.append("t.status in %s")
+        params += (tuple(registration_filter.statuses),)
+    if registration_filter.task_names:
+        conditions.append("t.task_name in %s")
+        params += (tuple(registration_filter.task_names),)
+    if not registration_filter.include_retried:
+        conditions.append("t.retry_task_id is null")
+    if registration_filter.updated_after is not None:
+        conditions.append("t.updated_at >= %s")
+        params += (registration_filter.updated_after,)
+    if registration_filter.updated_before is not None:
+        conditions.append("t.updated_at < %s")
+        params += (registration_filter.updated_before,)
+    if cursor is not None:
+        updated_at, hash, task_name = decode_cursor(cursor)
+        conditions.append("(t.updated_at, t.hash, t.task_name) < (%s, %s, %s)")
+        params += (datetime.datetime.fromisoformat(updated_at), hash, task_name)
+
+    query = (
+        "SELECT t.hash, t.status_reason, t.updated_at, t.retry_task_id, t.task_id, "
+        "t.status, t.task_name, d.url, s.hash is not null as has_summary "
+        "from genai.process_tasks as t "
+        "left join kms.document_paths as d on d.hash=t.hash "
+        "left join genai.summaries as s on s.hash=t.hash "
+    )
+    if conditions:
+        query += "where " + " and ".join(conditions) + " "
+    query += "order by t.updated_at desc, t.hash desc, t.task_name desc limit %s"
+    params += (limit,)
+
+    with connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as curs:
-            curs.execute(
-                "SELECT t.hash, t.status_reason, t.updated_at, t.retry_task_id, t.task_id, "
-                "t.status, t.task_name, "
-                "EXISTS(select 1 from genai.summaries where hash=t.hash) as has_summary, "
-                "(select url from kms.document_paths where hash=t.hash) as url "
-                "from genai.process_tasks as t",
-            )
+            curs.execute(query, params)
             return [ProcessingRegistration(**row) for row in curs]
 
 
 def get_processing_registration(hash: str) -> ProcessingRegistration | None:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as curs:
             curs.execute(
                 "SELECT url, task_id, status, task_name from genai.process_tasks where hash = %s",
@@ -129,6 +177,7 @@ class ProcessTaskStatus(enum.Enum):
     COMPLETE = 2
     TIMEOUT = 3
     CANCELLED = 4
+    DEFERRED = 5
 
     def __str__(self):
         match self:
@@ -142,6 +191,8 @@ class ProcessTaskStatus(enum.Enum):
                 return "TIMEOUT"
             case ProcessTaskStatus.CANCELLED:
                 return "CANCELLED"
+            case ProcessTaskStatus.DEFERRED:
+                return "DEFERRED"
 
         raise ValueError(f"Unknown Process Status {self}")
 
@@ -152,6 +203,7 @@ _DEFAULT_MESSAGES = {
     ProcessTaskStatus.COMPLETE: "Task processing successful.",
     ProcessTaskStatus.TIMEOUT: "Task did not complete in a timely manner.",
     ProcessTaskStatus.CANCELLED: "Task cancellation requested.",
+    ProcessTaskStatus.DEFERRED: "Task deferred until the document host is available.",
 }
 
 
@@ -183,7 +235,7 @@ class ProcessTaskUpdater:
         if task_result.message is not None:
             column_updaters.append("status_reason=%s")
             column_values.append(task_result.friendly_message())
-        with get_connection() as conn:
+        with connection() as conn:
             with conn.cursor() as curs:
                 print(f"setting status {task_result.status}")
                 curs.execute(
@@ -210,8 +262,30 @@ class ProcessTaskUpdater:
         return True
 
 
+def fail_pending_actions(
+    hash: str, parent_task_id: str, task_names: list[str], message: str
+) -> None:
+    """Marks the actions registered by `parent_task_id` which will not be started."""
+    if not task_names:
+        return
+
+    with connection() as conn:
+        with conn.cursor() as curs:
+            curs.execute(
+                "UPDATE genai.process_tasks SET status=%s, status_reason=%s "
+                "WHERE hash=%s AND parent_id=%s AND task_name in %s",
+                (
+                    str(ProcessTaskStatus.FAILED),
+                    message,
+                    hash,
+                    parent_task_id,
+                    tuple(task_names),
+                ),
+            )
+
+
 def assign_processing_action(hash: str, task_name: str, task_id: str):
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as curs:
             curs.execute(
                 "UPDATE genai.process_tasks SET task_id=%s, status='STARTED' WHERE hash=%s AND task_name=%s",
@@ -1,3 +1,5 @@
+import base64
+import json
 import os
 import psycopg2
 from psycopg2.extras import Json
@@ -40,3 +42,20 @@ def get_connection(**kwargs):
         port=kwargs.pop("port", _POSTGRES_PORT),
         **kwargs,
     )
+
+
+def encode_cursor(*values: str) -> str:
+    """Encodes keyset pagination values into an opaque, URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list[str]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError(f"Invalid cursor [{cursor}]")
+
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor [{cursor}]")
+
+    return [str(x) for x in values]
@@ -1,7 +1,26 @@
+import time
 from flask import Flask
 from celery import Celery, Task
+from celery.signals import before_task_publish
 from flask_cors import CORS
 
+from services.locks import REDIS_URL
+import constants
+
+_TASK_ROUTES = {
+    "flask_celery.process_content": {"queue": constants.PARSE_QUEUE},
+    "flask_celery.prefetch_arxiv_papers": {"queue": constants.FETCH_QUEUE},
+    "analyzers.tasks.fetch_content": {"queue": constants.FETCH_QUEUE},
+    "analyzers.tasks.summarize_content": {"queue": constants.INFERENCE_QUEUE},
+    "analyzers.tasks.extract_entity_relations": {"queue": constants.INFERENCE_QUEUE},
+}
+
+
+@before_task_publish.connect
+def _stamp_published_at(headers: dict, **kwargs):
+    # read back by workers to measure time spent queued
+    headers.setdefault("kms_published_at", time.time())
+
 
 def celery_init_app(app: Flask) -> Celery:
     class FlaskTask(Task):
@@ -21,10 +40,24 @@ def create_app() -> Flask:
     CORS(app)
     app.config.from_mapping(
         CELERY=dict(
-            broker_url="redis://localhost:6379/0",
+            broker_url=REDIS_URL,
             # relevant results are captured in long-term storage
-            result_backend="redis://localhost:6379/0",
+            result_backend=REDIS_URL,
             task_ignore_result=True,
+            task_routes=_TASK_ROUTES,
+            # a task is only removed from the queue once complete, so a worker
+            # never holds more than its prefetch allowance of queued work
+            task_acks_late=True,
+            # requests made from the extension preempt queued bulk ingestion
+            task_default_priority=constants.BULK_PRIORITY,
+            broker_transport_options=dict(
+                priority_steps=constants.PRIORITY_STEPS,
+                sep=":",
+                queue_order_strategy="priority",
+                # unacknowledged tasks are redelivered after this, so it must
+                # outlast a task reserved behind a running one, plus its own run
+                visibility_timeout=3 * constants.TASK_TIMEOUT_SECONDS,
+            ),
         ),
     )
     app.config.from_prefixed_env() # type: ignore
@@ -24,9 +24,12 @@ export const getDocumentEntities = async (documentHash: string) => {
   return graphData;
 };
 
-export const getTaskProcessingResults = async (): Promise<kms.TaskProcessingResult[]> => {
+export const getTaskProcessingResults = async (
+  cursor?: string | null
+): Promise<kms.TaskProcessingResultsPage> => {
   const apiHost = await getApiHost();
-  const apiResponse = await fetch(`${apiHost}/process`, {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const apiResponse = await fetch(`${apiHost}/process${query}`, {
     method: "GET",
     headers: {
       "Content-Type": "application/json",
@@ -36,9 +39,12 @@ export const getTaskProcessingResults = async (): Promise<kms.TaskProcessingResu
   return apiResponseBody;
 };
 
-export const getProcessingQueue = async (): Promise<kms.TaskQueueRecord[]> => {
+export const getProcessingQueue = async (
+  cursor?: string | null
+): Promise<kms.TaskQueuePage> => {
   const apiHost = await getApiHost();
-  const apiResponse = await fetch(`${apiHost}/tasks?type=pending&type=failed`, {
+  const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+  const apiResponse = await fetch(`${apiHost}/tasks?type=pending&type=failed${query}`, {
     method: "GET",
     headers: {
       "Content-Type": "application/json",
@@ -95,6 +101,24 @@ export const registerDocument = async ({ url, title }: kms.CreateDocumentRequest
   return resultResponseBody["hash"];
 };
 
+export const registerDocuments = async (
+  documents: kms.CreateDocumentRequest[]
+): Promise<kms.BatchRegistrationResult[]> => {
+  const apiHost = await getApiHost();
+  const registerResultResponse = await fetch(`${apiHost}/process/batch`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      documents: documents.map(({ url, title }) => ({ url, title })),
+    }),
+  });
+
+  const resultResponseBody = await registerResultResponse.json();
+  return resultResponseBody;
+};
+
 export const addDocumentAnnotation = async ({ hash, annotation }: kms.DocumentReference) => {
   const apiHost = await getApiHost();
   const addAnnotationResponse = await fetch(
@@ -1,22 +1,53 @@
 import { addSafeEventListener, safeQuerySelector } from "./utilities";
 import { getProcessingQueue, getTaskProcessingResults } from "./api";
 import {
+  GridApi,
   GridOptions,
   IRowNode,
   RowClickedEvent,
   createGrid,
 } from "ag-grid-community";
 
+type RowPage<T> = {
+  rows: T[];
+  next_cursor: string | null;
+};
+
+// Appends the pages following a cursor to the grid, without blocking its render.
+// Each load stops the previous one, whose rows would duplicate those of a reset grid.
+const createPageLoader = <T>(
+  grid: GridApi<T>,
+  getPage: (cursor: string) => Promise<RowPage<T>>
+) => {
+  let generation = 0;
+  return (cursor: string | null) => {
+    const loadGeneration = ++generation;
+    const loadPages = async () => {
+      while (cursor) {
+        const page = await getPage(cursor);
+        if (loadGeneration !== generation) {
+          return;
+        }
+        grid.applyTransaction({ add: page.rows });
+        cursor = page.next_cursor;
+      }
+    };
+    loadPages().catch((error) => {
+      console.error("Failed to load remaining rows", error);
+    });
+  };
+};
+
 type ResultsTableEvents = {
   onRowClicked: (rowData: kms.TaskProcessingResult) => void;
 };
 
 export const createResultsTable = async (events: ResultsTableEvents) => {
   const resultsTable = safeQuerySelector<HTMLElement>(".results-table");
-  const resultsTableData = await getTaskProcessingResults();
+  const firstPage = await getTaskProcessingResults();
 
   const gridOptions: GridOptions = {
-    rowData: resultsTableData,
+    rowData: firstPage.documents,
     autoSizeStrategy: {
       type: "fitGridWidth",
     },
@@ -40,6 +71,12 @@ export const createResultsTable = async (events: ResultsTableEvents) => {
     }
   );
 
+  const loadRemainingPages = createPageLoader(resultsGrid, async (cursor) => {
+    const page = await getTaskProcessingResults(cursor);
+    return { rows: page.documents, next_cursor: page.next_cursor };
+  });
+  loadRemainingPages(firstPage.next_cursor);
+
   return resultsGrid;
 };
 
@@ -51,7 +88,7 @@ export const createTasksTable = async ({
   onProcessRequest,
 }: CreateTasksTableRequest) => {
   const tasksTable = safeQuerySelector<HTMLElement>(".tasks-table");
-  const pendingTasksData = await getProcessingQueue();
+  const firstPage = await getProcessingQueue();
 
   const canSelectRow = (rowData: IRowNode<kms.TaskQueueRecord>): boolean => {
     const retriableStates = ["FAILED", "TIMEOUT"];
@@ -59,7 +96,7 @@ export const createTasksTable = async ({
   };
 
   const gridOptions: GridOptions<kms.TaskQueueRecord> = {
-    rowData: pendingTasksData,
+    rowData: firstPage.tasks,
     autoSizeStrategy: {
       type: "fitGridWidth",
     },
@@ -82,6 +119,12 @@ export const createTasksTable = async ({
     isRowSelectable: canSelectRow,
   };
   const tasksGrid = createGrid<kms.TaskQueueRecord>(tasksTable, gridOptions);
+
+  const loadRemainingPages = createPageLoader(tasksGrid, async (cursor) => {
+    const page = await getProcessingQueue(cursor);
+    return { rows: page.tasks, next_cursor: page.next_cursor };
+  });
+  loadRemainingPages(firstPage.next_cursor);
   const reprocessButtonElement = safeQuerySelector<HTMLButtonElement>(
     ".reprocess-failed-tasks"
   );
@@ -103,10 +146,11 @@ export const createTasksTable = async ({
   const refreshButtonElement = safeQuerySelector(".refresh-processing-queue");
 
   addSafeEventListener(refreshButtonElement, "click", async (e) => {
-    const updatedDataSource = await getProcessingQueue();
+    const updatedPage = await getProcessingQueue();
     tasksGrid.updateGridOptions({
-      rowData: updatedDataSource,
+      rowData: updatedPage.tasks,
     });
+    loadRemainingPages(updatedPage.next_cursor);
   });
 
   return tasksTable;
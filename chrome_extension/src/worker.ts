@@ -1,4 +1,6 @@
-import { registerDocument, addDocumentAnnotation } from "./api";
+import { registerDocument, registerDocuments, addDocumentAnnotation } from "./api";
+
+const REGISTRATION_BATCH_SIZE = 500;
 
 // one-time registration
 chrome.runtime.onInstalled.addListener(async ({ reason }) => {
@@ -29,7 +31,9 @@ chrome.runtime.onInstalled.addListener(async ({ reason }) => {
 
   // ingest all pre-registered reading list items
   const items = await chrome.readingList.query({});
-  await Promise.all(items.map(registerDocument));
+  for (let i = 0; i < items.length; i += REGISTRATION_BATCH_SIZE) {
+    await registerDocuments(items.slice(i, i + REGISTRATION_BATCH_SIZE));
+  }
 });
 
 // automatically ingest new reading list records, inclusive from other devices
@@ -11,6 +11,13 @@ declare namespace kms {
         title: string
     }
 
+    export interface BatchRegistrationResult {
+        url: string
+        hash: string
+        result_id: string | null
+        status: "registered" | "reprocessing" | "exists" | "duplicate" | "unsupported"
+    }
+
     export interface DocumentReference {
         hash: string
         annotation?: string
@@ -57,6 +64,11 @@ declare namespace kms {
         last_updated: string
     }
 
+    export interface TaskProcessingResultsPage {
+        documents: TaskProcessingResult[]
+        next_cursor: string | null
+    }
+
     export interface TaskQueueRecord {
         url: string
         hash: string
@@ -66,4 +78,9 @@ declare namespace kms {
         status_reason: string
         updated_at: string
     }
+
+    export interface TaskQueuePage {
+        tasks: TaskQueueRecord[]
+        next_cursor: string | null
+    }
 }
\ No newline at end of file
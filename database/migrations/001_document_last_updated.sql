@@ -0,0 +1,42 @@
+-- Denormalize the latest task update onto each document so the document
+-- listing can be served by a single index-ordered scan.
+ALTER TABLE kms.document_paths
+  ADD COLUMN IF NOT EXISTS last_updated timestamp NOT NULL DEFAULT now();
+
+UPDATE
+  kms.document_paths AS d
+SET
+  last_updated = t.updated_at
+FROM (
+  SELECT
+    hash,
+    max(updated_at) AS updated_at
+  FROM
+    genai.process_tasks
+  GROUP BY
+    hash) AS t
+WHERE
+  t.hash = d.hash;
+
+CREATE INDEX IF NOT EXISTS document_paths_last_updated_idx ON kms.document_paths(last_updated DESC, hash DESC);
+
+CREATE OR REPLACE FUNCTION sync_document_last_updated()
+  RETURNS TRIGGER
+  AS $$
+BEGIN
+  UPDATE
+    kms.document_paths
+  SET
+    last_updated = NEW.updated_at
+  WHERE
+    hash = NEW.hash
+    AND last_updated < NEW.updated_at;
+  RETURN NULL;
+END;
+$$
+LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER tr_sync_document_last_updated
+  AFTER INSERT OR UPDATE ON genai.process_tasks
+  FOR EACH ROW
+  EXECUTE PROCEDURE sync_document_last_updated();
@@ -0,0 +1,6 @@
+-- Supports filtering and keyset pagination of task listings.
+CREATE INDEX IF NOT EXISTS process_tasks_status_idx ON genai.process_tasks(status);
+
+CREATE INDEX IF NOT EXISTS process_tasks_updated_at_idx ON genai.process_tasks(updated_at, hash, task_name);
+
+CREATE INDEX IF NOT EXISTS process_tasks_task_id_idx ON genai.process_tasks(task_id);
@@ -0,0 +1,6 @@
+-- Order-independent digest of loader_spec, computed by the API on insert.
+-- Existing rows are populated by `python -m services.persist.backfill` (from ./api).
+ALTER TABLE kms.document_paths
+  ADD COLUMN IF NOT EXISTS loader_spec_digest char(64);
+
+CREATE UNIQUE INDEX IF NOT EXISTS document_paths_loader_spec_digest_idx ON kms.document_paths(loader_spec_digest);
@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS genai_ops.lock_metrics(
+  metric_id bigserial PRIMARY KEY,
+  lock_name text NOT NULL,
+  acquired_at timestamp,
+  wait_duration real,
+  -- whether the holder performed the work, or found it already completed
+  performed_work boolean
+);
@@ -0,0 +1,6 @@
+ALTER TABLE genai_ops.process_task_metrics
+  ADD COLUMN IF NOT EXISTS priority smallint,
+  -- seconds between publishing and the task starting
+  ADD COLUMN IF NOT EXISTS queue_wait real;
+
+CREATE INDEX IF NOT EXISTS process_task_metrics_started_at_idx ON genai_ops.process_task_metrics(started_at);
@@ -0,0 +1,19 @@
+-- Extracted relations, queryable across documents. The `.entity_relations`
+-- store files remain the per-document source, rows are replaced per hash.
+CREATE TABLE IF NOT EXISTS genai.entity_relations(
+  hash char(64) NOT NULL,
+  entity text NOT NULL,
+  relationship text NOT NULL,
+  target text NOT NULL,
+  -- normalized names, relations are matched on these rather than the raw text
+  entity_key text NOT NULL,
+  target_key text NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS entity_relations_hash_idx ON genai.entity_relations(hash);
+
+CREATE INDEX IF NOT EXISTS entity_relations_entity_key_idx ON
+  genai.entity_relations(entity_key, hash);
+
+CREATE INDEX IF NOT EXISTS entity_relations_target_key_idx ON
+  genai.entity_relations(target_key, hash);